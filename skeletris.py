@@ -2,6 +2,8 @@ import traceback
 import datetime
 import os
 import pathlib
+import argparse
+import multiprocessing
 
 """
 The main entry point.
@@ -28,7 +30,20 @@ def _generate_readme(name_of_game):
                                    util.Utils.resource_path("gifs"))
 
 
+def _parse_args():
+    parser = argparse.ArgumentParser(description="runs {}.".format(NAME_OF_GAME))
+    parser.add_argument("--seed", type=int, default=None, help="seed to use for every run (default: random)")
+    parser.add_argument("--record", default=None, metavar="FILE",
+                        help="record the inputs to FILE, so the run can be replayed with src.utils.replay")
+
+    # unrecognized args are ignored, because some platforms pass extra args to executables
+    args, _ = parser.parse_known_args()
+    return args
+
+
 if __name__ == "__main__":
+    multiprocessing.freeze_support()  # zones are pre-generated in a worker process, and this is needed for builds
+
     version_string = "?"
     try:
         import src.game.debug as debug
@@ -44,9 +59,31 @@ if __name__ == "__main__":
         if debug.is_dev():
             _generate_readme(NAME_OF_GAME)
 
+        args = _parse_args()
+
+        import src.game.rng as rng
+        import src.game.inputs as inputs
+
+        recorder = None
+        if args.record is not None:
+            # recordings can only be replayed if the run is seeded
+            seed = args.seed if args.seed is not None else rng.new_seed()
+            rng.set_fixed_seed(seed)
+
+            import src.game.pathutils as pathutils
+            recorder = inputs.InputRecorder(seed, save_files=pathutils.read_save_data_files())
+            print("INFO: recording inputs to {} (seed={})".format(args.record, seed))
+
+        elif args.seed is not None:
+            rng.set_fixed_seed(args.seed)
+
         import src.game.gameloop as gameloop
         gameloop.init(NAME_OF_GAME)
-        gameloop.run()
+        gameloop.run(input_recorder=recorder)
+
+        if recorder is not None:
+            recorder.save_to_file(args.record, fingerprint=gameloop.get_run_fingerprint())
+            print("INFO: saved recording to {} ({} frames)".format(args.record, recorder.get_frame()))
 
     except Exception as e:
         crash_file_name = _get_crash_report_file_name()
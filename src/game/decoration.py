@@ -1,9 +1,9 @@
 
-import random
 import src.game.dialog as dialog
 import src.game.spriteref as spriteref
 import src.game.globalstate as gs
 from src.utils.util import Utils
+import src.game.rng as rng
 
 
 _ALL_DECORATION_TYPES = []
@@ -48,7 +48,7 @@ class DecorationFactory:
             will not be interactable. If not supplied, the decoration's default dialog text will be used.
         """
         if dec_type is None:
-            dec_type = random.choice(_ALL_RAND_SPAWN_DEC_TYPES)
+            dec_type = rng.worldgen().choice(_ALL_RAND_SPAWN_DEC_TYPES)
 
         dec_sprites = DecorationFactory.get_sprites(dec_type, level)
 
@@ -70,7 +70,7 @@ class DecorationFactory:
     @staticmethod
     def get_sprites(dec_type, level, rand_seed=None):
         if rand_seed is None:
-            rand_seed = random.random()
+            rand_seed = rng.worldgen().random()
 
         # TODO - this is implemented in such a stupid way...
         if dec_type == DecorationTypes.BUCKET:
@@ -158,7 +158,7 @@ class DecorationFactory:
             "Death is permanent, so watch your step.",
             "You can customize the controls if you don't like them! Press [{}]".format(esc_key)]
 
-        message = random.choice(how_to_play_text)
+        message = rng.worldgen().choice(how_to_play_text)
         return dialog.NpcDialog(message, None if no_sprite else spriteref.sign_faces)
 
     @staticmethod
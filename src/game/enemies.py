@@ -1,4 +1,3 @@
-import random
 
 import src.game.spriteref as spriteref
 from src.world.entities import Enemy
@@ -10,6 +9,7 @@ import src.utils.colors as colors
 import src.items.itemgen as itemgen
 import src.game.balance as balance
 import src.game.constants as constants
+import src.game.rng as rng
 
 
 _ALL_TYPES = {}
@@ -451,7 +451,7 @@ class WitchTemplate(EnemyTemplate):
         for _ in range(0, n_potions):
             templates_to_use = itemgen.PotionTemplates.all_templates(level)
             if len(templates_to_use) > n_potions:
-                templates_to_use = random.choices(templates_to_use, k=n_potions)
+                templates_to_use = rng.worldgen().choices(templates_to_use, k=n_potions)
 
             for t in templates_to_use:
                 potion = itemgen.PotionItemFactory.gen_item(level, t)
@@ -1152,21 +1152,21 @@ class EnemyFactory:
     def get_state(template, level):
         inv = inventory.InventoryState()
 
-        for spawn_item in template.get_spawn_items(level, randval=random.random()):
+        for spawn_item in template.get_spawn_items(level, randval=rng.worldgen().random()):
             if spawn_item is not None:
                 inv.add_to_inv(spawn_item)
 
         stat_lookup = template.get_stats()
         wealth = stat_lookup.stat_value(StatTypes.WEALTH)
         for _ in range(0, wealth):
-            if random.random() < balance.ENEMY_ITEM_CHANCE_PER_WEALTH:
+            if rng.worldgen().random() < balance.ENEMY_ITEM_CHANCE_PER_WEALTH:
                 loot_item = itemgen.ItemFactory.gen_item(level, item_type=None)
                 if loot_item is not None:
                     inv.add_to_inv(loot_item)
 
         import src.game.gameengine as gameengine
         a_state = gameengine.ActorState(template.get_name(), level, stat_lookup, inv, 1, False)
-        a_state.set_energy(0 if random.random() < 0.5 else 4)
+        a_state.set_energy(0 if rng.worldgen().random() < 0.5 else 4)
 
         return a_state
 
@@ -1184,7 +1184,7 @@ class EnemyFactory:
                     level, template.get_name()))
             else:
                 # TODO - weights on the enemy types?
-                template = random.choice(valid_templates)
+                template = rng.worldgen().choice(valid_templates)
 
         res = []
         for _ in range(0, n):
@@ -12,9 +12,7 @@ import src.game.events as events
 import src.game.sound_effects as sound_effects
 import src.game.soundref as soundref
 import src.game.constants as constants
-
-
-import random
+import src.game.rng as rng
 
 
 class ActorState(StatProvider):
@@ -30,6 +28,10 @@ class ActorState(StatProvider):
 
         self.status_effects = {}  # StatusEffectType -> turns remaining
 
+        # totals of all the actor's stats, rebuilt when their equipment or status effects change
+        self._stat_totals = None  # local -> (StatType -> value)
+        self._stat_totals_equip_change_count = -1
+
         self.current_hp = self.max_hp()
         self.current_energy = 0
 
@@ -47,13 +49,31 @@ class ActorState(StatProvider):
                 if action_provider.is_mappable() and not action_provider.needs_to_be_equipped:
                     yield ItemActionProvider(item, action_provider)
 
-    def stat_value(self, stat_type, local=False):
-        res = self.base_stats.stat_value(stat_type, local=local)
-        for item in self.inventory().all_equipped_items():
-            res += item.stat_value(stat_type, local=local)
+    def _status_effects_changed(self):
+        self._stat_totals = None
+
+    def _get_stat_totals(self, local):
+        equip_change_count = self.inventory().get_equip_grid().get_change_count()
+        if self._stat_totals is None or self._stat_totals_equip_change_count != equip_change_count:
+            self._stat_totals = {False: {}, True: {}}
+            self._stat_totals_equip_change_count = equip_change_count
 
-        for status_effect in self.status_effects:
-            res += status_effect.stat_value(stat_type, local=local)
+            for stat_type in StatTypes.all_types():
+                for is_local in (False, True):
+                    val = self.base_stats.stat_value(stat_type, local=is_local)
+                    if val != 0:
+                        self._stat_totals[is_local][stat_type] = val
+
+            providers = list(self.inventory().all_equipped_items()) + list(self.status_effects)
+            for provider in providers:
+                for stat in provider.all_applied_stats():
+                    totals = self._stat_totals[stat.local]
+                    totals[stat.stat_type] = totals.get(stat.stat_type, 0) + stat.value
+
+        return self._stat_totals[local]
+
+    def stat_value(self, stat_type, local=False):
+        res = self._get_stat_totals(local).get(stat_type, 0)
 
         if self.is_player() and debug.insta_kill() and stat_type == StatTypes.ATT:
             res += 99
@@ -146,6 +166,11 @@ class ActorState(StatProvider):
         missing_energy = self.max_energy() - self.energy()
         return round(missing_energy / self.speed() + 0.49999)
 
+    def rounds_until_next_activation(self):
+        """returns: the number of rounds of energy gain (at least 1) until the actor's energy reaches max_energy."""
+        missing_energy = self.max_energy() - self.energy()
+        return max(1, -(-missing_energy // self.speed()))
+
     def max_energy(self):
         return 8
 
@@ -217,6 +242,7 @@ class ActorState(StatProvider):
                 del self.status_effects[eff]
 
             self.status_effects[effect] = duration
+            self._status_effects_changed()
             return True
 
     def get_turns_remaining(self, status_effect):
@@ -240,6 +266,7 @@ class ActorState(StatProvider):
 
             if expired:
                 del self.status_effects[e]
+                self._status_effects_changed()
 
                 if e == statuseffects.StatusEffectTypes.FLINCHED:
                     add_flinch_recovery = True
@@ -253,6 +280,7 @@ class ActorState(StatProvider):
 
     def clear_all_status_effects(self):
         self.status_effects.clear()
+        self._status_effects_changed()
 
 
 class ActorController:
@@ -277,10 +305,10 @@ class ActorController:
             return SkipTurnAction(actor, a_pos, perturb_color=stats.StatTypes.GRASPED.get_color(), intentional=False)
 
         if a_state.is_confused() and next_action.is_move_action():
-            if random.random() < balance.CONFUSION_CHANCE:
+            if rng.combat().random() < balance.CONFUSION_CHANCE:
                 pos = next_action.get_position()
                 neighbors = [n for n in Utils.neighbors(a_pos[0], a_pos[1]) if n != pos]
-                random.shuffle(neighbors)
+                rng.combat().shuffle(neighbors)
                 for n in neighbors:
                     if actor.is_player():
                         open_door_action = OpenDoorAction(actor, n, perturb_color=stats.StatTypes.CONFUSION.get_color())
@@ -427,27 +455,38 @@ class EnemyController(ActorController):
 
     def _get_movement_action(self, actor, world):
         pos = world.to_grid_coords(actor.center()[0], actor.center()[1])
-        skilled_enough = random.random() < balance.ENEMY_PATHING_SKILL[actor.get_actor_state().intelligence() - 1]
+        skilled_enough = rng.combat().random() < balance.ENEMY_PATHING_SKILL[actor.get_actor_state().intelligence() - 1]
 
         if not world.get_hidden(*pos) and skilled_enough:
-            p = world.get_player()
-            if p is not None:
-                p_pos = world.to_grid_coords(*p.center())
-                path = world.get_path_between(pos, p_pos, max_length=balance.ENEMY_SMART_PATHING_RANGE,
-                                              cond=lambda xy: (xy == p_pos or xy == pos
-                                                               or not world.is_solid(*xy, including_entities=True)))
-                if path is not None and len(path) >= 2:
-                    res = MoveToAction(actor, path[1])
+            # all the enemies chasing the player share the same distance field, rather than each doing a search
+            dist_field = world.get_player_distance_field(balance.ENEMY_SMART_PATHING_RANGE)
+            if dist_field is not None:
+                p_pos = dist_field.get_origin()
+
+                # the field doesn't include actors, so step around them here
+                next_pos = dist_field.next_step(pos, max_length=balance.ENEMY_SMART_PATHING_RANGE, randomize=True,
+                                                blocked=lambda xy: world.get_actor_in_cell(*xy) is not None)
+
+                if next_pos is None and dist_field.get_dist(pos) is not None:
+                    # every step closer is taken by another actor, so look for a way around them
+                    path = world.get_path_between(pos, p_pos, max_length=balance.ENEMY_SMART_PATHING_RANGE,
+                                                  cond=lambda xy: (xy == p_pos or
+                                                                   not world.is_solid(*xy, including_entities=True)))
+                    if path is not None and len(path) >= 2:
+                        next_pos = path[1]
+
+                if next_pos is not None and next_pos != p_pos:
+                    res = MoveToAction(actor, next_pos)
                     if res.is_possible(world):
                         return res
                     else:
-                        print("WARN: world gave {} an impossible path? {}".format(actor, path))
+                        print("WARN: world gave {} an impossible path? {}".format(actor, next_pos))
 
         # if hidden, avoid stepping next to doors
         # (so that the player can't get instagibbed as they open a door)
         if world.get_hidden(*pos):
             neighbors = [n for n in Utils.neighbors(pos[0], pos[1])]
-            random.shuffle(neighbors)
+            rng.combat().shuffle(neighbors)
 
             from src.world.worldstate import World
 
@@ -464,7 +503,7 @@ class EnemyController(ActorController):
 
         # otherwise just fallback to dumb movement
         neighbors = [n for n in Utils.neighbors(pos[0], pos[1])]
-        random.shuffle(neighbors)
+        rng.combat().shuffle(neighbors)
         for n in neighbors:
             res = MoveToAction(actor, n)
             if res.is_possible(world):
@@ -825,8 +864,8 @@ def determine_damage_dealt(attacker, defender, item_used=None, is_thrown=False):
     #       a die can only block a die with value less than or equal to it's own.
     #   the number of unblocked attackers is the amount of damage dealt.
 
-    atts = [random.randint(1, 6) for _ in range(0, a_att)]
-    defs = [random.randint(1, 4) for _ in range(0, t_def)]
+    atts = [rng.combat().randint(1, 6) for _ in range(0, a_att)]
+    defs = [rng.combat().randint(1, 4) for _ in range(0, t_def)]
 
     atts.sort()
     defs.sort()
@@ -1370,10 +1409,10 @@ class TradeItemAction(Action):
             if actor_grid_pos[0] == trader_grid_pos[0]:
                 # offset the x pos during vertical trades, or else the character sprites will
                 # block the item sprites.
-                if random.random() < 0.5:
-                    actor_pos[0] += int(constants.CELLSIZE * (0.25 + random.random() / 2))
+                if rng.cosmetic().random() < 0.5:
+                    actor_pos[0] += int(constants.CELLSIZE * (0.25 + rng.cosmetic().random() / 2))
                 else:
-                    actor_pos[0] -= int(constants.CELLSIZE * (0.25 + random.random() / 2))
+                    actor_pos[0] -= int(constants.CELLSIZE * (0.25 + rng.cosmetic().random() / 2))
 
             throw_dir = Utils.sub(actor_pos, trader_pos)
             throw_dir = Utils.set_length(throw_dir, 1.0)
@@ -2248,7 +2287,7 @@ def get_basic_movement_actions(player, current_pos, move_pos, for_click=False):
 
 def get_confusion_move_actions(player, pos, target_pos):
     neighbors = [n for n in Utils.neighbors(pos[0], pos[1])]
-    random.shuffle(neighbors)
+    rng.combat().shuffle(neighbors)
 
     res = []
 
@@ -0,0 +1,90 @@
+import sys
+
+import src.game.rng as rng
+import src.game.enemies as enemies
+import src.world.entities as entities
+from src.world.worldstate import World
+
+"""
+Checks how enemies chasing the player move around each other.
+
+usage: python -m src.game.gameengine_tests
+"""
+
+
+def build_world(rows, level=5):
+    """
+        rows: list of strings, where 'x' is a wall, '.' is a floor, 'p' is the player, and letters are enemies.
+        returns: (World, map of letter -> Enemy)
+    """
+    world = World(len(rows[0]), len(rows))
+    enemies_by_letter = {}
+
+    for y in range(0, len(rows)):
+        for x in range(0, len(rows[y])):
+            c = rows[y][x]
+            world.set_geo(x, y, World.WALL if c == "x" else World.FLOOR)
+            if c == "p":
+                world.add(entities.Player(0, 0), gridcell=(x, y))
+            elif c != "x" and c != ".":
+                enemy = enemies.EnemyFactory.gen_enemy(enemies.TEMPLATE_TRILLA, level)
+
+                # smart enough to always use the smart pathing
+                enemy.get_actor_state().intelligence = lambda: 5
+
+                world.add(enemy, gridcell=(x, y))
+                enemies_by_letter[c] = enemy
+
+    world.flush_new_entity_additions()
+    return world, enemies_by_letter
+
+
+def _next_move(enemy, world):
+    """returns: the cell the enemy wants to move to, or None if it doesn't want to move."""
+    action = enemy.get_controller()._get_movement_action(enemy, world)
+    return action.position if action is not None else None
+
+
+def test_front_enemy_advances_in_corridor():
+    """
+        returns: a description of the problem if the enemy in front doesn't step toward the player, else None
+    """
+    world, ents = build_world(["xxxxxxxx",
+                               "xp..abcx",
+                               "xxxxxxxx"])
+    move = _next_move(ents["a"], world)
+    if move != (3, 1):
+        return "expected the front enemy to move to (3, 1), instead got {}".format(move)
+    return None
+
+
+def test_blocked_enemy_paths_around():
+    """
+        returns: a description of the problem if an enemy whose way forward is taken by another enemy
+                 doesn't go around it, else None
+    """
+    world, ents = build_world(["xxxxxx",
+                               "xpab.x",
+                               "x.x.xx",
+                               "x...xx",
+                               "xxxxxx"])
+    for _ in range(0, 20):
+        move = _next_move(ents["b"], world)
+        if move != (3, 2):
+            return "expected the blocked enemy to go around through (3, 2), instead got {}".format(move)
+    return None
+
+
+if __name__ == "__main__":
+    rng.seed_all(12345)
+
+    failures = 0
+    for test in [test_front_enemy_advances_in_corridor, test_blocked_enemy_paths_around]:
+        err = test()
+        if err is not None:
+            print("FAIL: {}: {}".format(test.__name__, err))
+            failures += 1
+        else:
+            print("PASS: {}".format(test.__name__))
+
+    sys.exit(0 if failures == 0 else 1)
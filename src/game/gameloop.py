@@ -4,12 +4,22 @@ import src.game.spriteref as spriteref
 from src.utils.util import Utils
 import src.game.debug as debug
 import src.game.constants as constants
+import src.game.pathutils as pathutils
 
 DEFAULT_SCREEN_SIZE = (800, 600)
 MINIMUM_SCREEN_SIZE = (800, 600)
 
+_HEADLESS = False
+
+
+def init(name_of_game, headless=False):
+    """
+        headless: if true, the game won't open a window or use OpenGL (the SDL video driver should
+            already be set to "dummy"). Sprites are still built, they're just never drawn.
+    """
+    global _HEADLESS
+    _HEADLESS = headless
 
-def init(name_of_game):
     print("INFO: pygame version: " + pygame.version.ver)
     print("INFO: initializing sounds...")
     pygame.mixer.pre_init(44100, -16, 1, 2048)
@@ -23,25 +33,19 @@ def init(name_of_game):
     from src.game.windowstate import WindowState
     WindowState.create_instance(window_size=DEFAULT_SCREEN_SIZE, min_size=MINIMUM_SCREEN_SIZE)
     WindowState.get_instance().set_caption(name_of_game)
-    WindowState.get_instance().show()
+    if not headless:
+        WindowState.get_instance().show()
 
     from src.renderengine.engine import RenderEngine
-    render_eng = RenderEngine.create_instance()
+    render_eng = RenderEngine.create_instance(headless=headless)
     render_eng.init(*DEFAULT_SCREEN_SIZE)
     render_eng.set_min_size(*MINIMUM_SCREEN_SIZE)
 
-    raw_sheet = pygame.image.load(Utils.resource_path("assets/image.png"))
-    cine_img = pygame.image.load(Utils.resource_path("assets/cinematics.png"))
-    ui_img = pygame.image.load(Utils.resource_path("assets/ui.png"))
-    items_img = pygame.image.load(Utils.resource_path("assets/items.png"))
-    boss_img = pygame.image.load(Utils.resource_path("assets/bosses.png"))
-    cave_horror_img = pygame.image.load(Utils.resource_path("assets/cave_horror.png"))
-    font_img = pygame.image.load(Utils.resource_path("assets/font.png"))
-    animation_img = pygame.image.load(Utils.resource_path("assets/animations.png"))
-    title_scene_img = pygame.image.load(Utils.resource_path("assets/title_scene.png"))
-
-    img_surface = spriteref.build_spritesheet(raw_sheet, cine_img, ui_img, items_img, boss_img, cave_horror_img,
-                                              font_img, animation_img, title_scene_img)
+    sheet_files = ["assets/image.png", "assets/cinematics.png", "assets/ui.png", "assets/items.png",
+                   "assets/bosses.png", "assets/cave_horror.png", "assets/font.png", "assets/animations.png",
+                   "assets/title_scene.png"]
+    sheet_cache_path = str(pathutils.get_save_data_path(with_subpath="cache/spritesheet.bin"))
+    img_surface = spriteref.load_spritesheet(sheet_files, cache_path=sheet_cache_path)
 
     texture_data = pygame.image.tostring(img_surface, "RGBA", 1)
     width = img_surface.get_width()
@@ -89,6 +93,19 @@ def init(name_of_game):
     render_eng.set_pixel_scale(px_scale)
 
 
+def resize_display(w, h):
+    """sets the size of the (windowed) display, and rescales the game to fit it."""
+    from src.game.windowstate import WindowState
+    from src.renderengine.engine import RenderEngine
+
+    WindowState.get_instance().set_window_size(w, h)
+
+    display_w, display_h = WindowState.get_instance().get_display_size()
+    new_pixel_scale = _calc_pixel_scale((w, h))
+
+    RenderEngine.get_instance().resize(display_w, display_h, px_scale=new_pixel_scale)
+
+
 def _calc_pixel_scale(screen_size, px_scale_opt=None, max_scale=4):
     if px_scale_opt is None:
         import src.game.globalstate as gs
@@ -122,7 +139,32 @@ def _calc_pixel_scale(screen_size, px_scale_opt=None, max_scale=4):
         return int(px_scale_opt)
 
 
-def run():
+def get_run_fingerprint():
+    """returns: json-able summary of the game's current state, for checking that a replay matched its recording."""
+    import src.game.globalstate as gs
+    import src.game.rng as rng
+
+    res = {"seed": rng.get_seed(),
+           "tick": gs.get_instance().tick_counter,
+           "zone_id": gs.get_instance().get_zone_id()}
+
+    for stat in (gs.RunStatisticTypes.TURN_COUNT, gs.RunStatisticTypes.KILL_COUNT, gs.RunStatisticTypes.DEATH_COUNT):
+        res[stat] = gs.get_instance().get_run_statistic(stat)
+
+    world, player = gs.get_instance().get_world_and_player()
+    if player is not None:
+        res["player_pos"] = list(player.center())
+        res["player_hp"] = gs.get_instance().player_state().hp()
+
+    return res
+
+
+def run(input_recorder=None, input_replayer=None):
+    """
+        input_recorder: an InputRecorder to log the player's inputs to, if the run is being recorded.
+        input_replayer: an InputReplayer to take inputs from instead of the keyboard and mouse. The game
+            runs as fast as it can, and exits when the replay is finished.
+    """
     # importing is fragile (-_-)
     import src.game.events as events
     import src.game.sound_effects as sound_effects
@@ -132,6 +174,9 @@ def run():
     from src.renderengine.engine import RenderEngine
     import src.ui.menus as menus
     import src.worldgen.zones as zones
+    import src.worldgen.zonepregen as zonepregen
+    import src.game.savewriter as savewriter
+    import src.game.dialog as dialog
     from src.game.windowstate import WindowState
     from src.game.inputs import InputState
 
@@ -142,7 +187,13 @@ def run():
 
     ignore_resize_events_next_tick = False
 
+    InputState.get_instance().set_recorder(input_recorder)
+    if input_recorder is not None:
+        input_recorder.set_initial_display_size(WindowState.get_instance().get_display_size())
+
     while running:
+        if input_replayer is not None and input_replayer.is_done():
+            break
 
         # processing "global" events
         gs.get_instance().global_event_queue().flip()
@@ -192,6 +243,7 @@ def run():
                 world_view = WorldView(world)
 
                 gs.get_instance().set_world(world)
+                zonepregen.get_instance().zone_entered(zone_id)
 
         # processing in-world events
         if not gs.get_instance().menu_manager().pause_world_updates():
@@ -251,10 +303,15 @@ def run():
         toggled_fullscreen = False
 
         input_state = InputState.get_instance()
+        if input_replayer is not None:
+            input_replayer.apply(input_state, resize_display=resize_display)
+
         for py_event in pygame.event.get():
             if py_event.type == pygame.QUIT:
                 running = False
                 continue
+            elif input_replayer is not None:
+                continue  # real inputs are ignored during replays
             elif py_event.type == pygame.KEYDOWN:
                 input_state.set_key(py_event.key, True)
             elif py_event.type == pygame.KEYUP:
@@ -276,7 +333,7 @@ def run():
             if py_event.type == pygame.KEYDOWN and py_event.key == pygame.K_F4:
                 toggled_fullscreen = True
 
-            if not pygame.mouse.get_focused():
+            if not pygame.mouse.get_focused() and input_replayer is None:
                 input_state.set_mouse_pos(None)
 
         ignore_resize_events_this_tick = ignore_resize_events_next_tick
@@ -294,6 +351,10 @@ def run():
                 RenderEngine.get_instance().set_pixel_scale(new_pixel_scale)
             engine.resize(new_size[0], new_size[1], px_scale=new_pixel_scale)
 
+            if input_recorder is not None:
+                # replays don't toggle fullscreen, they just take on the same size
+                input_recorder.display_resized(new_size)
+
             # when it goes from fullscreen to windowed mode, pygame sends a VIDEORESIZE event
             # on the next frame that claims the window has been resized to the maximum resolution.
             # this is annoying so we ignore it. we want the window to remain the same size it was
@@ -303,17 +364,20 @@ def run():
         if not ignore_resize_events_this_tick and len(all_resize_events) > 0:
             # print("INFO {}: got {} resize event(s)".format(gs.get_instance().tick_counter, len(all_resize_events)))
             last_resize_event = all_resize_events[-1]
+            resize_display(last_resize_event.w, last_resize_event.h)
 
-            WindowState.get_instance().set_window_size(last_resize_event.w, last_resize_event.h)
-
-            display_w, display_h = WindowState.get_instance().get_display_size()
-            new_pixel_scale = _calc_pixel_scale((last_resize_event.w, last_resize_event.h))
-
-            RenderEngine.get_instance().resize(display_w, display_h, px_scale=new_pixel_scale)
+            if input_recorder is not None:
+                input_recorder.display_resized((last_resize_event.w, last_resize_event.h))
 
         input_state.update(gs.get_instance().tick_counter)
         sound_effects.update()
 
+        # saves are written in the background, so their failures show up later
+        for filepath, description, error in savewriter.get_instance().pop_failures():
+            print("ERROR: couldn't save {} to {}: {}".format(description, filepath, error))
+            gs.get_instance().dialog_manager().set_dialog(dialog.Dialog("Failed to save {}.".format(description)))
+            sound_effects.play_sound(soundref.error)
+
         world_active = gs.get_instance().menu_manager().should_draw_world()
 
         if world_active and gs.get_instance().get_world() is None:
@@ -333,6 +397,7 @@ def run():
 
             gs.get_instance().set_world(world)
             world_view = WorldView(world)
+            zonepregen.get_instance().zone_entered(gs.get_instance().get_zone_id())
 
         if debug.is_dev() and input_state.was_pressed(pygame.K_F1):
             # used to help find performance bottlenecks
@@ -379,10 +444,13 @@ def run():
 
         RenderEngine.get_instance().render_layers()
 
-        pygame.display.flip()
+        if not _HEADLESS:
+            pygame.display.flip()
 
         slo_mo_mode = debug.is_dev() and input_state.is_held(pygame.K_TAB)
-        if slo_mo_mode:
+        if input_replayer is not None:
+            clock.tick()  # no need to wait around during replays
+        elif slo_mo_mode:
             clock.tick(15)
         else:
             clock.tick(60)
@@ -394,11 +462,18 @@ def run():
                 print("WARN: fps drop: {} ({} sprites)".format(round(clock.get_fps() * 10) / 10.0,
                                                                RenderEngine.get_instance().count_sprites()))
 
+    if input_recorder is not None:
+        InputState.get_instance().set_recorder(None)
+
     print("INFO: saving game data before exit...")
     gs.get_instance().save_current_game_to_disk_softly()
 
     print("INFO: saving settings before exit...")
     gs.get_instance().save_settings_to_disk()
 
+    savewriter.get_instance().flush()
+
+    zonepregen.get_instance().shutdown()
+
     print("INFO: quitting skeletris")
     pygame.quit()
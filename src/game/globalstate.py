@@ -156,6 +156,10 @@ class GlobalState:
         self._save_data.set(savedata.SaveDataTags.DEATH_COUNT, self.get_run_statistic(RunStatisticTypes.DEATH_COUNT))
         self._save_data.set(savedata.SaveDataTags.CHECKPOINT_COUNT, self.get_run_statistic(RunStatisticTypes.CHECKPOINT_COUNT))
 
+        if self._save_data.get(savedata.SaveDataTags.RNG_SEED) is None:
+            import src.game.rng as rng
+            self._save_data.set(savedata.SaveDataTags.RNG_SEED, rng.get_seed())
+
         if save_id is not None:
             self._save_data.set(savedata.SaveDataTags.SPAWN_ID, save_id)
 
@@ -628,5 +632,8 @@ def create_new(menu, from_save_data=None):
     new_instance.set_player_state(player_state, player_controller)
     new_instance.pull_state_from_save_data(from_save_data)
 
+    import src.game.rng as rng
+    rng.start_run(from_save_data)
+
     set_instance(new_instance)
 
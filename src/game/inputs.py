@@ -23,8 +23,20 @@ class InputState:
         self._mouse_pos = (0, 0)
         self._mouse_moved_at_time = -1
         self._current_time = 0
+
+        self._recorder = None
     
+    def set_recorder(self, recorder):
+        """recorder: an InputRecorder that every input passed in should be logged to, or None."""
+        self._recorder = recorder
+
+    def get_recorder(self):
+        return self._recorder
+
     def set_key(self, key, held):
+        if self._recorder is not None:
+            self._recorder.key_set(key, held)
+
         if held:
             if key not in self._pressed_last_frame:
                 self._pressed_last_frame[key] = 0
@@ -43,6 +55,9 @@ class InputState:
         self.set_key(keycode, down)
 
     def set_mouse_pos(self, pos):
+        if self._recorder is not None:
+            self._recorder.mouse_pos_set(pos)
+
         if self._mouse_pos != pos:
             self._mouse_moved_at_time = self._current_time
         self._mouse_pos = pos
@@ -117,3 +132,124 @@ class InputState:
         self._pressed_this_frame.clear()
         self._pressed_this_frame.update(self._pressed_last_frame)
         self._pressed_last_frame.clear()
+
+        if self._recorder is not None:
+            self._recorder.next_frame()
+
+
+# bump this when the recording format (or anything that changes how inputs are interpreted) changes
+RECORDING_VERSION = 2
+
+
+class InputRecorder:
+    """
+        Logs every input passed into the InputState, frame by frame, so that a run can be played back
+        exactly with an InputReplayer. Only useful if the run was seeded (see rng.py).
+    """
+
+    def __init__(self, seed, save_files=None):
+        """
+            seed: the seed the run was started with.
+            save_files: the save_data files that existed when the run started, as a dict of
+                relative path -> file contents, so that the replay can start from the same state.
+        """
+        self._seed = seed
+        self._save_files = save_files if save_files is not None else {}
+        self._display_size = None  # (w, h) of the display when the recording started
+        self._frame = 0
+        self._ops = {}  # frame -> list of ops
+
+    def _add_op(self, op):
+        if self._frame not in self._ops:
+            self._ops[self._frame] = []
+        self._ops[self._frame].append(op)
+
+    def key_set(self, key, held):
+        self._add_op(["key", key, held])
+
+    def mouse_pos_set(self, pos):
+        self._add_op(["mouse", list(pos) if pos is not None else None])
+
+    def set_initial_display_size(self, size):
+        self._display_size = list(size)
+
+    def display_resized(self, size):
+        """size: the new size of the display (mouse positions depend on it, via the pixel scale and ui layout)."""
+        self._add_op(["display", list(size)])
+
+    def next_frame(self):
+        self._frame += 1
+
+    def get_frame(self):
+        return self._frame
+
+    def to_json(self, fingerprint=None):
+        """
+            fingerprint: json-able summary of the state of the game at the end of the recording,
+                which the replay's state is checked against.
+        """
+        return {"version": RECORDING_VERSION,
+                "seed": self._seed,
+                "frames": self._frame,
+                "save_files": self._save_files,
+                "display_size": self._display_size,
+                "ops": {str(frame): self._ops[frame] for frame in self._ops},
+                "fingerprint": fingerprint}
+
+    def save_to_file(self, filepath, fingerprint=None):
+        import json
+        with open(filepath, "w") as f:
+            json.dump(self.to_json(fingerprint=fingerprint), f)
+
+
+class InputReplayer:
+    """Feeds the inputs logged by an InputRecorder back into the InputState, frame by frame."""
+
+    def __init__(self, recording):
+        """recording: the json produced by InputRecorder.to_json"""
+        if recording.get("version") != RECORDING_VERSION:
+            raise ValueError("unsupported recording version: {}".format(recording.get("version")))
+
+        self._recording = recording
+        self._ops = {int(frame): recording["ops"][frame] for frame in recording["ops"]}
+        self._frame = 0
+
+    @staticmethod
+    def load_from_file(filepath):
+        import json
+        with open(filepath) as f:
+            return InputReplayer(json.load(f))
+
+    def get_seed(self):
+        return self._recording["seed"]
+
+    def get_save_files(self):
+        return self._recording["save_files"]
+
+    def get_fingerprint(self):
+        return self._recording["fingerprint"]
+
+    def get_display_size(self):
+        """returns: (w, h) of the display when the recording started, or None if it wasn't recorded."""
+        size = self._recording["display_size"]
+        return tuple(size) if size is not None else None
+
+    def is_done(self):
+        return self._frame >= self._recording["frames"]
+
+    def apply(self, input_state, resize_display=None):
+        """
+            passes in the inputs for the current frame. should be called once per frame, before InputState.update
+            resize_display: lambda (w, h) -> None, called for each display resize in the recording.
+        """
+        for op in self._ops.get(self._frame, []):
+            if op[0] == "display":
+                if resize_display is not None:
+                    resize_display(*op[1])
+            elif op[0] == "key":
+                input_state.set_key(op[1], op[2])
+            elif op[0] == "mouse":
+                input_state.set_mouse_pos(tuple(op[1]) if op[1] is not None else None)
+            else:
+                raise ValueError("unrecognized op in recording: {}".format(op))
+        self._frame += 1
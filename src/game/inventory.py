@@ -15,29 +15,53 @@ class ItemGrid:
         self.items = collections.OrderedDict()  # item -> pos: (int: x, int: y)
         self._grid_type = grid_type
 
+        # kept in sync with self.items, so lookups and fit tests don't have to loop over every item
+        self._cell_items = [None] * (size[0] * size[1])  # y * w + x -> item
+        self._occupied_mask = 0  # bit (y * w + x) is set if the cell is occupied
+
         self._dirty = False
-    
+        self._change_count = 0  # unlike _dirty, this is never reset
+
     def can_place(self, item, pos, allow_replace=False):
         if item in self.items:
             print("WARN: Attempting to place into a grid it's already inside? item={}".format(item))
             return False
-        if (item.w() + pos[0] > self.w() or
-                item.h() + pos[1] > self.h()):
+        if not self._in_bounds(item, pos):
             return False
 
+        if not allow_replace:
+            return self._shape_mask(item, pos) & self._occupied_mask == 0
+
         hit_item = None
         for cell in self._cells_occupied(item, pos):
             item_in_cell = self.item_at_position(cell)
             if item_in_cell is not None:
-                if not allow_replace:
-                    return False
-                elif hit_item is None:
+                if hit_item is None:
                     hit_item = item_in_cell
                 elif hit_item is not item_in_cell:
                     return False  # overlapping two items
                 
         return True
 
+    def _in_bounds(self, item, pos):
+        return (pos[0] >= 0 and pos[1] >= 0 and
+                item.w() + pos[0] <= self.w() and item.h() + pos[1] <= self.h())
+
+    def _shape_mask(self, item, pos=(0, 0)):
+        """returns: bitmask of the cells the item would cover at pos (which must be in bounds)."""
+        res = 0
+        for cell in self._cells_occupied(item, pos):
+            res |= 1 << (cell[1] * self.w() + cell[0])
+        return res
+
+    def _set_cells(self, item, pos, value):
+        for cell in self._cells_occupied(item, pos):
+            self._cell_items[cell[1] * self.w() + cell[0]] = value
+        if value is None:
+            self._occupied_mask &= ~self._shape_mask(item, pos)
+        else:
+            self._occupied_mask |= self._shape_mask(item, pos)
+
     def is_inventory(self):
         return self._grid_type == ItemGridType.INVENTORY
 
@@ -61,16 +85,22 @@ class ItemGrid:
 
     def set_clean(self):
         self._dirty = False
+
+    def get_change_count(self):
+        """returns: the number of times the grid's contents have changed. Useful for invalidating caches."""
+        return self._change_count
         
     def place(self, item, pos):
         if self.can_place(item, pos, allow_replace=False):
             self.items[item] = pos
+            self._set_cells(item, pos, item)
             self._dirty = True
+            self._change_count += 1
             return True
         return False
             
     def try_to_replace(self, item, pos):
-        if item.w() + pos[0] > self.w() or item.h() + pos[1] > self.h():
+        if not self._in_bounds(item, pos):
             return None
         
         hit_item = None    
@@ -93,8 +123,10 @@ class ItemGrid:
 
     def remove(self, item):
         if item in self.items:
+            self._set_cells(item, self.items[item], None)
             del self.items[item]
             self._dirty = True
+            self._change_count += 1
             return True
         return False
 
@@ -107,11 +139,8 @@ class ItemGrid:
         return res
         
     def item_at_position(self, pos):
-        for item in self.items:
-            origin = self.items[item]
-            for cell in self._cells_occupied(item, origin):
-                if cell == pos:
-                    return item
+        if 0 <= pos[0] < self.w() and 0 <= pos[1] < self.h():
+            return self._cell_items[pos[1] * self.w() + pos[0]]
         return None
         
     def _cells_occupied(self, item, pos):
@@ -129,9 +158,15 @@ class ItemGrid:
             return None
 
     def search_for_valid_position_to_place(self, item):
-        for y in range(0, self.h()):
-            for x in range(0, self.w()):
-                if self.can_place(item, (x, y), allow_replace=False):
+        if item in self.items:
+            print("WARN: Attempting to place into a grid it's already inside? item={}".format(item))
+            return None
+
+        # sliding the item's mask across the grid, instead of testing each position cube by cube
+        mask = self._shape_mask(item)
+        for y in range(0, self.h() - item.h() + 1):
+            for x in range(0, self.w() - item.w() + 1):
+                if (mask << (y * self.w() + x)) & self._occupied_mask == 0:
                     return (x, y)
         return None
         
@@ -1,9 +1,9 @@
-import random
 
 from src.items.item import ItemType, ItemTypes
 from src.items.itemgen import ItemFactory
 import src.game.debug as debug
 import src.game.balance as balance
+import src.game.rng as rng
 
 
 class LootFactory:
@@ -16,7 +16,7 @@ class LootFactory:
         n_items = balance.CHEST_MIN_NUM_ITEMS
 
         for _ in range(0, (balance.CHEST_MAX_NUM_ITEMS - n_items)):
-            if random.random() < balance.CHEST_DROP_RATE:
+            if rng.worldgen().random() < balance.CHEST_DROP_RATE:
                 n_items += 1
 
         loot = []
@@ -1,6 +1,5 @@
 
 from enum import Enum
-import random
 
 import src.game.spriteref as sr
 from src.game.dialog import NpcDialog, PlayerDialog
@@ -10,6 +9,7 @@ import src.utils.colors as colors
 from src.utils.util import Utils
 import src.game.balance as balance
 import src.items.cubeutils as cubeutils
+import src.game.rng as rng
 
 
 class NpcID(Enum):
@@ -889,7 +889,7 @@ class NpcPotionProtocol(NpcTradeProtocol):
 
         if len(candidates) > 0:
             # rare ones are equally likely as common ones
-            template = random.choice(candidates)
+            template = rng.worldgen().choice(candidates)
             res_item = itemgen.PotionItemFactory.gen_item(drop_as_level, template=template)
             if res_item is not None:
                 return [res_item]
@@ -1081,32 +1081,39 @@ class NpcItemThatFitsProtocol(NpcTradeProtocol):
         if max_n_cubes < 5 or max_n_cubes > 7:
             raise ValueError("illegal argument max_n_cubes: {}".format(max_n_cubes))
 
-        if max_n_cubes == 5 or random.random() > self._chance_to_shrink_item:
+        if max_n_cubes == 5 or rng.worldgen().random() > self._chance_to_shrink_item:
             # leave the number of cubes unmodified
             return max_n_cubes
         else:
             choices = [x for x in range(5, max_n_cubes)]
-            return random.choice(choices)
+            return rng.worldgen().choice(choices)
 
-    def do_trade(self, item):
-        item_n_cubes = min(len(item.cubes), 7)
-        empty_clusters = self._get_empty_equipment_grid_cell_clusters(min_size=5)
-
-        if len(empty_clusters) == 0:
-            print("ERROR: bad state, no empty cell clusters in equipment grid...")
-            return [item]
-
-        # can't generate an item of size n unless there's a cluster that's big enough
-        max_cluster_size = max([len(cluster) for cluster in empty_clusters])
-
-        n_cubes = self._gen_rand_n_cubes(max_n_cubes=min(item_n_cubes, max_cluster_size))
-
-        big_enough_clusters = [cluster for cluster in empty_clusters if len(cluster) >= n_cubes]
+    def _find_orientation_that_fits(self, cubes, clusters):
+        """
+            returns: a rotation or mirror image of the cubes, positioned so that it fits entirely inside one of the
+                     clusters, or None if there isn't one.
+        """
+        orientations = cubeutils.CubeUtils.get_all_orientations(cubes)
+        rng.worldgen().shuffle(orientations)
+
+        for cluster in clusters:
+            cluster_set = set(cluster)
+            offsets = list(cluster)
+            rng.worldgen().shuffle(offsets)
+            for orientation in orientations:
+                for offset in offsets:
+                    # offset is where the orientation's first cube goes
+                    dx = offset[0] - orientation[0][0]
+                    dy = offset[1] - orientation[0][1]
+                    if all([(c[0] + dx, c[1] + dy) in cluster_set for c in orientation]):
+                        return orientation
+        return None
 
-        cluster = list(random.choice(big_enough_clusters))
-        random.shuffle(cluster)
+    def _gen_cubes_in_cluster(self, n_cubes, cluster):
+        """returns: n connected cubes, all inside the cluster."""
+        cluster = list(cluster)
+        rng.worldgen().shuffle(cluster)
 
-        # now we just need to generate an n-cube item that fits in our cluster
         new_cubes = [cluster.pop()]
 
         while len(new_cubes) < n_cubes:
@@ -1114,7 +1121,7 @@ class NpcItemThatFitsProtocol(NpcTradeProtocol):
             for c in new_cubes:
                 # trying to 'expand' off of c to fill the region.
                 c_n = [n for n in Utils.neighbors(c[0], c[1])]
-                random.shuffle(c_n)
+                rng.worldgen().shuffle(c_n)
                 for n in c_n:
                     if n in cluster:
                         new_cubes.insert(0, n)  # want to keep growing off this one if possible
@@ -1131,6 +1138,32 @@ class NpcItemThatFitsProtocol(NpcTradeProtocol):
         if len(new_cubes) != n_cubes:
             raise ValueError("res_cubes has incorrect size={}, expected={}".format(len(new_cubes), n_cubes))
 
+        return new_cubes
+
+    def do_trade(self, item):
+        item_n_cubes = min(len(item.cubes), 7)
+        empty_clusters = self._get_empty_equipment_grid_cell_clusters(min_size=5)
+
+        if len(empty_clusters) == 0:
+            print("ERROR: bad state, no empty cell clusters in equipment grid...")
+            return [item]
+
+        # can't generate an item of size n unless there's a cluster that's big enough
+        max_cluster_size = max([len(cluster) for cluster in empty_clusters])
+
+        n_cubes = self._gen_rand_n_cubes(max_n_cubes=min(item_n_cubes, max_cluster_size))
+
+        big_enough_clusters = [cluster for cluster in empty_clusters if len(cluster) >= n_cubes]
+
+        if n_cubes == len(item.cubes):
+            # if the artifact already fits somewhere after rotating or flipping it, just print it that way
+            new_cubes = self._find_orientation_that_fits(item.cubes, big_enough_clusters)
+        else:
+            new_cubes = None
+
+        if new_cubes is None:
+            new_cubes = self._gen_cubes_in_cluster(n_cubes, rng.worldgen().choice(big_enough_clusters))
+
         new_cubes = cubeutils.CubeUtils.clean_cubes(new_cubes)
 
         import src.items.itemgen as itemgen
@@ -1147,14 +1180,14 @@ class NpcItemThatFitsProtocol(NpcTradeProtocol):
         if n_stats_to_remove > 0:
             core_stats = [s for s in new_stats if s in itemgen.CORE_STATS]
             if len(core_stats) > 0:
-                protected_core_stat = random.choice(core_stats)
+                protected_core_stat = rng.worldgen().choice(core_stats)
             else:
                 protected_core_stat = None  # weird but ok...
 
             deletable_stat_types = [s for s in new_stats if s != protected_core_stat]
 
             while n_stats_to_remove > 0 and len(deletable_stat_types) > 0:
-                to_del = random.choice(deletable_stat_types)
+                to_del = rng.worldgen().choice(deletable_stat_types)
                 deletable_stat_types.remove(to_del)
                 del new_stats[to_del]
                 n_stats_to_remove -= 1
@@ -1262,7 +1295,7 @@ class NpcFactory:
         import src.world.entities as entities
 
         available_convos = [c for c in Conversations.get_all() if (c.get_id() in from_convo_ids and c.is_available())]
-        random.shuffle(available_convos)
+        rng.worldgen().shuffle(available_convos)
 
         # can't have dupes of the same NPC in the zone
         used_npc_ids = set()
@@ -1288,7 +1321,7 @@ class NpcFactory:
         available_traders = [npc_id for npc_id in TEMPLATES if
                              get_template(npc_id).get_trade_protocol(level) is not None]
 
-        random.shuffle(available_traders)
+        rng.worldgen().shuffle(available_traders)
 
         import src.world.entities as entities
 
@@ -9,6 +9,7 @@ _USE_WORKING_DIR_FOR_SAVE_DATA = None
 _USE_WORKING_DIR_FLAG_NAME = "put_save_data_here.txt"
 
 _SAVE_DATA_DIR = "save_data"
+_SAVE_DATA_PATH_OVERRIDE = None
 
 _MY_NAME = "Ghast"
 _GAME_NAME = "Skeletris"
@@ -41,9 +42,17 @@ def get_user_appdata_path():
         return None
 
 
+def set_save_data_path_override(path):
+    """path: directory to use for save_data instead of the usual one (e.g. for replays), or None to clear it."""
+    global _SAVE_DATA_PATH_OVERRIDE
+    _SAVE_DATA_PATH_OVERRIDE = path
+
+
 def get_save_data_path(with_subpath=None):
     base_path = None
-    if not use_workingdir_for_save_data():
+    if _SAVE_DATA_PATH_OVERRIDE is not None:
+        base_path = pathlib.Path(_SAVE_DATA_PATH_OVERRIDE)
+    elif not use_workingdir_for_save_data():
         appdata_path = get_user_appdata_path()
         if appdata_path is not None:
             base_path = pathlib.Path(appdata_path, _SAVE_DATA_DIR)
@@ -58,3 +67,27 @@ def get_save_data_path(with_subpath=None):
     else:
         return base_path
 
+
+def read_save_data_files(exclude=("cache",)):
+    """returns: dict of (posix-style) path relative to the save_data directory -> text of the file."""
+    base_path = get_save_data_path()
+    res = {}
+    if not base_path.is_dir():
+        return res
+
+    for path in sorted(base_path.rglob("*")):
+        rel_path = path.relative_to(base_path)
+        if path.is_file() and rel_path.parts[0] not in exclude:
+            try:
+                res[rel_path.as_posix()] = path.read_text()
+            except (OSError, UnicodeDecodeError):
+                print("WARN: failed to read save_data file {}, skipping it".format(path))
+    return res
+
+
+def write_save_data_files(files, base_path):
+    """files: dict produced by read_save_data_files"""
+    for rel_path in files:
+        path = pathlib.Path(base_path, rel_path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(files[rel_path])
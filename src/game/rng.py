@@ -0,0 +1,132 @@
+import random
+
+"""
+Random number streams for the run, so that runs can be reproduced from a seed.
+
+Game logic shouldn't use the random module directly. Instead it should draw from the stream its randomness
+belongs to, so that (for example) a sound effect picking a random variant doesn't change which items drop:
+    worldgen: zones, items, loot, enemy and npc spawns.
+    combat: actor AI, combat rolls, and anything else that happens during turns.
+    cosmetic: animations, sounds, floating text, and other stuff that doesn't affect the game's state.
+
+The random module itself is seeded too, as a fallback for any code that still uses it.
+"""
+
+WORLDGEN = "worldgen"
+COMBAT = "combat"
+COSMETIC = "cosmetic"
+
+ALL_STREAMS = [WORLDGEN, COMBAT, COSMETIC]
+
+_seed = None
+_fixed_seed = None  # if set, every run uses this seed (e.g. from the command line)
+_streams = {}
+_zone_generation_counts = {}  # zone_id -> number of times it's been generated this run
+
+
+def new_seed():
+    """returns: a fresh seed, which doesn't depend on any of the seeded streams."""
+    return random.SystemRandom().randint(0, 2**32 - 1)
+
+
+def derive_seed(seed, *parts):
+    """returns: a seed that's determined by seed and parts, and is the same in every process."""
+    key = ":".join(str(p) for p in (seed,) + parts)
+    return random.Random(key).getrandbits(32)
+
+
+def seed_all(seed):
+    global _seed
+    _seed = seed
+    for stream in ALL_STREAMS:
+        _streams[stream] = random.Random(derive_seed(seed, stream))
+
+    random.seed(derive_seed(seed, "global"))
+    _zone_generation_counts.clear()
+
+
+def get_seed():
+    return _seed
+
+
+def set_fixed_seed(seed):
+    """seed: the seed that every run should use, or None to give each run its own seed."""
+    global _fixed_seed
+    _fixed_seed = seed
+
+
+def get_fixed_seed():
+    return _fixed_seed
+
+
+def start_run(save_data=None):
+    """
+        seeds all the streams for a new run (or for a run continued from save_data).
+        returns: the seed that was used.
+    """
+    import src.game.savedata as savedata
+
+    if _fixed_seed is not None:
+        seed = _fixed_seed
+    elif save_data is not None and save_data.get(savedata.SaveDataTags.RNG_SEED) is not None:
+        # mixing in the elapsed time, so that retrying from the same save doesn't replay the same luck,
+        # but loading the same file always does.
+        seed = derive_seed(save_data.get(savedata.SaveDataTags.RNG_SEED),
+                           save_data.get(savedata.SaveDataTags.ELAPSED_TIME))
+    else:
+        seed = new_seed()
+
+    seed_all(seed)
+    return seed
+
+
+def get(stream):
+    return _streams[stream]
+
+
+def worldgen():
+    return _streams[WORLDGEN]
+
+
+def combat():
+    return _streams[COMBAT]
+
+
+def cosmetic():
+    return _streams[COSMETIC]
+
+
+def zone_seed(zone_id):
+    """returns: the seed that zone_id will be generated from the next time it's generated this run."""
+    return derive_seed(_seed, "zone", zone_id, _zone_generation_counts.get(zone_id, 0))
+
+
+def zone_generated(zone_id):
+    _zone_generation_counts[zone_id] = _zone_generation_counts.get(zone_id, 0) + 1
+
+
+class Seeded:
+    """
+        temporarily replaces a stream with one that has the given seed, for generating something that
+        needs to come out the same no matter what's been drawn from the stream so far:
+
+            with rng.Seeded(rng.WORLDGEN, seed):
+                ...
+    """
+
+    def __init__(self, stream, seed):
+        self._stream = stream
+        self._seed = seed
+        self._prev = None
+
+    def __enter__(self):
+        self._prev = _streams[self._stream]
+        _streams[self._stream] = random.Random(self._seed)
+        return _streams[self._stream]
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        _streams[self._stream] = self._prev
+        return False
+
+
+seed_all(new_seed())
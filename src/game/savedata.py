@@ -3,17 +3,26 @@ import os
 import traceback
 import datetime
 import random
+import json
+import zlib
 
 import src.utils.util as util
 import src.game.pathutils as pathutils
 import src.game.version as version
 import src.items.itemencoder as itemencoder
+import src.game.savewriter as savewriter
 
 _all_tags = []
 
 
 _LOADED_FILES = []
 
+# summary of each save file's non-item tags, so the load and high score menus don't need to parse every save.
+# entries are keyed by filename, and are only trusted if the file's mtime and size haven't changed, and the
+# entry's own checksum is correct (otherwise editing the index would be a way around the save files' checksums).
+_INDEX_FILENAME = "save_index.json"
+_INDEX_VERSION = 2
+
 
 WIN_SAVE_ID = "normal_win"
 
@@ -49,6 +58,10 @@ def make_new_filepath():
     for fp in all_files_on_disk():
         used_names.add(fp)
 
+    # files that are about to be written are taken too
+    for fp in savewriter.get_instance().all_pending_filepaths():
+        used_names.add(fp)
+
     for i in range(1, 100):
         num_str = str(i).zfill(2)
         name = str(pathlib.Path(dir_path, "save_{}.txt".format(num_str)))
@@ -59,9 +72,13 @@ def make_new_filepath():
     return str(pathlib.Path(dir_path, "save_{}.txt".format(get_rand_alphanumeric_string(10))))
 
 
+# not the seeded random module, or else two runs with the same seed would get the same GAME_UID
+_UID_RANDOM = random.Random()
+
+
 def get_rand_alphanumeric_string(length):
     chars = "abcdefghijklmnopqrstuvwxyz" + "ABCDEFGHIJKLMNOPQRSTUVWXYZ" + "1234567890"
-    return "".join([random.choice(chars) for _ in range(0, length)])
+    return "".join([_UID_RANDOM.choice(chars) for _ in range(0, length)])
 
 
 def make_brand_new_blob():
@@ -73,14 +90,109 @@ def make_brand_new_blob():
     return res
 
 
+def _get_path_to_index():
+    return str(pathlib.Path(get_path_to_saves(), _INDEX_FILENAME))
+
+
+def _header_tags():
+    return [t for t in _all_tags if not SaveDataTags.is_item_tag(t) and t != SaveDataTags.CHECKSUM]
+
+
+def _load_index():
+    """returns: filename -> index entry, or an empty dict if there's no usable index."""
+    index_path = _get_path_to_index()
+    if not os.path.isfile(index_path):
+        return {}
+
+    try:
+        json_blob = util.Utils.load_json_from_path(index_path)
+        if json_blob.get("version") != _INDEX_VERSION or json_blob.get("tags") != _header_tags():
+            print("INFO: save index is out of date, rebuilding it")
+            return {}
+        return json_blob["files"]
+    except Exception:
+        print("WARN: failed to read save index, rebuilding it")
+        traceback.print_exc()
+        return {}
+
+
+def _save_index(index):
+    json_blob = {"version": _INDEX_VERSION,
+                 "tags": _header_tags(),
+                 "files": index}
+    try:
+        util.Utils.save_json_to_path(json_blob, _get_path_to_index())
+    except Exception:
+        print("WARN: failed to write save index")
+        traceback.print_exc()
+
+
+def _make_index_entry(filename, save_blob, file_stat):
+    entry = {"mtime_ns": file_stat.st_mtime_ns,
+             "size": file_stat.st_size,
+             "tags": {t: save_blob.get(t) for t in _header_tags()}}
+    entry[SaveDataTags.CHECKSUM] = _index_entry_checksum(filename, entry)
+    return entry
+
+
+def _index_entry_checksum(filename, entry):
+    """returns: checksum of the entry's contents (besides its checksum), and the name of the file it belongs to."""
+    contents = {k: entry[k] for k in entry if k != SaveDataTags.CHECKSUM}
+    return _checksum_of_text(filename + _CANONICAL_ENCODER.encode(contents))
+
+
+def _index_entry_is_valid(filename, entry, file_stat):
+    """returns: whether the entry can be used instead of loading the file."""
+    if entry is None or entry.get("mtime_ns") != file_stat.st_mtime_ns or entry.get("size") != file_stat.st_size:
+        return False
+
+    try:
+        checksum_is_valid = entry.get(SaveDataTags.CHECKSUM) == _index_entry_checksum(filename, entry)
+    except Exception:
+        checksum_is_valid = False
+
+    if not checksum_is_valid:
+        print("WARN: save index entry for {} has an incorrect checksum, reloading the file".format(filename))
+    return checksum_is_valid
+
+
+def _blob_from_index_entry(path_to_file, entry):
+    """returns: SaveDataBlob with the entry's tags, whose items will be loaded from the file when they're needed."""
+    ret = SaveDataBlob(filepath=path_to_file)
+    for t in _header_tags():
+        value = entry["tags"][t]
+        if t == SaveDataTags.VERSION_NUM and value is not None:
+            value = tuple(value)
+        ret.set(t, value)
+    ret.set(SaveDataTags.CHECKSUM, -1)
+
+    ret._set_items_lazily(None)
+    return ret
+
+
 def reload_all_save_data_from_disk():
+    savewriter.get_instance().flush()
     _LOADED_FILES.clear()
 
     uids_to_blobs = {}  # uid str -> SaveDataBlob
 
+    old_index = _load_index()
+    new_index = {}
+
     for fpath in all_files_on_disk():
         try:
-            save_blob = load_file(fpath)
+            filename = os.path.basename(fpath)
+            file_stat = os.stat(fpath)
+            entry = old_index.get(filename, None)
+
+            if _index_entry_is_valid(filename, entry, file_stat):
+                save_blob = _blob_from_index_entry(fpath, entry)
+            else:
+                save_blob = load_file(fpath)
+                entry = _make_index_entry(filename, save_blob, file_stat)
+
+            new_index[filename] = entry
+
             if save_blob is not None:
                 uid = save_blob.get(SaveDataTags.GAME_UID)
 
@@ -103,6 +215,9 @@ def reload_all_save_data_from_disk():
     for uid in uids_to_blobs:
         _LOADED_FILES.append(uids_to_blobs[uid])
 
+    if new_index != old_index:
+        _save_index(new_index)
+
     _LOADED_FILES.sort(key=lambda data: data.get_last_modified_time_for_sorting(), reverse=True)
 
 
@@ -130,16 +245,61 @@ def get_all_completed_save_data(load_if_needed=True, filter_non_standard_version
 _MOCK_CHECKSUM = 3141529   # security feature
 _CHECKSUM_MOD = 123342261  # a big prime
 
+# files without this key were checksummed with Utils.checksum, and are still accepted.
+# files with it are checksummed with a crc32 of their canonical json encoding (which is computed
+# over the encoded text in one go, instead of walking the whole blob again in python).
+_CHECKSUM_VERSION_KEY = "checksum_version"
+_CHECKSUM_VERSION = 2
+_CHECKSUM_SALT = b"c(._.)o"  # also a security feature
+
+_CANONICAL_ENCODER = json.JSONEncoder(sort_keys=True, separators=(",", ":"))
+
+
+def _checksum_of_text(text):
+    return zlib.crc32(text.encode("utf-8"), zlib.crc32(_CHECKSUM_SALT))
+
+
+def _encode_with_checksum(json_blob):
+    """
+        json_blob: the file's contents, not including the checksum.
+        returns: the text of the file. Its checksum is calculated over the canonical encoding of json_blob,
+                 and tacked onto the end.
+    """
+    text = _CANONICAL_ENCODER.encode(json_blob)
+    checksum = _checksum_of_text(text)
+
+    if not text.endswith("}"):
+        raise ValueError("expected a json object, instead got: {}".format(type(json_blob)))
+
+    trailer = ",\"{}\":{},\"{}\":{}}}".format(_CHECKSUM_VERSION_KEY, _CHECKSUM_VERSION,
+                                            SaveDataTags.CHECKSUM, checksum)
+    return text[:-1] + trailer
+
+
+def _verify_checksum(json_blob):
+    """returns: whether the checksum in a save file's json matches its contents."""
+    claimed_checksum = util.Utils.read_int(json_blob, SaveDataTags.CHECKSUM, -1)
+
+    if json_blob.get(_CHECKSUM_VERSION_KEY) == _CHECKSUM_VERSION:
+        contents = {k: json_blob[k] for k in json_blob if k not in (SaveDataTags.CHECKSUM, _CHECKSUM_VERSION_KEY)}
+        actual_checksum = _checksum_of_text(_CANONICAL_ENCODER.encode(contents))
+    else:
+        legacy_blob = dict(json_blob)
+        legacy_blob[SaveDataTags.CHECKSUM] = _MOCK_CHECKSUM
+        actual_checksum = util.Utils.checksum(legacy_blob, m=_CHECKSUM_MOD)
+
+    return actual_checksum == claimed_checksum
+
 
 def load_file(path_to_file):
+    if savewriter.get_instance().is_pending(path_to_file):
+        savewriter.get_instance().flush()
+
     json_blob = util.Utils.load_json_from_path(path_to_file)
 
     ret = SaveDataBlob(filepath=path_to_file)
 
-    claimed_checksum = util.Utils.read_int(json_blob, SaveDataTags.CHECKSUM, -1)
-
-    json_blob[SaveDataTags.CHECKSUM] = _MOCK_CHECKSUM
-    actual_checksum = util.Utils.checksum(json_blob, m=_CHECKSUM_MOD)
+    checksum_is_valid = _verify_checksum(json_blob)
 
     if SaveDataTags.VERSION_NUM in json_blob:
         try:
@@ -149,7 +309,7 @@ def load_file(path_to_file):
             bugfix = int(vers_list[2])
             desc = str(vers_list[3])
 
-            if actual_checksum != claimed_checksum:
+            if not checksum_is_valid:
                 print("WARN: checksum of {} is incorrect, marking as modified".format(path_to_file))
                 ret.set(SaveDataTags.VERSION_NUM, (major, minor, bugfix, "MOD"))
             else:
@@ -168,32 +328,39 @@ def load_file(path_to_file):
     ret.set(SaveDataTags.TURN_COUNT, util.Utils.read_int(json_blob, SaveDataTags.TURN_COUNT, 0))
     ret.set(SaveDataTags.DEATH_COUNT, util.Utils.read_int(json_blob, SaveDataTags.DEATH_COUNT, 0))
     ret.set(SaveDataTags.CHECKPOINT_COUNT, util.Utils.read_int(json_blob, SaveDataTags.CHECKPOINT_COUNT, 1))
+    ret.set(SaveDataTags.RNG_SEED, util.Utils.read_int(json_blob, SaveDataTags.RNG_SEED, None))
     ret.set(SaveDataTags.CHECKSUM, -1)  # only ever set at save time
 
     ret.set(SaveDataTags.SPAWN_ID, util.Utils.read_string(json_blob, SaveDataTags.SPAWN_ID, None))
 
-    inv_items_tag = SaveDataTags.INVENTORY_ITEMS
-    inv_pos_tag = SaveDataTags.INVENTORY_ITEM_POSITIONS
-    inv_items, inv_positions = _load_items_from_json(json_blob, inv_items_tag, inv_pos_tag)
-
-    ret.set(SaveDataTags.INVENTORY_ITEMS, inv_items)
-    ret.set(SaveDataTags.INVENTORY_ITEM_POSITIONS, inv_positions)
-
-    eq_items_tag = SaveDataTags.EQUIPMENT_ITEMS
-    eq_pos_tag = SaveDataTags.EQUIPMENT_ITEM_POSITIONS
-    eq_items, eq_positions = _load_items_from_json(json_blob, eq_items_tag, eq_pos_tag)
-
-    ret.set(SaveDataTags.EQUIPMENT_ITEMS, eq_items)
-    ret.set(SaveDataTags.EQUIPMENT_ITEM_POSITIONS, eq_positions)
-
     invalid_tags = ret._get_invalid_tags()
     if len(invalid_tags) > 0:
         pretty_string = ", ".join([invalid_tags[t] for t in invalid_tags])
         raise ValueError("Invalid tags in {}: {}".format(path_to_file, pretty_string))
 
+    # deserializing items is slow, and the menus that list saves don't need them
+    ret._set_items_lazily(json_blob)
+
     return ret
 
 
+def _load_all_items_from_json(json_blob):
+    """
+        returns: tag -> list, for all the item tags.
+    """
+    res = {}
+
+    inv_items_tag = SaveDataTags.INVENTORY_ITEMS
+    inv_pos_tag = SaveDataTags.INVENTORY_ITEM_POSITIONS
+    res[inv_items_tag], res[inv_pos_tag] = _load_items_from_json(json_blob, inv_items_tag, inv_pos_tag)
+
+    eq_items_tag = SaveDataTags.EQUIPMENT_ITEMS
+    eq_pos_tag = SaveDataTags.EQUIPMENT_ITEM_POSITIONS
+    res[eq_items_tag], res[eq_pos_tag] = _load_items_from_json(json_blob, eq_items_tag, eq_pos_tag)
+
+    return res
+
+
 def _load_items_from_json(json_blob, items_tag, positions_tag):
     """
         returns: list of items, list of (x, y) positions
@@ -227,6 +394,11 @@ def _load_items_from_json(json_blob, items_tag, positions_tag):
 
 
 def write_to_disk(save_blob):
+    """
+        Encodes the blob and writes it to disk in the background (see savewriter.py).
+        returns: False if the blob is invalid or can't be encoded, otherwise True. Failures to write the file
+                 are reported by savewriter's pop_failures.
+    """
     cur_version = version.get_version()
     blob_version = save_blob.get(SaveDataTags.VERSION_NUM)
     if blob_version is None or len(blob_version) != 4:
@@ -251,7 +423,7 @@ def write_to_disk(save_blob):
     json_blob = {}
 
     for t in _all_tags:
-        if not SaveDataTags.is_item_tag(t):
+        if not SaveDataTags.is_item_tag(t) and t != SaveDataTags.CHECKSUM:
             json_blob[t] = save_blob.get(t)  # these are just basic datatypes
 
     item_tag_pairs = [(SaveDataTags.INVENTORY_ITEMS, SaveDataTags.INVENTORY_ITEM_POSITIONS),
@@ -282,29 +454,25 @@ def write_to_disk(save_blob):
                 json_blob[item_list_tag].append(json_item)
                 json_blob[position_list_tag].append(pos)
 
-    if save_blob.filepath is None:
-        save_blob.filepath = make_new_filepath()
-
-    json_blob[SaveDataTags.CHECKSUM] = _MOCK_CHECKSUM
-    real_checksum = util.Utils.checksum(json_blob, m=_CHECKSUM_MOD)
-
-    json_blob[SaveDataTags.CHECKSUM] = real_checksum
-
     try:
-        # here goes nothing...
-        util.Utils.save_json_to_path(json_blob, save_blob.filepath)
+        text = _encode_with_checksum(json_blob)
     except Exception:
-        print("ERROR: failed to write game data to file: {}".format(save_blob.filepath))
+        print("ERROR: failed to encode game data, not saving")
         traceback.print_exc()
         return False
 
-    print("INFO: successfully saved game data to {}".format(save_blob.filepath))
+    if save_blob.filepath is None:
+        save_blob.filepath = make_new_filepath()
+
+    # here goes nothing...
+    savewriter.get_instance().write(save_blob.filepath, text, description="game data")
     return True
 
 
 def delete_from_disk(save_blob):
     the_filepath = save_blob.filepath
     if the_filepath is not None:
+        savewriter.get_instance().flush()  # or else a pending write would bring it back
         try:
             os.remove(str(the_filepath))
             return True
@@ -349,6 +517,9 @@ class SaveDataTags:
     # string: the save location's identifier
     SPAWN_ID = util.Utils.add_to_list_and_return("save_location_id", _all_tags)
 
+    # integer: seed of the run's random number streams, see rng.start_run
+    RNG_SEED = util.Utils.add_to_list_and_return("rng_seed", _all_tags)
+
     # integer: checksum of the (other) contents of the file
     CHECKSUM = util.Utils.add_to_list_and_return("checksum", _all_tags)
 
@@ -360,7 +531,8 @@ class SaveDataTags:
     @staticmethod
     def is_integer_tag(tag):
         return tag in (SaveDataTags.LAST_MODIFIED_TIME, SaveDataTags.ELAPSED_TIME, SaveDataTags.KILL_COUNT,
-                       SaveDataTags.DEATH_COUNT, SaveDataTags.TURN_COUNT, SaveDataTags.CHECKPOINT_COUNT, SaveDataTags.CHECKSUM)
+                       SaveDataTags.DEATH_COUNT, SaveDataTags.TURN_COUNT, SaveDataTags.CHECKPOINT_COUNT, SaveDataTags.CHECKSUM,
+                       SaveDataTags.RNG_SEED)
 
     @staticmethod
     def is_string_tag(tag):
@@ -382,7 +554,39 @@ class SaveDataBlob:
             else:
                 self.tags[t] = None
 
+        self._unloaded_item_tags = set()  # item tags that haven't been read from the file yet
+        self._item_json = None  # the file's json, if it's already been read
+
+    def _set_items_lazily(self, json_blob):
+        """
+            makes the item tags get loaded the first time they're accessed.
+            json_blob: the save file's json, or None to read it from the filepath when it's needed.
+        """
+        self._unloaded_item_tags = set(t for t in _all_tags if SaveDataTags.is_item_tag(t))
+        self._item_json = json_blob
+
+    def _load_items(self):
+        json_blob = self._item_json
+        if json_blob is None:
+            try:
+                json_blob = util.Utils.load_json_from_path(self.filepath)
+                if json_blob.get(SaveDataTags.GAME_UID) != self.tags[SaveDataTags.GAME_UID]:
+                    raise ValueError("file has a different {}".format(SaveDataTags.GAME_UID))
+            except Exception:
+                print("ERROR: failed to load items from save file: {}".format(self.filepath))
+                traceback.print_exc()
+                json_blob = {}
+
+        all_items = _load_all_items_from_json(json_blob)
+        for t in self._unloaded_item_tags:
+            self.tags[t] = all_items[t]
+
+        self._unloaded_item_tags.clear()
+        self._item_json = None
+
     def get(self, tag):
+        if tag in self._unloaded_item_tags:
+            self._load_items()
         return self.tags[tag]
 
     def set(self, tag, value):
@@ -413,6 +617,7 @@ class SaveDataBlob:
         if tag not in self.tags:
             raise ValueError("unrecognized tag: {}".format(tag))
 
+        self._unloaded_item_tags.discard(tag)
         self.tags[tag] = value
 
     def is_completed(self):
@@ -494,9 +699,11 @@ class SaveDataBlob:
         for t in _all_tags:
             if t not in self.tags:
                 res[t] = "{} is missing".format(t)
-            elif self.tags[t] is None:
+            elif self.tags[t] is None and t != SaveDataTags.RNG_SEED:
+                # saves from before seeded runs don't have an rng_seed, and just get a fresh one when they're loaded
                 res[t] = "{} is None".format(t)
 
+        # unloaded item lists are fine, they're made the same length when they're loaded
         t1 = SaveDataTags.INVENTORY_ITEMS
         t2 = SaveDataTags.INVENTORY_ITEM_POSITIONS
         if t1 not in res and t2 not in res:
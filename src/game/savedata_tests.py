@@ -0,0 +1,180 @@
+import os
+import sys
+import json
+import pathlib
+import tempfile
+
+import src.game.savedata as savedata
+import src.game.pathutils as pathutils
+import src.game.version as version
+import src.worldgen.zones as zones
+import src.utils.util as util
+import src.game.savewriter as savewriter
+
+"""
+Checks that save files written by older versions of the game still load, that the save index can't be used
+to get around the saves' checksums, and that failures to save are reported.
+
+usage: python -m src.game.savedata_tests
+"""
+
+
+def make_legacy_save_json(uid, spawn_id=savedata.WIN_SAVE_ID):
+    """
+        returns: the json of a save file as it was written before seeded runs and the crc32 checksum,
+                 i.e. without an rng_seed or a checksum_version.
+    """
+    json_blob = {
+        "game_uid": uid,
+        "version_num": [1, 0, 4, "BETA"],
+        "last_modified_time": 1600000000,
+        "elapsed_time": 123456,
+        "kill_count": 12,
+        "turn_count": 345,
+        "death_count": 1,
+        "checkpoint_count": 3,
+        "inventory_items": [],
+        "inventory_item_positions": [],
+        "equipment_items": [],
+        "equipment_item_positions": [],
+        "save_location_id": spawn_id,
+    }
+
+    json_blob["checksum"] = savedata._MOCK_CHECKSUM
+    json_blob["checksum"] = util.Utils.checksum(json_blob, m=savedata._CHECKSUM_MOD)
+    return json_blob
+
+
+def test_load_legacy_save():
+    """
+        returns: a description of the problem if a legacy save doesn't load, else None
+    """
+    old_override = pathutils._SAVE_DATA_PATH_OVERRIDE
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        pathutils.set_save_data_path_override(tmp_dir)
+        try:
+            os.makedirs(savedata.get_path_to_saves())
+            path = str(pathlib.Path(savedata.get_path_to_saves(), "save_01.txt"))
+            with open(path, "w") as f:
+                json.dump(make_legacy_save_json("legacy_uid"), f, indent=4, sort_keys=True)
+
+            blob = savedata.load_file(path)
+            if blob.get(savedata.SaveDataTags.RNG_SEED) is not None:
+                return "expected rng_seed to be None, instead got {}".format(
+                    blob.get(savedata.SaveDataTags.RNG_SEED))
+            if not blob.has_standard_version():
+                return "legacy checksum was rejected: {}".format(blob.get(savedata.SaveDataTags.VERSION_NUM))
+
+            # the first reload parses the file, the second one goes through the index
+            for i in range(0, 2):
+                savedata.reload_all_save_data_from_disk()
+                completed = savedata.get_all_completed_save_data(load_if_needed=False)
+                if [b.get(savedata.SaveDataTags.GAME_UID) for b in completed] != ["legacy_uid"]:
+                    return "legacy save is missing from the completed saves (reload #{})".format(i + 1)
+
+            return None
+        finally:
+            pathutils.set_save_data_path_override(old_override)
+            savedata._LOADED_FILES.clear()
+
+
+def _load_test_blob(uid):
+    """returns: a valid SaveDataBlob, loaded from a legacy save in the current save directory."""
+    os.makedirs(savedata.get_path_to_saves(), exist_ok=True)
+    path = str(pathlib.Path(savedata.get_path_to_saves(), "{}.txt".format(uid)))
+    with open(path, "w") as f:
+        json.dump(make_legacy_save_json(uid), f, indent=4, sort_keys=True)
+    return savedata.load_file(path)
+
+
+def test_edited_index_is_ignored():
+    """
+        returns: a description of the problem if an edited save index entry is trusted, else None
+    """
+    old_override = pathutils._SAVE_DATA_PATH_OVERRIDE
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        pathutils.set_save_data_path_override(tmp_dir)
+        try:
+            _load_test_blob("indexed_uid")
+            savedata.reload_all_save_data_from_disk()  # builds the index
+
+            index_path = savedata._get_path_to_index()
+            index = util.Utils.load_json_from_path(index_path)
+            for entry in index["files"].values():
+                entry["tags"][savedata.SaveDataTags.KILL_COUNT] = 9999
+            util.Utils.save_json_to_path(index, index_path)
+
+            savedata.reload_all_save_data_from_disk()
+            completed = savedata.get_all_completed_save_data(load_if_needed=False)
+            kill_counts = [b.get(savedata.SaveDataTags.KILL_COUNT) for b in completed]
+            if kill_counts != [12]:
+                return "expected the kill count from the save file (12), instead got {}".format(kill_counts)
+            return None
+        finally:
+            pathutils.set_save_data_path_override(old_override)
+            savedata._LOADED_FILES.clear()
+
+
+def test_unencodable_save_is_rejected():
+    """
+        returns: a description of the problem if write_to_disk accepts a blob that can't be encoded, else None
+    """
+    old_override = pathutils._SAVE_DATA_PATH_OVERRIDE
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        pathutils.set_save_data_path_override(tmp_dir)
+        try:
+            blob = _load_test_blob("bad_uid")
+            blob.tags[savedata.SaveDataTags.KILL_COUNT] = object()  # not json-able (and set() wouldn't allow it)
+
+            if savedata.write_to_disk(blob):
+                return "write_to_disk returned True for a blob that can't be encoded"
+            return None
+        finally:
+            savewriter.get_instance().flush()
+            pathutils.set_save_data_path_override(old_override)
+
+
+def test_write_failures_are_reported():
+    """
+        returns: a description of the problem if a failed background write isn't reported, else None
+    """
+    old_override = pathutils._SAVE_DATA_PATH_OVERRIDE
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        pathutils.set_save_data_path_override(tmp_dir)
+        try:
+            blob = _load_test_blob("unwritable_uid")
+
+            # a directory where the file should be, so it can't be replaced
+            blob.filepath = str(pathlib.Path(tmp_dir, "in_the_way"))
+            os.makedirs(pathlib.Path(blob.filepath, "child"))
+
+            savewriter.get_instance().pop_failures()
+            if not savedata.write_to_disk(blob):
+                return "write_to_disk rejected a valid blob"
+            savewriter.get_instance().flush()
+
+            failures = savewriter.get_instance().pop_failures()
+            if [f[0] for f in failures] != [blob.filepath]:
+                return "expected a failure for {}, instead got {}".format(blob.filepath, failures)
+            if len(savewriter.get_instance().pop_failures()) > 0:
+                return "failures weren't cleared after they were popped"
+            return None
+        finally:
+            pathutils.set_save_data_path_override(old_override)
+
+
+if __name__ == "__main__":
+    version.load_version_info()
+    zones.init_zones()
+
+    failures = 0
+    for test in [test_load_legacy_save, test_edited_index_is_ignored, test_unencodable_save_is_rejected,
+                 test_write_failures_are_reported]:
+        err = test()
+        if err is not None:
+            print("FAIL: {}: {}".format(test.__name__, err))
+            failures += 1
+        else:
+            print("PASS: {}".format(test.__name__))
+
+    sys.exit(0 if failures == 0 else 1)
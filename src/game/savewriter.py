@@ -0,0 +1,112 @@
+import atexit
+import threading
+import traceback
+
+import src.utils.util as util
+
+"""
+Writes save files and settings on a background thread, so that the game loop never waits on the disk.
+
+Callers snapshot whatever they're saving into plain json (or text) on the main thread, and hand it over along
+with a function that encodes it. If the same file is saved again before the previous write started, only the
+newest version gets written. Files are written to a temp file and then swapped into place, so a crash
+mid-write leaves the old file intact. Writes that fail are logged, and kept until a caller collects them
+with pop_failures.
+"""
+
+_instance = None
+
+
+def get_instance():
+    global _instance
+    if _instance is None:
+        _instance = SaveWriter()
+        atexit.register(_instance.flush)
+
+    return _instance
+
+
+class SaveWriter:
+
+    def __init__(self):
+        self._lock = threading.Condition()
+        self._pending = {}  # filepath -> (json_blob, encoder, description), in the order they were requested
+        self._writing = None  # filepath currently being written
+        self._thread = None  # started on demand
+        self._failures = {}  # filepath -> (description, error message), for writes that failed and weren't retried
+
+    def write(self, filepath, json_blob, encoder=None, description="data"):
+        """
+            filepath: where to write the file.
+            json_blob: snapshot of the data to save. it mustn't be modified afterwards.
+            encoder: function that takes json_blob and returns the text of the file. called on the worker thread.
+                     if None, json_blob is already the text of the file.
+            description: what's being saved, for logging.
+        """
+        filepath = str(filepath)
+        with self._lock:
+            if filepath in self._pending:
+                # replaced by the newer one (keeping its original place in line)
+                print("INFO: skipping stale write of {} to {}".format(description, filepath))
+
+            self._pending[filepath] = (json_blob, encoder, description)
+
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="save_writer", daemon=True)
+                self._thread.start()
+
+            self._lock.notify_all()
+
+    def is_pending(self, filepath):
+        """returns: whether filepath is waiting to be written, or is being written."""
+        filepath = str(filepath)
+        with self._lock:
+            return filepath in self._pending or filepath == self._writing
+
+    def all_pending_filepaths(self):
+        with self._lock:
+            res = list(self._pending.keys())
+            if self._writing is not None:
+                res.append(self._writing)
+            return res
+
+    def pop_failures(self):
+        """returns: list of (filepath, description, error message) for the writes that failed since the last call."""
+        with self._lock:
+            res = [(filepath, desc, msg) for filepath, (desc, msg) in self._failures.items()]
+            self._failures.clear()
+            return res
+
+    def flush(self, timeout=None):
+        """
+            waits for all the requested writes to finish.
+            returns: True if they all finished, False if the timeout ran out first.
+        """
+        with self._lock:
+            return self._lock.wait_for(lambda: len(self._pending) == 0 and self._writing is None, timeout=timeout)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                self._lock.wait_for(lambda: len(self._pending) > 0)
+                filepath = next(iter(self._pending))
+                json_blob, encoder, description = self._pending.pop(filepath)
+                self._writing = filepath
+
+            error = None
+            try:
+                text = encoder(json_blob) if encoder is not None else json_blob
+                util.Utils.write_text_atomically(text, filepath)
+                print("INFO: successfully saved {} to {}".format(description, filepath))
+            except Exception as e:
+                print("ERROR: failed to write {} to file: {}".format(description, filepath))
+                traceback.print_exc()
+                error = "{}: {}".format(type(e).__name__, e)
+
+            with self._lock:
+                if error is not None:
+                    self._failures[filepath] = (description, error)
+                else:
+                    self._failures.pop(filepath, None)
+                self._writing = None
+                self._lock.notify_all()
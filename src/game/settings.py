@@ -4,9 +4,11 @@ import src.game.sound_effects as sound_effects
 import src.game.music as music
 import src.game.debug as debug
 import src.game.pathutils as pathutils
+import src.game.savewriter as savewriter
 
 import pathlib
 import traceback
+import copy
 
 ALL_SETTINGS = {}
 ALL_KEY_SETTINGS = []
@@ -193,6 +195,8 @@ class Settings:
         if filenames is None:
             filenames = self.all_filenames()
 
+        savewriter.get_instance().flush()  # in case they were just saved
+
         for filename in filenames:
             filepath = self._to_filepath(filename)
             if not filepath.exists():
@@ -233,19 +237,13 @@ class Settings:
         for key in self.values:
             filename = ALL_SETTINGS[key].filename
             if filename in blob_per_file:
-                blob_per_file[filename][key] = self.values[key]
+                # copied, because the file is written in the background
+                blob_per_file[filename][key] = copy.deepcopy(self.values[key])
 
         for filename in blob_per_file:
             blob = blob_per_file[filename]
             filepath = self._to_filepath(filename)
-
-            try:
-                Utils.save_json_to_path(blob, filepath)
-                print("INFO: successfully saved settings to {}".format(filepath))
-
-            except Exception:
-                print("ERROR: failed to save settings to {}".format(filepath))
-                traceback.print_exc()
+            savewriter.get_instance().write(filepath, blob, Utils.to_pretty_json, description="settings")
 
     def up_key(self):
         return self.get(KeyBindings.KEY_UP)
@@ -1,5 +1,5 @@
-import random
 from src.utils.util import Utils
+import src.game.rng as rng
 
 #                  *----------------------------------------------------------------------*
 #                  | The Essential Retro Video Game Sound Effects Collection [512 sounds] |
@@ -641,7 +641,7 @@ def rand_deathscream_android():
         sfx_deathscream_android1, sfx_deathscream_android2, sfx_deathscream_android3, sfx_deathscream_android4,
         sfx_deathscream_android5, sfx_deathscream_android6, sfx_deathscream_android7, sfx_deathscream_android8,
     ]
-    return (random.choice(choices), 0.7)
+    return (rng.cosmetic().choice(choices), 0.7)
 
 
 def rand_deathscream_human():
@@ -652,12 +652,12 @@ def rand_deathscream_human():
         sfx_deathscream_human9, sfx_deathscream_human10, sfx_deathscream_human11, sfx_deathscream_human12,
         sfx_deathscream_human13, sfx_deathscream_human14
     ]
-    return (random.choice(choices), 0.4)
+    return (rng.cosmetic().choice(choices), 0.4)
 
 
 def rand_deathscream_robot():
     choices = [sfx_deathscream_robot1, sfx_deathscream_robot2, sfx_deathscream_robot3, sfx_deathscream_robot4]
-    return (random.choice(choices), 0.4)
+    return (rng.cosmetic().choice(choices), 0.4)
 
 
 def rand_damage_hit_small():
@@ -665,19 +665,19 @@ def rand_damage_hit_small():
     #           sfx_damage_hit5, sfx_damage_hit6, sfx_damage_hit7, sfx_damage_hit8,
     #           sfx_damage_hit9, sfx_damage_hit10]
     choices = [sfx_wpn_punch1, sfx_wpn_punch2, sfx_wpn_punch3, sfx_wpn_punch4]
-    return (random.choice(choices), 0.4)
+    return (rng.cosmetic().choice(choices), 0.4)
 
 
 def rand_heal_small():
     choices = [sfx_sounds_powerup10]
-    return (random.choice(choices), 0.3)
+    return (rng.cosmetic().choice(choices), 0.3)
 
 
 def rand_explosion_short():
     choices = [sfx_exp_short_soft1, sfx_exp_short_soft2, sfx_exp_short_soft3, sfx_exp_short_soft4,
                sfx_exp_short_soft5, sfx_exp_short_soft6, sfx_exp_short_soft7, sfx_exp_short_soft8,
                sfx_exp_short_soft9, sfx_exp_short_soft10, sfx_exp_short_soft11, sfx_exp_short_soft12]
-    return (random.choice(choices), 0.2)
+    return (rng.cosmetic().choice(choices), 0.2)
 
 
 def rand_explosion_medium():
@@ -685,12 +685,12 @@ def rand_explosion_medium():
                sfx_exp_medium5, sfx_exp_medium6, sfx_exp_medium7, sfx_exp_medium8,
                sfx_exp_medium9, sfx_exp_medium10, sfx_exp_medium11, sfx_exp_medium12,
                sfx_exp_medium13]
-    return (random.choice(choices), 0.2)
+    return (rng.cosmetic().choice(choices), 0.2)
 
 
 def rand_explosion_long():
     choices = [sfx_exp_long1, sfx_exp_long2, sfx_exp_long3, sfx_exp_long4, sfx_exp_long5, sfx_exp_long6]
-    return (random.choice(choices), 0.2)
+    return (rng.cosmetic().choice(choices), 0.2)
 
 
 
@@ -1,5 +1,11 @@
-import pygame
+import io
+import os
+import zlib
 import math
+import struct
+import hashlib
+import numpy
+import pygame
 
 from enum import Enum
 
@@ -718,6 +724,9 @@ def _get_wall_corner_loc(spot, bools, wall_pieces):
 
 
 cooldown_overlays = []
+_N_COOLDOWNS = 20
+_COOLDOWN_SIZE = 28
+_COOLDOWN_COLOR = (255, 255, 255)  # (196, 196, 196)
 
 
 def get_cooldown_img(progress):
@@ -727,13 +736,20 @@ def get_cooldown_img(progress):
 def _draw_cd_image(sheet, rect, prog, color):
     c_x = rect[0] + rect[2] / 2
     c_y = rect[1] + rect[3] / 2
-    for x in range(rect[0], rect[0] + rect[2]):
-        for y in range(rect[1], rect[1] + rect[3]):
-            if x % 2 == y % 2:
-                continue
-            angle_prog = (math.atan2(c_y - y, c_x - x) + math.pi) / (2 * math.pi)
-            if angle_prog > prog:
-                sheet.set_at((x, y), color)
+    xs = numpy.arange(rect[0], rect[0] + rect[2])[:, numpy.newaxis]
+    ys = numpy.arange(rect[1], rect[1] + rect[3])[numpy.newaxis, :]
+
+    angle_prog = (numpy.arctan2(c_y - ys, c_x - xs) + math.pi) / (2 * math.pi)
+    mask = (xs % 2 != ys % 2) & (angle_prog > prog)
+
+    # the pixel arrays lock the sheet, so they need to be released before it's blitted again
+    rgb = pygame.surfarray.pixels3d(sheet)[rect[0]:rect[0] + rect[2], rect[1]:rect[1] + rect[3]]
+    rgb[mask] = color
+    del rgb
+
+    alpha = pygame.surfarray.pixels_alpha(sheet)[rect[0]:rect[0] + rect[2], rect[1]:rect[1] + rect[3]]
+    alpha[mask] = 255
+    del alpha
 
 
 def _draw_dark_floor(sheet, darkness, src_rect, dest_rect):
@@ -741,20 +757,16 @@ def _draw_dark_floor(sheet, darkness, src_rect, dest_rect):
 
     MAX_CHANGE = 224
 
-    for x in range(dest_rect[0], dest_rect[0] + dest_rect[2]):
-        for y in range(dest_rect[1], dest_rect[1] + dest_rect[3]):
-            rgb = list(sheet.get_at((x, y)))
-            for i in range(0, 3):
-                val = rgb[i] / 255
-                new_val = (1 - darkness) * val ** (1 / (1 - darkness))
-                new_val = max(val - MAX_CHANGE, new_val)
-                rgb[i] = int(255 * new_val)
-            sheet.set_at((x, y), rgb)
+    rgb = pygame.surfarray.pixels3d(sheet)[dest_rect[0]:dest_rect[0] + dest_rect[2],
+                                           dest_rect[1]:dest_rect[1] + dest_rect[3]]
+    vals = rgb / 255
+    new_vals = (1 - darkness) * vals ** (1 / (1 - darkness))
+    new_vals = numpy.maximum(vals - MAX_CHANGE, new_vals)
+    rgb[:] = (255 * new_vals).astype(numpy.uint8)
+    del rgb
 
 
 def build_cine_sheet(start_pos, raw_cine_img, sheet):
-    sheet.blit(raw_cine_img, start_pos)
-
     cs = Cinematics
     cs.blank = cs.convert([(4, 0)], start_pos)
     cs.cave_horrors = cs.convert([(0, 0), (1, 0)], start_pos)
@@ -769,7 +781,6 @@ def build_cine_sheet(start_pos, raw_cine_img, sheet):
 
 
 def build_items_sheet(start_pos, raw_item_img, sheet):
-    sheet.blit(raw_item_img, start_pos)
     Items.piece_small = make(96, 80, 4, 4, shift=start_pos)
     Items.piece_small_inverted = make(100, 80, 4, 4, shift=start_pos)
     Items.piece_bigs = [make(112 + i * 16, 80, 16, 16, shift=start_pos) for i in range(0, 6)]
@@ -822,14 +833,10 @@ def build_items_sheet(start_pos, raw_item_img, sheet):
 
 
 def build_title_scene_sheet(start_pos, raw_title_scene_img, sheet):
-    sheet.blit(raw_title_scene_img, start_pos)
-
     TitleScene.frames = [make(i * 200, 0, 200, 150, shift=start_pos) for i in range(0, 2)]
 
 
 def build_ui_sheet(start_pos, raw_ui_img, sheet):
-    sheet.blit(raw_ui_img, start_pos)
-
     UI.inv_panel_top = make(0, 0, 160, 128, shift=start_pos)
     UI.inv_panel_mid = make(0, 128, 160, 16, shift=start_pos)
     UI.inv_panel_bot = make(0, 296, 160, 16, shift=start_pos)
@@ -912,8 +919,6 @@ def build_ui_sheet(start_pos, raw_ui_img, sheet):
 
 
 def build_boss_sheet(start_pos, raw_boss_img, sheet):
-    sheet.blit(raw_boss_img, start_pos)
-
     Bosses.robo_idle = [make(i * 64, 320, 64, 80, shift=start_pos) for i in range(0, 2)]
 
     Bosses.medusa_idle = [make(i * 48, 400, 48, 64, shift=start_pos) for i in range(0, 7)]
@@ -932,15 +937,11 @@ def build_boss_sheet(start_pos, raw_boss_img, sheet):
 
 
 def build_cave_horror_sheet(start_pos, raw_cave_horror_img, sheet):
-    sheet.blit(raw_cave_horror_img, start_pos)
-
     CaveHorror.cave_horror_idle = [make(i * 256, 0, 256, 240, shift=start_pos) for i in range(0, 2)]
     CaveHorror.cave_horror_dead = [make(i * 256, 240, 256, 240, shift=start_pos) for i in range(0, 2)]
 
 
 def build_animations_sheet(start_pos, raw_animations_img, sheet):
-    sheet.blit(raw_animations_img, start_pos)
-
     Animations.explosions = [make(i * 16, 0, 16, 16, shift=start_pos) for i in range(0, 8)]
     Animations.sleeping_zees = [make(i * 16, 16, 16, 16, shift=start_pos) for i in range(0, 8)]
     Animations.floor_breaking = [make(i * 16, 32, 16, 16, shift=start_pos) for i in range(0, 8)]
@@ -950,7 +951,6 @@ def build_animations_sheet(start_pos, raw_animations_img, sheet):
 
 
 def build_font_sheet(start_pos, raw_font_img, sheet):
-    sheet.blit(raw_font_img, start_pos)
     # sheet needs to be a 32x8 grid of characters
     char_w = round(raw_font_img.get_width() / 32)
     char_h = round(raw_font_img.get_height() / 8)
@@ -961,8 +961,10 @@ def build_font_sheet(start_pos, raw_font_img, sheet):
 
 
 def build_spritesheet(raw_image, raw_cine_img, raw_ui_img, raw_items_img, raw_boss_img, raw_cave_horror_img,
-                      raw_font_img, raw_animations_img, raw_title_scene_img):
+                      raw_font_img, raw_animations_img, raw_title_scene_img, cached_sheet=None):
     """
+        cached_sheet: a sheet that was previously built from the same images. If it's given, the sprites are
+            laid out as normal but nothing is drawn, and cached_sheet is returned.
         returns: Surface
         Here's how the final sheet is arranged:
         *-------------------------------*
@@ -994,43 +996,33 @@ def build_spritesheet(raw_image, raw_cine_img, raw_ui_img, raw_items_img, raw_bo
     sheet_size = (sheet_w, sheet_h)
     left_size = (raw_image.get_width(), sheet_size[1])
 
-    sheet = pygame.Surface(sheet_size, pygame.SRCALPHA, 32)
-    sheet.fill((255, 255, 255, 0))
-    sheet.blit(raw_image, (0, 0))
+    draw = cached_sheet is None
+    if draw:
+        sheet = pygame.Surface(sheet_size, pygame.SRCALPHA, 32)
+        sheet.fill((255, 255, 255, 0))
+        sheet.blit(raw_image, (0, 0))
+    else:
+        if cached_sheet.get_size() != sheet_size:
+            raise ValueError("cached sheet has the wrong size: {} != {}".format(cached_sheet.get_size(), sheet_size))
+        sheet = cached_sheet
+
+    right_sheets = [("cinematics", raw_cine_img, build_cine_sheet),
+                    ("ui", raw_ui_img, build_ui_sheet),
+                    ("items", raw_items_img, build_items_sheet),
+                    ("boss", raw_boss_img, build_boss_sheet),
+                    ("cave_horror", raw_cave_horror_img, build_cave_horror_sheet),
+                    ("animations", raw_animations_img, build_animations_sheet),
+                    ("font", raw_font_img, build_font_sheet),
+                    ("title_scene", raw_title_scene_img, build_title_scene_sheet)]
 
     _x = raw_image.get_width()
     _y = 0
-    print("INFO: building cinematics sheet...")
-    build_cine_sheet((_x, _y), raw_cine_img, sheet)
-    _y += raw_cine_img.get_height()
-
-    print("INFO: building ui sheet...")
-    build_ui_sheet((_x, _y), raw_ui_img, sheet)
-    _y += raw_ui_img.get_height()
-
-    print("INFO: building items sheet...")
-    build_items_sheet((_x, _y), raw_items_img, sheet)
-    _y += raw_items_img.get_height()
-
-    print("INFO: building boss sheet...")
-    build_boss_sheet((_x, _y), raw_boss_img, sheet)
-    _y += raw_boss_img.get_height()
-
-    print("INFO: building cave_horror sheet...")
-    build_cave_horror_sheet((_x, _y), raw_cave_horror_img, sheet)
-    _y += raw_cave_horror_img.get_height()
-
-    print("INFO: building animations sheet...")
-    build_animations_sheet((_x, _y), raw_animations_img, sheet)
-    _y += raw_animations_img.get_height()
-
-    print("INFO: building font sheet...")
-    build_font_sheet((_x, _y), raw_font_img, sheet)
-    _y += raw_font_img.get_height()
-
-    print("INFO: building title_scene sheet...")
-    build_title_scene_sheet((_x, _y), raw_title_scene_img, sheet)
-    _y += raw_title_scene_img.get_height()
+    for (name, img, build_func) in right_sheets:
+        print("INFO: building {} sheet...".format(name))
+        if draw:
+            sheet.blit(img, (_x, _y))
+        build_func((_x, _y), img, sheet)
+        _y += img.get_height()
 
     draw_y = raw_image.get_height()
 
@@ -1055,10 +1047,11 @@ def build_spritesheet(raw_image, raw_cine_img, raw_ui_img, raw_items_img, raw_bo
             if key in dupe_preventer:
                 wall_array[i] = dupe_preventer[key]
             else:
-                sheet.blit(raw_image, (draw_x, draw_y), tl)
-                sheet.blit(raw_image, (draw_x + 8, draw_y), tr)
-                sheet.blit(raw_image, (draw_x, draw_y + 8), bl)
-                sheet.blit(raw_image, (draw_x + 8, draw_y + 8), br)
+                if draw:
+                    sheet.blit(raw_image, (draw_x, draw_y), tl)
+                    sheet.blit(raw_image, (draw_x + 8, draw_y), tr)
+                    sheet.blit(raw_image, (draw_x, draw_y + 8), bl)
+                    sheet.blit(raw_image, (draw_x + 8, draw_y + 8), br)
                 model = make(draw_x, draw_y, 16, 16)
                 wall_array[i] = model
                 dupe_preventer[key] = model
@@ -1082,9 +1075,10 @@ def build_spritesheet(raw_image, raw_cine_img, raw_ui_img, raw_items_img, raw_bo
         h = 1
 
         for c in item:
-            dest = (draw_x + c[0]*4, draw_y + c[1]*4)
-            piece_rect = Items.piece_small.rect()
-            sheet.blit(sheet, dest, piece_rect)
+            if draw:
+                dest = (draw_x + c[0]*4, draw_y + c[1]*4)
+                piece_rect = Items.piece_small.rect()
+                sheet.blit(sheet, dest, piece_rect)
 
             w = max(c[0] + 1, w)
             h = max(c[1] + 1, h)
@@ -1121,9 +1115,10 @@ def build_spritesheet(raw_image, raw_cine_img, raw_ui_img, raw_items_img, raw_bo
                     draw_x = 0
                     draw_y += h
                 rect = [draw_x, draw_y, w, h]
-                opacity = 1 - frame / (circle_art_num_frames - 1)
-                generator = EffectCircles.get_generator(circle_type)
-                generator.draw(sheet, rect, frame / circle_art_num_frames, opacity=opacity)
+                if draw:
+                    opacity = 1 - frame / (circle_art_num_frames - 1)
+                    generator = EffectCircles.get_generator(circle_type)
+                    generator.draw(sheet, rect, frame / circle_art_num_frames, opacity=opacity)
 
                 EffectCircles.sprites[circle_type][h].append(make(rect[0], rect[1], rect[2], rect[3]))
 
@@ -1131,9 +1126,9 @@ def build_spritesheet(raw_image, raw_cine_img, raw_ui_img, raw_items_img, raw_bo
 
         draw_y += circle_art_heights[-1]
 
-    n_cooldowns = 20
-    cd_size = 28
-    cd_color = (255, 255, 255)  # (196, 196, 196)
+    n_cooldowns = _N_COOLDOWNS
+    cd_size = _COOLDOWN_SIZE
+    cd_color = _COOLDOWN_COLOR
     print("INFO: drawing {} cooldown overlays...".format(n_cooldowns))
 
     for i in range(0, n_cooldowns):
@@ -1141,7 +1136,8 @@ def build_spritesheet(raw_image, raw_cine_img, raw_ui_img, raw_items_img, raw_bo
             draw_x = 0
             draw_y += cd_size
         rect = [draw_x, draw_y, cd_size, cd_size]
-        _draw_cd_image(sheet, rect, i / n_cooldowns, cd_color)
+        if draw:
+            _draw_cd_image(sheet, rect, i / n_cooldowns, cd_color)
         cooldown_overlays.append(make(*rect))
         draw_x += cd_size
 
@@ -1163,7 +1159,8 @@ def build_spritesheet(raw_image, raw_cine_img, raw_ui_img, raw_items_img, raw_bo
                     draw_y += src_r[3]
                     dest_r = [draw_x, draw_y, src_r[2], src_r[3]]
 
-                _draw_dark_floor(sheet, darkness / floor_darkness_resolution, src_r, dest_r)
+                if draw:
+                    _draw_dark_floor(sheet, darkness / floor_darkness_resolution, src_r, dest_r)
                 _floor_lookup[(floor_id, encoding, darkness)] = make(dest_r[0], dest_r[1], dest_r[2], dest_r[3])
                 draw_x += dest_r[2]
 
@@ -1176,6 +1173,110 @@ def build_spritesheet(raw_image, raw_cine_img, raw_ui_img, raw_items_img, raw_bo
     return sheet
 
 
+# bump this when the way the sheet is drawn changes, so that old cached sheets aren't used
+_SPRITESHEET_CACHE_VERSION = 1
+_SPRITESHEET_CACHE_MAGIC = b"SKSHEET"
+
+
+def _spritesheet_cache_key(raw_datas):
+    """
+        raw_datas: the bytes of each of the sheet's source images.
+        returns: hash of everything that goes into drawing the sheet.
+    """
+    key = hashlib.sha1()
+    for data in raw_datas:
+        key.update(hashlib.sha1(data).digest())
+
+    params = (_SPRITESHEET_CACHE_VERSION, [wt[1] for wt in _wall_types], floor_darkness_resolution,
+              _N_COOLDOWNS, _COOLDOWN_SIZE, _COOLDOWN_COLOR, EffectCircleTypes.all_types(),
+              EffectCircles.all_heights(), EffectCircles.n_frames())
+    key.update(repr(params).encode("utf-8"))
+
+    # in dev, editing the generators (or the item shapes) should invalidate the cache too
+    import src.utils.geometricgen as geometricgen
+    import src.items.cubeutils as cubeutils
+    for module_file in (__file__, getattr(geometricgen, "__file__", None), getattr(cubeutils, "__file__", None)):
+        try:
+            with open(module_file, "rb") as f:
+                key.update(f.read())
+        except (OSError, TypeError):
+            pass  # probably running from a bundle, where the version number has to do
+
+    return key.hexdigest()
+
+
+def _load_cached_sheet(cache_path, key):
+    """returns: the cached sheet if it exists and was built with the same key, otherwise None."""
+    if cache_path is None or not os.path.isfile(cache_path):
+        return None
+
+    try:
+        with open(cache_path, "rb") as f:
+            header_len = len(_SPRITESHEET_CACHE_MAGIC) + 40 + 8
+            header = f.read(header_len)
+            if len(header) != header_len or not header.startswith(_SPRITESHEET_CACHE_MAGIC):
+                return None
+
+            cached_key = header[len(_SPRITESHEET_CACHE_MAGIC):-8].decode("ascii")
+            if cached_key != key:
+                print("INFO: cached spritesheet is out of date")
+                return None
+
+            w, h = struct.unpack("<II", header[-8:])
+            pixels = zlib.decompress(f.read())
+
+        return pygame.image.fromstring(pixels, (w, h), "RGBA")
+    except Exception as e:
+        print("WARN: failed to load cached spritesheet from {}: {}".format(cache_path, e))
+        return None
+
+
+def _save_cached_sheet(cache_path, key, sheet):
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        pixels = zlib.compress(pygame.image.tostring(sheet, "RGBA"), 1)
+
+        # written to a temp file first, so a half-written cache is never loaded
+        tmp_path = cache_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(_SPRITESHEET_CACHE_MAGIC)
+            f.write(key.encode("ascii"))
+            f.write(struct.pack("<II", sheet.get_width(), sheet.get_height()))
+            f.write(pixels)
+        os.replace(tmp_path, cache_path)
+
+        print("INFO: saved spritesheet to cache: {}".format(cache_path))
+    except Exception as e:
+        print("WARN: failed to save spritesheet to cache at {}: {}".format(cache_path, e))
+
+
+def load_spritesheet(filepaths, cache_path=None):
+    """
+        filepaths: the paths of the source images, in the order build_spritesheet takes them.
+        cache_path: where to cache the finished sheet. If the source images and generators haven't changed since
+            it was written, the sheet is loaded from there instead of being drawn again.
+        returns: Surface
+    """
+    raw_datas = []
+    for path in filepaths:
+        with open(Utils.resource_path(path), "rb") as f:
+            raw_datas.append(f.read())
+
+    raw_imgs = [pygame.image.load(io.BytesIO(data), path) for (data, path) in zip(raw_datas, filepaths)]
+
+    key = _spritesheet_cache_key(raw_datas) if cache_path is not None else None
+    cached_sheet = _load_cached_sheet(cache_path, key)
+
+    if cached_sheet is not None:
+        print("INFO: using cached spritesheet: {}".format(cache_path))
+        return build_spritesheet(*raw_imgs, cached_sheet=cached_sheet)
+    else:
+        sheet = build_spritesheet(*raw_imgs)
+        if cache_path is not None:
+            _save_cached_sheet(cache_path, key, sheet)
+        return sheet
+
+
 if __name__ == "__main__":
     import os
     raw = pygame.image.load(Utils.resource_path("assets/image.png"))
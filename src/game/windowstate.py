@@ -13,6 +13,8 @@ class WindowState:
 
         self._cached_fullscreen_size = None
 
+        self._is_shown = False  # headless runs never show the window, but can still be resized
+
     @staticmethod
     def create_instance(window_size=(640, 480), min_size=(0, 0)):
 
@@ -35,9 +37,13 @@ class WindowState:
         return mods
 
     def show(self):
+        self._is_shown = True
         self._update_display_mode()
 
     def _update_display_mode(self):
+        if not self._is_shown:
+            return
+
         if self._is_fullscreen:
             new_size = self._calc_fullscreen_size_for_set_mode()
             self._cached_fullscreen_size = new_size
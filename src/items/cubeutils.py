@@ -1,5 +1,202 @@
 import random
 
+import src.game.rng as rng
+
+# cube configurations that fit in a 5x5 box are also stored as bitmasks, where bit (y * 5 + x) is set
+# if there's a cube at (x, y). the masks are always pushed to the origin, so each shape has exactly one mask.
+BOX_SIZE = 5
+MAX_TABLE_CUBES = 7
+
+_COL_0 = sum(1 << (y * BOX_SIZE) for y in range(0, BOX_SIZE))
+_COL_LAST = _COL_0 << (BOX_SIZE - 1)
+_ROW_0 = (1 << BOX_SIZE) - 1
+_ROW_LAST = _ROW_0 << (BOX_SIZE * (BOX_SIZE - 1))
+_FULL = (1 << (BOX_SIZE * BOX_SIZE)) - 1
+
+
+def _in_box(cubes):
+    for c in cubes:
+        if not (0 <= c[0] < BOX_SIZE and 0 <= c[1] < BOX_SIZE):
+            return False
+    return True
+
+
+def to_mask(cubes):
+    """cubes: list of (x, y), all inside the box."""
+    res = 0
+    for c in cubes:
+        res |= 1 << (c[1] * BOX_SIZE + c[0])
+    return res
+
+
+def to_cubes(mask):
+    """returns: the mask's cubes, in the same order as CubeUtils.sort_cubes."""
+    res = []
+    idx = 0
+    while mask:
+        if mask & 1:
+            res.append((idx % BOX_SIZE, idx // BOX_SIZE))
+        mask >>= 1
+        idx += 1
+    return tuple(res)
+
+
+def _mask_size(mask):
+    w = 0
+    h = 0
+    for i in range(0, BOX_SIZE):
+        if mask & (_COL_0 << i):
+            w = i + 1
+        if mask & (_ROW_0 << (i * BOX_SIZE)):
+            h = i + 1
+    return (w, h)
+
+
+def _push_mask_to_origin(mask):
+    while mask & _COL_0 == 0:
+        mask >>= 1
+    while mask & _ROW_0 == 0:
+        mask >>= BOX_SIZE
+    return mask
+
+
+def _rotate_mask(mask):
+    """same rotation as CubeUtils.calc_rotation_mapping"""
+    return _push_mask_to_origin(to_mask((BOX_SIZE - 1 - c[1], c[0]) for c in to_cubes(mask)))
+
+
+def _mirror_mask(mask):
+    """same reflection as CubeUtils.calc_mirror_mapping"""
+    return _push_mask_to_origin(to_mask((BOX_SIZE - 1 - c[0], c[1]) for c in to_cubes(mask)))
+
+
+def _mask_is_holy(mask):
+    """same as CubeUtils.is_holy: whether there's an empty cell whose 4 neighbors are all cubes."""
+    left = (mask << 1) & ~_COL_0
+    right = (mask >> 1) & ~_COL_LAST
+    up = mask << BOX_SIZE
+    down = mask >> BOX_SIZE
+    return (~mask & left & right & up & down & _FULL) != 0
+
+
+class _ShapeTable:
+    """
+        Every cube configuration of up to MAX_TABLE_CUBES cubes that fits in the box (aka the fixed polyominoes),
+        along with their rotations, mirror images, holiness, and canonical (free polyomino) form.
+    """
+
+    def __init__(self):
+        self.configs_in_order = {}  # (n, size) -> list of masks, in the order get_all_possible_cube_configs returns them
+        self.masks_by_size = {}  # n -> list of all the masks with n cubes
+
+        self.rotated = {}    # mask -> mask
+        self.mirrored = {}   # mask -> mask
+        self.holy = {}       # mask -> bool
+        self.canonical = {}  # mask -> smallest mask among its rotations and mirror images
+        self.orientations = {}  # canonical mask -> sorted list of its distinct rotations and mirror images
+
+        all_masks = [1]
+        frontier = [1]
+        for _ in range(1, MAX_TABLE_CUBES):
+            next_frontier = set()
+            for mask in frontier:
+                for grown in _ShapeTable._grow(mask, (BOX_SIZE, BOX_SIZE)):
+                    next_frontier.add(grown)
+            frontier = sorted(next_frontier)
+            all_masks.extend(frontier)
+
+        for mask in all_masks:
+            n = bin(mask).count("1")
+            if n not in self.masks_by_size:
+                self.masks_by_size[n] = []
+            self.masks_by_size[n].append(mask)
+
+        for mask in all_masks:
+            self.rotated[mask] = _rotate_mask(mask)
+            self.mirrored[mask] = _mirror_mask(mask)
+            self.holy[mask] = _mask_is_holy(mask)
+
+        for mask in all_masks:
+            variants = set()
+            for m in (mask, self.mirrored[mask]):
+                for _ in range(0, 4):
+                    variants.add(m)
+                    m = self.rotated[m]
+            self.canonical[mask] = min(variants)
+            if self.canonical[mask] not in self.orientations:
+                self.orientations[self.canonical[mask]] = sorted(variants)
+
+    @staticmethod
+    def _grow(mask, size):
+        """
+            yields: the masks made by adding a cube next to one of mask's cubes, pushed to the origin,
+                    in the same order as the original list-based search (cube by cube, then by neighbor).
+        """
+        for cube in to_cubes(mask):
+            for n_offs in CubeUtils.NEIGHBORS:
+                x = cube[0] + n_offs[0]
+                y = cube[1] + n_offs[1]
+                grown = mask
+                if x < 0:
+                    if mask & _COL_LAST:
+                        continue
+                    grown = grown << 1
+                    x = 0
+                elif y < 0:
+                    if mask & _ROW_LAST:
+                        continue
+                    grown = grown << BOX_SIZE
+                    y = 0
+                elif x >= BOX_SIZE or y >= BOX_SIZE:
+                    continue
+
+                bit = 1 << (y * BOX_SIZE + x)
+                if grown & bit:
+                    continue
+                grown |= bit
+
+                g_size = _mask_size(grown)
+                if g_size[0] <= size[0] and g_size[1] <= size[1]:
+                    yield grown
+
+    def get_configs_in_order(self, n, size):
+        key = (n, size)
+        if key not in self.configs_in_order:
+            res = []
+            self._search(n - 1, size, 1, set(), res)
+            self.configs_in_order[key] = res
+        return self.configs_in_order[key]
+
+    def _search(self, n, size, base, already_seen, res):
+        if n <= 0:
+            return
+        for grown in _ShapeTable._grow(base, size):
+            if grown not in already_seen:
+                already_seen.add(grown)
+                if n == 1:
+                    res.append(grown)
+                else:
+                    self._search(n - 1, size, grown, already_seen, res)
+
+
+_SHAPE_TABLE = None
+
+
+def get_shape_table():
+    global _SHAPE_TABLE
+    if _SHAPE_TABLE is None:
+        _SHAPE_TABLE = _ShapeTable()
+    return _SHAPE_TABLE
+
+
+def _table_mask_for(cubes):
+    """returns: the cubes' mask, or None if the cubes aren't in the shape table (e.g. they aren't at the origin)."""
+    if len(cubes) == 0 or len(cubes) > MAX_TABLE_CUBES or not _in_box(cubes):
+        return None
+    mask = to_mask(cubes)
+    return mask if mask in get_shape_table().rotated else None
+
+
 class CubeUtils:
 
     @staticmethod
@@ -26,6 +223,10 @@ class CubeUtils:
 
     @staticmethod
     def rotate_cubes(cubes):
+        mask = _table_mask_for(cubes)
+        if mask is not None:
+            return to_cubes(get_shape_table().rotated[mask])
+
         rot_mapping = CubeUtils.calc_rotation_mapping(cubes)
         res = tuple(rot_mapping[cube] for cube in cubes)
         return CubeUtils.sort_cubes(res)
@@ -64,14 +265,9 @@ class CubeUtils:
 
         return res
 
-    @staticmethod
-    def do_seed(seed):
-        if seed is not None:
-            random.seed(seed)
-
     @staticmethod
     def gen_cubes(n, size=(5, 5), seed=None):
-        CubeUtils.do_seed(seed)
+        rand = random.Random(seed) if seed is not None else rng.worldgen()
         if n > size[0] * size[1]:
             raise ValueError("{} is too many cubes for {}".format(n, size))
 
@@ -79,27 +275,29 @@ class CubeUtils:
         for x in range(0, size[0]):
             for y in range(0, size[1]):
                 choices.append((x, y))
-        random.shuffle(choices)
+        rand.shuffle(choices)
         rejects = []
         neighbors = [(-1, 0), (1, 0), (0, -1), (0, 1)]
         diag = [(-1, -1), (1, -1), (1, 1), (-1, 1)]
         res = [choices.pop()]
+        res_set = set(res)
 
         while len(res) < n:
             c = choices.pop()
 
             # if it's touching a cube we already have, add it.
-            touch = sum([int((n[0] + c[0], n[1] + c[1]) in res) for n in neighbors])
-            touch_diag = sum([int((n[0] + c[0], n[1] + c[1]) in res) for n in diag])
+            touch = sum([int((n[0] + c[0], n[1] + c[1]) in res_set) for n in neighbors])
+            touch_diag = sum([int((n[0] + c[0], n[1] + c[1]) in res_set) for n in diag])
 
-            if touch > 0 and (touch_diag == 0 or random.random() < 0.5):
+            if touch > 0 and (touch_diag == 0 or rand.random() < 0.5):
                 res.append(c)
+                res_set.add(c)
             else:
                 rejects.append(c)
 
             if len(choices) == 0:
                 choices = rejects
-                random.shuffle(choices)
+                rand.shuffle(choices)
                 rejects = []
 
         res = CubeUtils.clean_cubes(res)
@@ -109,6 +307,14 @@ class CubeUtils:
     @staticmethod
     def is_holy(cubes):
         """return: whether the cube configuration has a hole"""
+        mask = _table_mask_for(cubes)
+        if mask is not None:
+            return get_shape_table().holy[mask]
+        else:
+            return CubeUtils._calc_is_holy(cubes)
+
+    @staticmethod
+    def _calc_is_holy(cubes):
         size = CubeUtils.item_size(cubes)
         for x in range(1, size[0] - 1):
             for y in range(1, size[1] - 1):
@@ -136,43 +342,50 @@ class CubeUtils:
 
     NEIGHBORS = [(-1, 0), (1, 0), (0, -1), (0, 1)]
 
-    @staticmethod
-    def _get_all_possible_cube_configs_helper(n, size, base, already_seen):
-        if n <= 0:
-            return []
-        else:
-            res = []
-            for cube in base:
-                for n_offs in CubeUtils.NEIGHBORS:
-                    neighbor = (cube[0] + n_offs[0], cube[1] + n_offs[1])
-                    if neighbor not in base:
-                        base_copy = [c for c in base]
-                        base_copy.append(neighbor)
-                        base_copy = CubeUtils.clean_cubes(base_copy)
-
-                        bc_size = CubeUtils.item_size(base_copy)
-
-                        if bc_size[0] <= size[0] and bc_size[1] <= size[1] and base_copy not in already_seen:
-                            already_seen.add(base_copy)
-                            if n == 1:
-                                res.append(base_copy)
-                            else:
-                                res.extend(CubeUtils._get_all_possible_cube_configs_helper(n - 1, size,
-                                                                                                      base_copy,
-                                                                                                      already_seen))
-            return res
-
     @staticmethod
     def get_all_possible_cube_configs(n=(5, 6, 7), size=(5, 5)):
         """
         :param n: number of allowable cubes. Either a list of numbers or a single number.
-        :param size: bounding size of allowable cube configs.
+        :param size: bounding size of allowable cube configs, up to (5, 5).
         :return: all possible cube configurations
         """
+        if size[0] > BOX_SIZE or size[1] > BOX_SIZE:
+            raise ValueError("cube configs can't be bigger than {}x{}: {}".format(BOX_SIZE, BOX_SIZE, size))
+
         try:
-            res = []
-            for num in n:
-                res.extend(CubeUtils._get_all_possible_cube_configs_helper(num - 1, size, [(0, 0)], set()))
-            return res
+            nums = list(n)
         except TypeError:
-            return CubeUtils._get_all_possible_cube_configs_helper(n - 1, size, [(0, 0)], set())
+            nums = [n]
+
+        res = []
+        for num in nums:
+            res.extend(to_cubes(mask) for mask in get_shape_table().get_configs_in_order(num, tuple(size)))
+        return res
+
+    @staticmethod
+    def get_all_free_cube_configs(n):
+        """returns: one cube configuration for each shape of n cubes, counting rotations and mirror images as the same."""
+        table = get_shape_table()
+        if n > MAX_TABLE_CUBES:
+            raise ValueError("can't list cube configs with more than {} cubes: {}".format(MAX_TABLE_CUBES, n))
+
+        masks = set(table.canonical[mask] for mask in table.masks_by_size.get(n, []))
+        return [to_cubes(mask) for mask in sorted(masks)]
+
+    @staticmethod
+    def get_all_orientations(cubes):
+        """
+            returns: the distinct rotations and mirror images of the cubes (including the cubes themselves, pushed to
+                     the origin), in a consistent order.
+        """
+        mask = _table_mask_for(CubeUtils.clean_cubes(cubes))
+        if mask is not None:
+            table = get_shape_table()
+            return [to_cubes(m) for m in table.orientations[table.canonical[mask]]]
+
+        res = set()
+        for m in (CubeUtils.clean_cubes(cubes), CubeUtils.clean_cubes(CubeUtils.calc_mirror_mapping(cubes).values())):
+            for _ in range(0, 4):
+                res.add(m)
+                m = CubeUtils.rotate_cubes(m)
+        return sorted(res, key=lambda c: [cube[0] + 1000 * cube[1] for cube in c])
@@ -1,4 +1,3 @@
-import random
 import uuid
 
 from src.game.stats import StatTypes, StatProvider
@@ -8,6 +7,7 @@ from src.items.cubeutils import CubeUtils
 import src.game.spriteref as spriteref
 import src.utils.colors as colors
 import src.game.balance as balance
+import src.game.rng as rng
 
 
 ITEM_CORE_NAME = {
@@ -434,7 +434,7 @@ class StatCubesItem(Item):
         new_art = {}
 
         artless_cubes = [c for c in new_cubes]
-        random.shuffle(artless_cubes)
+        rng.worldgen().shuffle(artless_cubes)
         for art_c in self.cube_art:
             if len(artless_cubes) > 0:  # shouldn't ever have a mismatch here, but ehh
                 new_art[artless_cubes.pop()] = self.cube_art[art_c]
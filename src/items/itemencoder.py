@@ -1,6 +1,7 @@
 
 import src.items.item as item
 import src.items.itemgen as itemgen
+import src.game.rng as rng
 
 
 # universal item attributes
@@ -224,11 +225,10 @@ def build_weapon_item(item_type, level, uid, rotation):
 
 
 if __name__ == "__main__":
-    import random
 
     n = 10000
     for i in range(0, n):
-        item_level = int(16 * random.random())
+        item_level = int(16 * rng.worldgen().random())
 
         rand_item = itemgen.ItemFactory.gen_item(item_level)
         as_json = item_to_json(rand_item)
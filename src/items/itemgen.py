@@ -1,4 +1,3 @@
-import random
 import math
 
 from src.items.item import ItemTypes, SpriteItem, StatCubesItem, AppliedStat, ItemTags
@@ -9,6 +8,7 @@ from src.items.cubeutils import CubeUtils
 import src.game.statuseffects as statuseffects
 import src.game.balance as balance
 import src.game.debug as debug
+import src.game.rng as rng
 
 
 CORE_STATS = [StatTypes.ATT, StatTypes.DEF, StatTypes.VIT]
@@ -22,14 +22,14 @@ class ItemFactory:
     def gen_item_type(level):
         if debug.ignore_loot_levels():
             item_type_choices = ItemTypes.all_types()
-            return random.choice(item_type_choices)
+            return rng.worldgen().choice(item_type_choices)
         else:
             item_type_choices = []
             for c in ItemTypes.all_types(at_level=level):
                 for _ in range(0, c.get_drop_rate()):
                     item_type_choices.append(c)
             if len(item_type_choices) > 0:
-                return random.choice(item_type_choices)
+                return rng.worldgen().choice(item_type_choices)
             else:
                 print("WARN: no valid item types to drop as loot at level: {}".format(level))
                 return None
@@ -91,7 +91,7 @@ class WeaponItemFactory:
         if item_type is None:
             all_types = ItemTypes.all_types(at_level=level, with_tags=(ItemTags.WEAPON,))
             if len(all_types) > 0:
-                item_type = random.choice(all_types)
+                item_type = rng.worldgen().choice(all_types)
             else:
                 print("WARN: no valid weapon types for level: {}".format(level))
                 return None
@@ -257,14 +257,14 @@ class PotionItemFactory:
         if template is None:
             if debug.ignore_loot_levels():
                 all_temps = [t for t in PotionTemplates.all_templates() if t not in not_templates]
-                template = None if len(all_temps) == 0 else random.choice(all_temps)
+                template = None if len(all_temps) == 0 else rng.worldgen().choice(all_temps)
             else:
                 all_temps = [t for t in PotionTemplates.all_templates(for_level=level) if t not in not_templates]
                 weighted_temps = []
                 for t in all_temps:
                     for _ in range(0, t.drop_rate):
                         weighted_temps.append(t)
-                template = None if len(weighted_temps) == 0 else random.choice(weighted_temps)
+                template = None if len(weighted_temps) == 0 else rng.worldgen().choice(weighted_temps)
 
         if template is None:
             return None
@@ -347,11 +347,11 @@ class StatCubesItemFactory:
 
     @staticmethod
     def gen_color_for_stats(stats):
-        color = tuple([0.5 + random.random() * 0.25] * 3)
+        color = tuple([0.5 + rng.worldgen().random() * 0.25] * 3)
         core_stats = [s for s in stats if s.get_type() in CORE_STATS]
         if len(core_stats) > 0:
-            rand1 = 0.5 + random.random() * 0.5
-            rand2 = 0.5 + random.random() * 0.5
+            rand1 = 0.5 + rng.worldgen().random() * 0.5
+            rand2 = 0.5 + rng.worldgen().random() * 0.5
             max_core = max(core_stats, key=lambda x: x.value)
             if max_core.stat_type is StatTypes.ATT:
                 color = (1, rand1, rand2)
@@ -366,29 +366,29 @@ class StatCubesItemFactory:
         """art_types: list of ints from 1 to 5"""
         cube_art = {}
         cubes_copy = [c for c in cubes]
-        random.shuffle(cubes_copy)
+        rng.worldgen().shuffle(cubes_copy)
 
         for i in range(0, len(stats)):
             if i < len(cubes_copy):
                 if i < len(art_types):
                     cube_art[cubes_copy[i]] = art_types[i]
                 else:
-                    cube_art[cubes_copy[i]] = 1 + int(5 * random.random())
+                    cube_art[cubes_copy[i]] = 1 + int(5 * rng.worldgen().random())
 
         return cube_art
 
     @staticmethod
     def gen_stat_types_for_cubes(level, cubes):
         # require at least one core stat
-        res = [random.choice(CORE_STATS), ]
+        res = [rng.worldgen().choice(CORE_STATS), ]
 
         choices = [s for s in CORE_STATS + NON_CORE_STATS if s != res[0]]
 
-        n_secondary_stats = int((balance.max_stats_for_n_cubes(len(cubes))) * random.random())
+        n_secondary_stats = int((balance.max_stats_for_n_cubes(len(cubes))) * rng.worldgen().random())
 
         for i in range(0, n_secondary_stats):
             if len(choices) > 0:
-                next_stat = random.choice(choices)
+                next_stat = rng.worldgen().choice(choices)
                 choices.remove(next_stat)
 
                 res.append(next_stat)
@@ -400,7 +400,7 @@ class StatCubesItemFactory:
         res = []
         for stat_type in stat_types:
             low, high = ItemStatRanges.get_range(stat_type, level)
-            res.append(AppliedStat(stat_type, random.randint(low, high)))
+            res.append(AppliedStat(stat_type, rng.worldgen().randint(low, high)))
 
         if CubeUtils.is_holy(cubes):
             for stat in res:
@@ -6,6 +6,8 @@ import math
 import re
 import traceback
 
+from src.renderengine.img import ImageBundle, ImageBlock
+
 
 def assert_int(val):
     if not isinstance(val, int):
@@ -19,26 +21,10 @@ def pad_or_trunc(l, length):
         return l[:length]
 
 
-def remove_all_in_place(l, elements):
-    if len(l) == 0:
-        return l
-
-    rem_set = set(elements)
-    last_element = len(l) - 1
-    i = 0
-
-    while i <= last_element:
-        if l[i] in rem_set:
-            while i <= last_element and l[last_element] in rem_set:
-                last_element -= 1
-            if i > last_element:
-                break
-            else:
-                l[i] = l[last_element]
-                last_element -= 1
-        i += 1
-
-    del l[(last_element+1):]
+def quad_indices(n_sprites):
+    """returns: the index array for drawing n_sprites quads as pairs of triangles."""
+    base = 4 * numpy.arange(n_sprites, dtype=numpy.uint32)[:, numpy.newaxis]
+    return (base + numpy.array([0, 1, 2, 0, 2, 3], dtype=numpy.uint32)).ravel()
 
 
 class _Layer:
@@ -51,22 +37,38 @@ class _Layer:
         """
         self.name = name
         self.layer_id = layer_id
-        self.images = []  # ordered list of image ids
-        self._image_set = set()
+        self.images = []  # slot -> image id, in draw order
+        self._slots = {}  # image id -> slot
+        self._depths = {}  # image id -> depth, only tracked if sort_sprites is true
+        self._image_set = set()  # image ids that will be in the layer after the next rebuild
         self._offset = (0, 0)
         self._z_order = z_order
         self.sort_sprites = sort_sprites
 
         # these are the pointers the layer passes to gl
-        self.vertices = numpy.array([], dtype=float)
-        self.tex_coords = numpy.array([], dtype=float)
-        self.indices = numpy.array([], dtype=float)
-        self.colors = numpy.array([], dtype=float) if use_color else None
-        
-        self._dirty_sprites = []
-        self._to_remove = []
-        self._to_add = []
-    
+        self.vertices = numpy.array([], dtype=numpy.float32)
+        self.tex_coords = numpy.array([], dtype=numpy.float32)
+        self.indices = numpy.array([], dtype=numpy.uint32)
+        self.colors = numpy.array([], dtype=numpy.float32) if use_color else None
+
+        self._capacity = 0  # number of sprites the arrays have room for
+        self._dirty_slots = None  # (start, end) range of slots that changed since the last upload
+
+        # gl buffer objects, only used if the engine supports them
+        self._vertex_vbo = None
+        self._tex_coord_vbo = None
+        self._color_vbo = None
+        self._index_vbo = None
+        self._vbo_capacity = 0  # capacity the buffers were last allocated with
+
+        self._dirty_sprites = set()
+        self._to_remove = set()
+        self._to_add = {}  # image id -> None, used as an ordered set
+
+        self._blocks = {}  # block id -> ImageBlock, drawn after the sprites, in the order they were added
+        self._block_buffers = {}  # block id -> (vertex, tex_coord, color, index) gl buffers
+        self._stale_block_buffers = []  # buffers of removed blocks, freed on the next render
+
     def set_offset(self, x, y):
         self._offset = (x, y)
 
@@ -76,16 +78,34 @@ class _Layer:
     def update(self, bundle_id):
         assert_int(bundle_id)
         if bundle_id in self._image_set:
-            self._dirty_sprites.append(bundle_id)
+            self._dirty_sprites.add(bundle_id)
         else:
             self._image_set.add(bundle_id)
-            self._to_add.append(bundle_id)
+            if bundle_id in self._to_remove:
+                # it never actually left, so it can keep its slot
+                self._to_remove.remove(bundle_id)
+                self._dirty_sprites.add(bundle_id)
+            else:
+                self._to_add[bundle_id] = None
         
+    def set_block(self, block):
+        if self.sort_sprites:
+            raise ValueError("layer {} sorts its sprites, so it can't hold blocks".format(self.name))
+        self._blocks[block.uid()] = block
+
     def remove(self, bundle_id):
         assert_int(bundle_id)
-        if bundle_id in self._image_set:
+        if bundle_id in self._blocks:
+            del self._blocks[bundle_id]
+            if bundle_id in self._block_buffers:
+                self._stale_block_buffers.append(self._block_buffers.pop(bundle_id))
+        elif bundle_id in self._image_set:
             self._image_set.remove(bundle_id)
-            self._to_remove.append(bundle_id)
+            if bundle_id in self._to_add:
+                del self._to_add[bundle_id]
+            else:
+                self._to_remove.add(bundle_id)
+            self._dirty_sprites.discard(bundle_id)
         
     def is_dirty(self):
         return len(self._dirty_sprites) + len(self._to_add) + len(self._to_remove) > 0
@@ -93,76 +113,280 @@ class _Layer:
     def uses_color(self):
         return self.colors is not None
         
-    def rebuild(self, bundle_lookup): 
-        if len(self._to_remove) > 0:
-            for bun_id in self._to_remove:
-                if bun_id in self._image_set:
-                    self._image_set.remove(bun_id)
+    def rebuild(self, bundle_lookup):
+        """
+            rewrites the sprites that changed since the last rebuild. Every sprite has a
+            stable slot in the arrays, so untouched sprites are left alone.
+        """
+        needs_reorder = False
 
-            remove_all_in_place(self.images, self._to_remove)
-            remove_all_in_place(self._to_add, self._to_remove)
+        if len(self._to_remove) > 0:
+            for uid in self._to_remove:
+                self._remove_slot(uid)
             self._to_remove.clear()
+            needs_reorder = True
 
         if len(self._to_add) > 0:
-            self.images.extend(self._to_add)
+            self._ensure_capacity(len(self.images) + len(self._to_add))
+            for uid in self._to_add:
+                self._slots[uid] = len(self.images)
+                self.images.append(uid)
+                self._dirty_sprites.add(uid)
             self._to_add.clear()
+            needs_reorder = True
 
+        dirty_bundles = [bundle_lookup[uid] for uid in self._dirty_sprites]
         self._dirty_sprites.clear()
-        
-        if self.sort_sprites:
-            self.images.sort(key=lambda x: -bundle_lookup[x].depth())
 
+        if self.sort_sprites:
+            for bundle in dirty_bundles:
+                uid = bundle.uid()
+                if uid not in self._depths or self._depths[uid] != bundle.depth():
+                    self._depths[uid] = bundle.depth()
+                    needs_reorder = True
+
+            if needs_reorder:
+                self._sort_slots()
+
+        slots = [self._slots[bundle.uid()] for bundle in dirty_bundles]
+        ImageBundle.add_all(dirty_bundles, slots, self.vertices, self.tex_coords, self.colors)
+        if len(slots) > 0:
+            self._mark_slots_dirty(min(slots), max(slots) + 1)
+
+    def _mark_slots_dirty(self, start, end):
+        if self._dirty_slots is None:
+            self._dirty_slots = (start, end)
+        else:
+            self._dirty_slots = (min(start, self._dirty_slots[0]), max(end, self._dirty_slots[1]))
+
+    def _remove_slot(self, uid):
+        """moves the last sprite into the removed sprite's slot."""
+        slot = self._slots.pop(uid)
+        last_slot = len(self.images) - 1
+        last_uid = self.images.pop()
+
+        if uid in self._depths:
+            del self._depths[uid]
+
+        if slot != last_slot:
+            self.images[slot] = last_uid
+            self._slots[last_uid] = slot
+            for arr, stride in self._arrays_with_strides():
+                arr[slot * stride:(slot + 1) * stride] = arr[last_slot * stride:(last_slot + 1) * stride]
+            self._mark_slots_dirty(slot, slot + 1)
+
+    def _sort_slots(self):
+        """reorders the slots (and their data) by descending depth. Ties keep their current order."""
         n_sprites = len(self.images)
+        if n_sprites <= 1:
+            return
+
+        neg_depths = numpy.array([-self._depths[uid] for uid in self.images])
+        order = numpy.argsort(neg_depths, kind="stable")
+        if (order[1:] > order[:-1]).all():
+            return  # already sorted
+
+        self.images = [self.images[i] for i in order]
+        for slot, uid in enumerate(self.images):
+            self._slots[uid] = slot
+
+        for arr, stride in self._arrays_with_strides():
+            used = arr[:n_sprites * stride].reshape(n_sprites, stride)
+            used[:] = used[order]
+        self._mark_slots_dirty(0, n_sprites)
+
+    def _arrays_with_strides(self):
+        yield self.vertices, 8
+        yield self.tex_coords, 8
+        if self.uses_color():
+            yield self.colors, 12
+
+    def _ensure_capacity(self, n_sprites):
+        if n_sprites <= self._capacity:
+            return
+
+        new_capacity = max(16, self._capacity)
+        while new_capacity < n_sprites:
+            new_capacity *= 2
 
         # need refcheck to be false or else Pycharm's debugger can cause this to fail (due to holding a ref)
-        self.vertices.resize(8 * n_sprites, refcheck=False)
-        self.tex_coords.resize(8 * n_sprites, refcheck=False)
-        self.indices.resize(6 * n_sprites, refcheck=False)
+        self.vertices.resize(8 * new_capacity, refcheck=False)
+        self.tex_coords.resize(8 * new_capacity, refcheck=False)
         if self.uses_color():
-            self.colors.resize(4 * 3 * n_sprites, refcheck=False)
-
-        for i in range(0, n_sprites):
-            bundle = bundle_lookup[self.images[i]]
-            bundle.add_urself(
-                    i,
-                    self.vertices, 
-                    self.tex_coords, 
-                    self.colors, 
-                    self.indices)
-            
+            self.colors.resize(4 * 3 * new_capacity, refcheck=False)
+
+        self.indices = quad_indices(new_capacity)
+        self._capacity = new_capacity
+
     def render(self, engine):
         # split up like this to make it easier to find performance bottlenecks
+        use_vbos = engine.supports_vbos()
+        if use_vbos and len(self._stale_block_buffers) > 0:
+            self._delete_stale_block_buffers()
+
+        if len(self.images) == 0 and len(self._blocks) == 0:
+            return
+
+        if use_vbos and len(self.images) > 0:
+            self._upload_buffers()
+
         self._set_client_states(True, engine)
-        self._pass_attributes(engine)
-        self._draw_elements()
+        if len(self.images) > 0:
+            self._pass_attributes(engine, use_vbos)
+            self._draw_elements(use_vbos)
+        for block in self._blocks.values():
+            self._render_block(block, engine, use_vbos)
         self._set_client_states(False, engine)
 
+    def _render_block(self, block, engine, use_vbos):
+        n_sprites = block.num_sprites()
+        if n_sprites == 0:
+            return
+
+        if use_vbos:
+            uid = block.uid()
+            if uid not in self._block_buffers:
+                self._block_buffers[uid] = self._upload_block(block)
+            vertex_vbo, tex_coord_vbo, color_vbo, index_vbo = self._block_buffers[uid]
+
+            glBindBuffer(GL_ARRAY_BUFFER, vertex_vbo)
+            engine.set_vertices(None)
+            glBindBuffer(GL_ARRAY_BUFFER, tex_coord_vbo)
+            engine.set_texture_coords(None)
+            if self.uses_color():
+                glBindBuffer(GL_ARRAY_BUFFER, color_vbo)
+                engine.set_colors(None)
+            glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+            glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, index_vbo)
+            glDrawElements(GL_TRIANGLES, 6 * n_sprites, GL_UNSIGNED_INT, None)
+            glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, 0)
+        else:
+            engine.set_vertices(block.vertices)
+            engine.set_texture_coords(block.tex_coords)
+            if self.uses_color():
+                engine.set_colors(block.colors)
+
+            if self._capacity < n_sprites:
+                # the layer's index array is only ever read, so it can be shared with the blocks
+                self._ensure_capacity(n_sprites)
+            glDrawElements(GL_TRIANGLES, 6 * n_sprites, GL_UNSIGNED_INT, self.indices)
+
+    def _upload_block(self, block):
+        """returns: (vertex, tex_coord, color, index) gl buffers holding the block's data."""
+        buffers = glGenBuffers(4)
+        for vbo, arr in zip(buffers, (block.vertices, block.tex_coords, block.colors)):
+            glBindBuffer(GL_ARRAY_BUFFER, vbo)
+            glBufferData(GL_ARRAY_BUFFER, arr.nbytes, arr, GL_STATIC_DRAW)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+        indices = quad_indices(block.num_sprites())
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, buffers[3])
+        glBufferData(GL_ELEMENT_ARRAY_BUFFER, indices.nbytes, indices, GL_STATIC_DRAW)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, 0)
+
+        printOpenGLError()
+        return tuple(buffers)
+
+    def _delete_stale_block_buffers(self):
+        for buffers in self._stale_block_buffers:
+            glDeleteBuffers(4, list(buffers))
+        self._stale_block_buffers.clear()
+
     def _set_client_states(self, enable, engine):
         engine.set_vertices_enabled(enable)
         engine.set_texture_coords_enabled(enable)
         if self.uses_color():
             engine.set_colors_enabled(enable)
 
-    def _pass_attributes(self, engine):
-        engine.set_vertices(self.vertices)
-        engine.set_texture_coords(self.tex_coords)
+    def _upload_buffers(self):
+        """sends the layer's data to its gl buffers. Only the slots that changed are uploaded."""
+        if self._vertex_vbo is None:
+            self._vertex_vbo, self._tex_coord_vbo, self._color_vbo, self._index_vbo = glGenBuffers(4)
+            self._vbo_capacity = -1
+
+        if self._vbo_capacity != self._capacity:
+            for vbo, arr, _ in self._buffers_with_strides():
+                glBindBuffer(GL_ARRAY_BUFFER, vbo)
+                glBufferData(GL_ARRAY_BUFFER, arr.nbytes, arr, GL_DYNAMIC_DRAW)
+
+            glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self._index_vbo)
+            glBufferData(GL_ELEMENT_ARRAY_BUFFER, self.indices.nbytes, self.indices, GL_STATIC_DRAW)
+            glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, 0)
+
+            self._vbo_capacity = self._capacity
+
+        elif self._dirty_slots is not None:
+            start, end = self._dirty_slots
+            for vbo, arr, stride in self._buffers_with_strides():
+                chunk = arr[start * stride:end * stride]
+                glBindBuffer(GL_ARRAY_BUFFER, vbo)
+                glBufferSubData(GL_ARRAY_BUFFER, start * stride * arr.itemsize, chunk.nbytes, chunk)
+
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        self._dirty_slots = None
+        printOpenGLError()
+
+    def _buffers_with_strides(self):
+        yield self._vertex_vbo, self.vertices, 8
+        yield self._tex_coord_vbo, self.tex_coords, 8
         if self.uses_color():
-            engine.set_colors(self.colors)
+            yield self._color_vbo, self.colors, 12
 
-    def _draw_elements(self):
-        glDrawElements(GL_TRIANGLES, len(self.indices), GL_UNSIGNED_INT, self.indices)
+    def release_buffers(self, delete=True):
+        """
+            forgets the layer's gl buffers, so they'll be rebuilt from scratch on the next render.
+            delete: whether to free them too (false if the gl context they lived in is already gone).
+        """
+        if self._vertex_vbo is not None and delete:
+            glDeleteBuffers(4, [self._vertex_vbo, self._tex_coord_vbo, self._color_vbo, self._index_vbo])
+        if delete:
+            for buffers in list(self._block_buffers.values()) + self._stale_block_buffers:
+                glDeleteBuffers(4, list(buffers))
+        self._block_buffers.clear()
+        self._stale_block_buffers.clear()
+
+        self._vertex_vbo = None
+        self._tex_coord_vbo = None
+        self._color_vbo = None
+        self._index_vbo = None
+        self._vbo_capacity = 0
+
+    def _pass_attributes(self, engine, use_vbos):
+        if use_vbos:
+            glBindBuffer(GL_ARRAY_BUFFER, self._vertex_vbo)
+            engine.set_vertices(None)
+            glBindBuffer(GL_ARRAY_BUFFER, self._tex_coord_vbo)
+            engine.set_texture_coords(None)
+            if self.uses_color():
+                glBindBuffer(GL_ARRAY_BUFFER, self._color_vbo)
+                engine.set_colors(None)
+            glBindBuffer(GL_ARRAY_BUFFER, 0)
+        else:
+            engine.set_vertices(self.vertices)
+            engine.set_texture_coords(self.tex_coords)
+            if self.uses_color():
+                engine.set_colors(self.colors)
+
+    def _draw_elements(self, use_vbos):
+        if use_vbos:
+            glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self._index_vbo)
+            glDrawElements(GL_TRIANGLES, 6 * len(self.images), GL_UNSIGNED_INT, None)
+            glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, 0)
+        else:
+            glDrawElements(GL_TRIANGLES, 6 * len(self.images), GL_UNSIGNED_INT, self.indices)
 
     def __len__(self):
         return len(self.images)   
         
     def __contains__(self, uid):
-        return uid in self._image_set
+        return uid in self._image_set or uid in self._blocks
         
     def z_order(self):
         return self._z_order
 
     def num_sprites(self):
-        return len(self.images)
+        return len(self.images) + sum(block.num_sprites() for block in self._blocks.values())
 
 
 def printOpenGLError():
@@ -238,11 +462,18 @@ class RenderEngine:
             return RenderEngine130()
 
     @staticmethod
-    def create_instance():
-        """intializes the RenderEngine singleton."""
+    def create_instance(headless=False):
+        """
+            intializes the RenderEngine singleton.
+            headless: if true, creates a RenderEngineNull, which doesn't need a gl context.
+        """
         global _SINGLETON
         if _SINGLETON is not None:
             raise ValueError("There is already a RenderEngine initialized.")
+        elif headless:
+            print("INFO: running without a renderer")
+            _SINGLETON = RenderEngineNull()
+            return _SINGLETON
         else:
             vstring = glGetString(GL_VERSION)
             vstring = vstring.decode() if vstring is not None else None
@@ -283,6 +514,7 @@ class RenderEngine:
         self.ordered_layers.sort(key=lambda x: x.z_order())
         
     def remove_layer(self, layer_id):
+        self.layers[layer_id].release_buffers()
         del self.layers[layer_id]
         
         self.ordered_layers = list(self.layers.values())
@@ -344,6 +576,10 @@ class RenderEngine:
     def get_glsl_version(self):
         raise NotImplementedError()
 
+    def supports_vbos(self):
+        """whether layers should keep their data in gl buffer objects, rather than passing client-side arrays."""
+        return False
+
     def build_shader(self):
         raise NotImplementedError()
 
@@ -403,6 +639,10 @@ class RenderEngine:
         if img_data is not None:
             self.set_texture(img_data, w, h, tex_id=self.tex_id)
 
+        # the layers' buffers went away with the old context
+        for layer in self.layers.values():
+            layer.release_buffers(delete=False)
+
     def set_texture(self, img_data, width, height, tex_id=None):
         """
             img_data: image data in string RGBA format.
@@ -447,10 +687,13 @@ class RenderEngine:
 
         for bun in img_bundle.all_bundles():
             uid = bun.uid()
-            self.bundles[uid] = bun
-
             layer = self.layers[bun.layer()]
-            layer.update(uid)
+            if isinstance(bun, ImageBlock):
+                layer.set_block(bun)
+            else:
+                layer.update(uid)
+
+            self.bundles[uid] = bun
         
     def __contains__(self, key):
         try:
@@ -526,6 +769,9 @@ class RenderEngine130(RenderEngine):
     def get_glsl_version(self):
         return "130"
 
+    def supports_vbos(self):
+        return True
+
     def build_shader(self):
         return Shader(
             '''
@@ -695,6 +941,9 @@ class RenderEngine120(RenderEngine130):
     def get_glsl_version(self):
         return "120"
 
+    def supports_vbos(self):
+        return False
+
     def build_shader(self):
         return Shader(
             '''
@@ -741,3 +990,36 @@ class RenderEngine120(RenderEngine130):
             }
             '''
         )
+
+
+class RenderEngineNull(RenderEngine):
+    """
+        Keeps track of bundles and rebuilds layers like a real engine, but never touches OpenGL.
+        Used to run the game without a window (for benchmarks and such).
+    """
+
+    def get_glsl_version(self):
+        return None
+
+    def init(self, w, h):
+        self.resize(w, h)
+
+    def reset_for_display_mode_change(self):
+        pass
+
+    def resize_internal(self):
+        pass
+
+    def set_clear_color(self, r, g, b):
+        pass
+
+    def set_texture(self, img_data, width, height, tex_id=None):
+        self.raw_texture_data = (img_data, width, height)
+
+    def render_layers(self):
+        for layer in self.ordered_layers:
+            if layer.is_dirty():
+                layer.rebuild(self.bundles)
+
+    def cleanup(self):
+        pass
@@ -2,9 +2,20 @@ from OpenGL.GL import *
 from OpenGL.GLU import *
 
 import random
+import numpy
 
 UNIQUE_ID_CTR = 0
 
+# the per-sprite attributes that get packed together when a layer is rebuilt in bulk.
+BUNDLE_DTYPE = numpy.dtype([
+    ("x", numpy.float64), ("y", numpy.float64),
+    ("w", numpy.float64), ("h", numpy.float64),
+    ("tx1", numpy.float64), ("ty1", numpy.float64), ("tx2", numpy.float64), ("ty2", numpy.float64),
+    ("scale", numpy.float64), ("ratio_x", numpy.float64), ("ratio_y", numpy.float64),
+    ("rotation", numpy.int32), ("xflip", numpy.bool_),
+    ("r", numpy.float32), ("g", numpy.float32), ("b", numpy.float32)
+])
+
 
 def gen_unique_id():
     """Note: this ain't threadsafe"""
@@ -125,66 +136,65 @@ class ImageBundle:
     def is_destroyed(self):
         return self._is_destroyed
         
-    def add_urself(self, i, vertices, texts, colors, indices):
+    def pack(self):
+        """returns: tuple of this bundle's attributes, in the order given by BUNDLE_DTYPE."""
+        model = self._model
+        rgb = self._color
+        if model is None:
+            return (self._x, self._y, 0, 0, 0, 0, 0, 0, self._scale, self._ratio[0], self._ratio[1],
+                    self._rotation, self._xflip, rgb[0], rgb[1], rgb[2])
+        else:
+            return (self._x, self._y, model.w, model.h, model.tx1, model.ty1, model.tx2, model.ty2,
+                    self._scale, self._ratio[0], self._ratio[1],
+                    self._rotation, self._xflip, rgb[0], rgb[1], rgb[2])
+
+    @staticmethod
+    def add_all(bundles, slots, vertices, texts, colors):
         """
-            i: sprite's "index", which determines where in the arrays its data is written.
+            writes the quads for many bundles at once.
+            bundles: list of ImageBundles
+            slots: list or array of sprite "indices", one per bundle, which determine where in the arrays
+                   each bundle's data is written.
+            vertices: flat array of 8 floats per sprite (the x, y of its 4 corners).
+            texts: flat array of 8 floats per sprite (the texture coords of its 4 corners).
+            colors: flat array of 12 floats per sprite (the rgb of its 4 corners), or None.
+            Indices aren't written here, because they only depend on the number of sprites (see quad_indices).
         """
-        x = self.x()
-        y = self.y()
+        n = len(bundles)
+        if n == 0:
+            return
 
-        model = self.model()
-        if model is None:
-            w = 0
-            h = 0
-        else:
-            w = model.w * self.scale() * self.ratio()[0]
-            h = model.h * self.scale() * self.ratio()[1]
-
-        if self.rotation() == 1 or self._rotation == 3:
-            temp_w = w
-            w = h
-            h = temp_w
-
-        vertices[i*8 + 0] = x
-        vertices[i*8 + 1] = y
-        vertices[i*8 + 2] = x
-        vertices[i*8 + 3] = y + h
-        vertices[i*8 + 4] = x + w
-        vertices[i*8 + 5] = y + h
-        vertices[i*8 + 6] = x + w
-        vertices[i*8 + 7] = y
+        packed = numpy.array([b.pack() for b in bundles], dtype=BUNDLE_DTYPE)
+        slots = numpy.asarray(slots, dtype=numpy.intp)
+
+        x = packed["x"]
+        y = packed["y"]
+        rot = packed["rotation"] % 4
+
+        w = packed["w"] * packed["scale"] * packed["ratio_x"]
+        h = packed["h"] * packed["scale"] * packed["ratio_y"]
+        sideways = (rot % 2) == 1
+        w, h = numpy.where(sideways, h, w), numpy.where(sideways, w, h)
+
+        verts = vertices.reshape(-1, 8)
+        verts[slots] = numpy.stack([x, y, x, y + h, x + w, y + h, x + w, y], axis=1)
 
         if colors is not None:
-            rgb = self.color()
-            for j in range(0, 12):
-                colors[i * 12 + j] = rgb[j % 3]
-
-        if model is not None:
-            corners = [
-                model.tx1, model.ty2,
-                model.tx1, model.ty1,
-                model.tx2, model.ty1,
-                model.tx2, model.ty2
-            ]
-
-            if self.xflip():
-                corners[0] = model.tx2
-                corners[2] = model.tx2
-                corners[4] = model.tx1
-                corners[6] = model.tx1
-
-            for _ in range(0, self.rotation()):
-                corners = corners[2:] + corners[:2]
-
-            for j in range(0, 8):
-                texts[i * 8 + j] = corners[j]
-
-        indices[6 * i + 0] = 4 * i
-        indices[6 * i + 1] = 4 * i + 1
-        indices[6 * i + 2] = 4 * i + 2
-        indices[6 * i + 3] = 4 * i
-        indices[6 * i + 4] = 4 * i + 2
-        indices[6 * i + 5] = 4 * i + 3
+            rgb = numpy.stack([packed["r"], packed["g"], packed["b"]], axis=1)
+            colors.reshape(-1, 12)[slots] = numpy.tile(rgb, 4)
+
+        left = numpy.where(packed["xflip"], packed["tx2"], packed["tx1"])
+        right = numpy.where(packed["xflip"], packed["tx1"], packed["tx2"])
+        corners = numpy.stack([left, packed["ty2"],
+                               left, packed["ty1"],
+                               right, packed["ty1"],
+                               right, packed["ty2"]], axis=1).reshape(n, 4, 2)
+
+        # each rotation shifts the texture corners over by one vertex
+        corner_idxs = (numpy.arange(4)[numpy.newaxis, :] + rot[:, numpy.newaxis]) % 4
+        corners = corners[numpy.arange(n)[:, numpy.newaxis], corner_idxs]
+
+        texts.reshape(-1, 8)[slots] = corners.reshape(n, 8)
 
     def __repr__(self):
         return "ImageBundle({}, {}, {}, {}, {}, {}, {}, {}, {}. {})".format(
@@ -192,6 +202,40 @@ class ImageBundle:
                 self.scale(), self.depth(), self.xflip(), self.color(), self.ratio(), self.uid())
 
 
+class ImageBlock:
+    """
+        Many bundles from the same layer, baked into a single block of vertex data that's drawn all at once.
+        Blocks can't be changed after they're made (to change one, bake a new one and replace it), so they're
+        meant for things that rarely change, like the world's geometry. Only layers that don't sort their
+        sprites can hold blocks.
+    """
+
+    def __init__(self, bundles, layer):
+        self._unique_id = gen_unique_id()
+        self._layer = layer
+        self._n_sprites = len(bundles)
+
+        self.vertices = numpy.zeros(8 * self._n_sprites, dtype=numpy.float32)
+        self.tex_coords = numpy.zeros(8 * self._n_sprites, dtype=numpy.float32)
+        self.colors = numpy.zeros(12 * self._n_sprites, dtype=numpy.float32)
+        ImageBundle.add_all(bundles, range(0, self._n_sprites), self.vertices, self.tex_coords, self.colors)
+
+    def layer(self):
+        return self._layer
+
+    def uid(self):
+        return self._unique_id
+
+    def num_sprites(self):
+        return self._n_sprites
+
+    def all_bundles(self):
+        yield self
+
+    def __repr__(self):
+        return "ImageBlock({}, {}, {})".format(self.layer(), self.num_sprites(), self.uid())
+
+
 class ImageModel:
 
     def __init__(self, x, y, w, h):
@@ -1,5 +1,3 @@
-import random
-
 import pygame
 
 import src.game.spriteref as spriteref
@@ -21,6 +19,7 @@ import src.game.gameengine as gameengine
 import src.game.version as version
 import src.game.savedata as savedata
 import src.game.constants as constants
+import src.game.rng as rng
 
 
 class MenuManager:
@@ -111,7 +110,9 @@ class MenuManager:
                     # as long as the window has focus, even after the cursor has left.
                     cursor = spriteref.UI.Cursors.arrow_cursor
 
-                if cursor is None:
+                if pygame.display.get_surface() is None:
+                    pass  # there's no window (we're running headless)
+                elif cursor is None:
                     pygame.mouse.set_cursor(*spriteref.UI.Cursors.invisible_cursor)
                 else:
                     pygame.mouse.set_cursor(*cursor)
@@ -1327,7 +1328,7 @@ class KeybindingEditMenu(OptionsMenu):
             pressed = input_state.all_pressed_keys()
             pressed = [x for x in pressed if self._is_valid_binding(x)]
             if len(pressed) > 0:
-                key = random.choice(pressed)  # TODO - better way to handle this?
+                key = rng.cosmetic().choice(pressed)  # TODO - better way to handle this?
                 gs.get_instance().settings().set(self._setting, [key])
                 gs.get_instance().save_settings_to_disk()
                 gs.get_instance().menu_manager().set_active_menu(self._return_menu_builder())
@@ -1482,7 +1483,7 @@ class DeathMenu(FadingInFlavorMenu):
                                     DeathOptionMenu(retry_save_data=retry_save_data), auto_next=True)
 
     def get_flavor_text(self):
-        idx = int(random.random() * len(DeathMenu.ALL_FLAVOR))
+        idx = int(rng.cosmetic().random() * len(DeathMenu.ALL_FLAVOR))
         return DeathMenu.ALL_FLAVOR[idx]
 
 
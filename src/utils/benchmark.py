@@ -0,0 +1,197 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+
+"""
+Runs the game without a window and reports how long each part of a frame takes, as json.
+
+usage: python -m src.utils.benchmark [zone_id ...] [--turns N] [--seed S] [--out FILE]
+"""
+
+PHASES = ["world_events", "world_update", "world_view_update", "menu_update", "layer_rebuilds"]
+
+# if the player goes this many ticks without taking a turn, they're probably stuck.
+_STUCK_TICKS = 30
+
+
+def _init_headless():
+    os.environ["SDL_VIDEODRIVER"] = "dummy"
+    os.environ["SDL_AUDIODRIVER"] = "dummy"
+
+    import src.game.debug as debug
+    import src.game.version as version
+    debug.init()
+    version.load_version_info()
+
+    import src.game.gameloop as gameloop
+    gameloop.init("benchmark", headless=True)
+
+
+def _summarize(durations):
+    """returns: stats about a list of durations (in seconds), in milliseconds."""
+    if len(durations) == 0:
+        return {"total": 0, "mean": 0, "p50": 0, "p95": 0, "max": 0}
+
+    ordered = sorted(durations)
+    n = len(ordered)
+    return {"total": round(1000 * sum(ordered), 3),
+            "mean": round(1000 * sum(ordered) / n, 4),
+            "p50": round(1000 * ordered[n // 2], 4),
+            "p95": round(1000 * ordered[min(n - 1, int(n * 0.95))], 4),
+            "max": round(1000 * ordered[-1], 4)}
+
+
+class _ScriptedPlayer:
+    """walks the player around randomly by 'holding' direction keys, like a real player would."""
+
+    def __init__(self, rand):
+        self._rand = rand
+        self._held_key = None
+        self._last_turn_count = -1
+        self._ticks_since_turn = 0
+
+    def update(self):
+        import src.game.globalstate as gs
+        from src.game.inputs import InputState
+        input_state = InputState.get_instance()
+        settings = gs.get_instance().settings()
+
+        if gs.get_instance().dialog_manager().is_active():
+            # mash through any dialog that pops up
+            input_state.set_key(settings.enter_key()[0], True)
+            input_state.set_key(settings.enter_key()[0], False)
+
+        turn_count = gs.get_instance().get_run_statistic(gs.RunStatisticTypes.TURN_COUNT)
+        if turn_count != self._last_turn_count or self._ticks_since_turn >= _STUCK_TICKS:
+            self._last_turn_count = turn_count
+            self._ticks_since_turn = 0
+
+            if self._held_key is not None:
+                input_state.set_key(self._held_key, False)
+
+            direction_keys = [settings.up_key(), settings.left_key(), settings.down_key(), settings.right_key()]
+            self._held_key = self._rand.choice(direction_keys)[0]
+            input_state.set_key(self._held_key, True)
+        else:
+            self._ticks_since_turn += 1
+
+        return turn_count
+
+
+def run_zone(zone_id, n_turns, seed):
+    """
+        builds the zone and plays n_turns turns in it.
+        returns: json-able dict of timings for the run.
+    """
+    import src.game.globalstate as gs
+    import src.ui.menus as menus
+    import src.worldgen.zones as zones
+    from src.world.worldview import WorldView
+    from src.renderengine.engine import RenderEngine
+    from src.game.inputs import InputState
+    import src.game.rng as rng
+
+    rand = random.Random(seed)
+
+    RenderEngine.get_instance().clear_all_sprites()
+    gs.create_new(menus.InGameUiState())
+    rng.seed_all(seed)
+
+    start_time = time.perf_counter()
+    world = zones.build_world(zone_id)
+    build_time = time.perf_counter() - start_time
+
+    gs.get_instance().set_world(world)
+    world_view = WorldView(world)
+
+    input_state = InputState.get_instance()
+    player = _ScriptedPlayer(rand)
+
+    timings = {phase: [] for phase in PHASES}
+    max_ticks = 4 * _STUCK_TICKS * (n_turns + 1)
+
+    turns_taken = 0
+    ticks = 0
+    while turns_taken < n_turns and ticks < max_ticks:
+        # the benchmark sticks to one world, so zone changes and such are ignored
+        gs.get_instance().global_event_queue().flip()
+
+        t0 = time.perf_counter()
+        if not gs.get_instance().menu_manager().pause_world_updates():
+            gs.get_instance().event_queue().flip()
+            gs.get_instance().update_world_stuff()
+        t1 = time.perf_counter()
+
+        turns_taken = player.update()
+        input_state.update(gs.get_instance().tick_counter)
+
+        world.update_all()
+        t2 = time.perf_counter()
+
+        world_view.update_all()
+        gs.get_instance().dialog_manager().update(world)
+        t3 = time.perf_counter()
+
+        gs.get_instance().menu_manager().update()
+        t4 = time.perf_counter()
+
+        RenderEngine.get_instance().render_layers()
+        t5 = time.perf_counter()
+
+        gs.get_instance().increment_tick_counts()
+        ticks += 1
+
+        for phase, duration in zip(PHASES, (t1 - t0, t2 - t1, t3 - t2, t4 - t3, t5 - t4)):
+            timings[phase].append(duration)
+
+        if world.get_player() is None:
+            break  # player died, probably
+
+    n_sprites = RenderEngine.get_instance().count_sprites()
+    world_view.cleanup_active_bundles()
+
+    return {"build_world_ms": round(1000 * build_time, 3),
+            "ticks": ticks,
+            "turns": turns_taken,
+            "sprites": n_sprites,
+            "phases": {phase: _summarize(timings[phase]) for phase in PHASES}}
+
+
+def run(zone_ids, n_turns, seed):
+    """returns: json-able dict of timings for each zone."""
+    _init_headless()
+
+    import src.worldgen.zones as zones
+    if len(zone_ids) == 0:
+        zone_ids = [zones.first_zone_id()]
+
+    res = {"seed": seed, "turns": n_turns, "zones": {}}
+    for zone_id in zone_ids:
+        print("INFO: benchmarking zone {}...".format(zone_id), file=sys.stderr)
+        res["zones"][zone_id] = run_zone(zone_id, n_turns, seed)
+
+    return res
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="runs the game headlessly and reports per-phase frame timings.")
+    parser.add_argument("zone_ids", nargs="*", help="zones to run (default: the first zone)")
+    parser.add_argument("--turns", type=int, default=100, help="number of player turns to play in each zone")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=None, help="file to write the results to (default: stdout)")
+    args = parser.parse_args()
+
+    # the game prints lots of INFO, so keep stdout clean for the results
+    real_stdout = sys.stdout
+    sys.stdout = sys.stderr
+    results = run(args.zone_ids, args.turns, args.seed)
+    sys.stdout = real_stdout
+
+    if args.out is not None:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
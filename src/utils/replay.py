@@ -0,0 +1,95 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+
+"""
+Plays back a recording made with skeletris.py --record, without a window and as fast as possible, and checks
+that the game ends up in the same state it did when it was recorded.
+
+usage: python -m src.utils.replay RECORDING [--out FILE]
+
+The replay runs against a copy of the save_data that was recorded along with the inputs, so it doesn't touch
+the real saves or settings. The display is sized (and resized) the same way it was during the recording.
+A mismatch means something that affects the game's state isn't deterministic (or that the game's behavior
+changed since the recording was made).
+"""
+
+
+def _init_headless():
+    os.environ["SDL_VIDEODRIVER"] = "dummy"
+    os.environ["SDL_AUDIODRIVER"] = "dummy"
+
+    import src.game.debug as debug
+    import src.game.version as version
+    debug.init()
+    version.load_version_info()
+
+    import src.game.gameloop as gameloop
+    gameloop.init("replay", headless=True)
+
+
+def replay(recording_path):
+    """returns: json-able dict describing how the replay went."""
+    import src.game.pathutils as pathutils
+    import src.game.rng as rng
+    from src.game.inputs import InputReplayer
+
+    replayer = InputReplayer.load_from_file(recording_path)
+
+    save_dir = tempfile.mkdtemp(prefix="skeletris_replay_")
+    try:
+        pathutils.write_save_data_files(replayer.get_save_files(), save_dir)
+        pathutils.set_save_data_path_override(save_dir)
+        rng.set_fixed_seed(replayer.get_seed())
+
+        _init_headless()
+
+        import src.game.gameloop as gameloop
+
+        # mouse positions and the ui layout depend on the size of the display
+        display_size = replayer.get_display_size()
+        if display_size is not None:
+            gameloop.resize_display(*display_size)
+
+        start_time = time.perf_counter()
+        gameloop.run(input_replayer=replayer)
+        replay_time = time.perf_counter() - start_time
+
+        expected = replayer.get_fingerprint()
+        actual = gameloop.get_run_fingerprint()
+    finally:
+        pathutils.set_save_data_path_override(None)
+        shutil.rmtree(save_dir, ignore_errors=True)
+
+    return {"recording": recording_path,
+            "seed": replayer.get_seed(),
+            "replay_s": round(replay_time, 3),
+            "matched": expected == actual,
+            "expected": expected,
+            "actual": actual}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="replays a recorded run headlessly and checks that it matches.")
+    parser.add_argument("recording", help="file made with skeletris.py --record")
+    parser.add_argument("--out", default=None, help="file to write the results to (default: stdout)")
+    args = parser.parse_args()
+
+    # the game prints lots of INFO, so keep stdout clean for the results
+    real_stdout = sys.stdout
+    sys.stdout = sys.stderr
+    results = replay(args.recording)
+    sys.stdout = real_stdout
+
+    if args.out is not None:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+
+    if not results["matched"]:
+        sys.exit(1)
@@ -289,21 +289,36 @@ class Utils:
             data = json.load(f)
             return data
 
+    @staticmethod
+    def to_pretty_json(json_blob):
+        return json.dumps(json_blob, indent=4, sort_keys=True)
+
     @staticmethod
     def save_json_to_path(json_blob, filepath):
         try:
-            json.dumps(json_blob, indent=4, sort_keys=True)
+            text = Utils.to_pretty_json(json_blob)
         except (ValueError, TypeError) as e:
             print("ERROR: tried to save invalid json to file: {}".format(filepath))
             print("ERROR: json_blob: {}".format(json_blob))
             raise e
 
+        Utils.write_text_atomically(text, filepath)
+
+    @staticmethod
+    def write_text_atomically(text, filepath):
+        """writes to a temp file first, so that the file is never left half-written (e.g. if the game crashes)."""
+        filepath = str(filepath)
         directory = os.path.dirname(filepath)
-        if not os.path.exists(directory):
-            os.makedirs(directory)
+        if directory != "" and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+
+        temp_filepath = filepath + ".tmp"
+        with open(temp_filepath, 'w') as outfile:
+            outfile.write(text)
+            outfile.flush()
+            os.fsync(outfile.fileno())
 
-        with open(filepath, 'w') as outfile:
-            json.dump(json_blob, outfile, indent=4, sort_keys=True)
+        os.replace(temp_filepath, filepath)
 
     @staticmethod
     def read_int(json_blob, key, default):
@@ -344,8 +359,10 @@ class Utils:
 
         decay = lambda t: math.exp(-falloff*(t / duration))
         num_keypoints = int(duration / freq)
-        x_pts = [round(2 * (0.5 - random.random()) * strength * decay(t * freq)) for t in range(0, num_keypoints)]
-        y_pts = [round(2 * (0.5 - random.random()) * strength * decay(t * freq)) for t in range(0, num_keypoints)]
+        import src.game.rng as rng
+        rand = rng.cosmetic()
+        x_pts = [round(2 * (0.5 - rand.random()) * strength * decay(t * freq)) for t in range(0, num_keypoints)]
+        y_pts = [round(2 * (0.5 - rand.random()) * strength * decay(t * freq)) for t in range(0, num_keypoints)]
         x_pts.append(0)
         y_pts.append(0)
 
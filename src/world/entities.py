@@ -1,5 +1,4 @@
 import pygame
-import random
 import math
 import traceback
 
@@ -19,6 +18,7 @@ import src.utils.colors as colors
 import src.game.stats as stats
 import src.game.debug as debug
 import src.game.constants as constants
+import src.game.rng as rng
 
 ENTITY_UID_COUNTER = 0
 
@@ -40,6 +40,7 @@ class Entity:
         self._shadow = None  # shadow image: ImageBundle
         self._last_vel = (0, 0)
         self._alive = False  # World sets this upon adding/removing the entity
+        self._position_listener = None  # World sets this too, to track the entity's cell and whether it's solid
 
     def __str__(self):
         typename = type(self).__name__
@@ -77,6 +78,10 @@ class Entity:
     def get_light_level(self):
         return 0
 
+    def can_emit_light(self):
+        """whether get_light_level can ever be non-zero. The World only checks these entities for light."""
+        return False
+
     def get_map_identifier(self):
         """returns: (char, color) or None"""
         return None
@@ -95,11 +100,20 @@ class Entity:
         self._x = x
         self.rect[0] = int(x)
         self._last_vel = (0, 0)
+        if self._position_listener is not None:
+            self._position_listener.entity_moved(self)
     
     def set_y(self, y):
         self._y = y
         self.rect[1] = int(y)
         self._last_vel = (0, 0)
+        if self._position_listener is not None:
+            self._position_listener.entity_moved(self)
+
+    def solidity_changed(self):
+        """should be called whenever is_solid may have changed without the entity moving."""
+        if self._position_listener is not None:
+            self._position_listener.entity_solidity_changed(self)
 
     def valid_to_stand_on(self, world, x, y):
         return not world.is_solid_at(x, y) and world.get_geo_at(x, y) != World.EMPTY
@@ -558,6 +572,9 @@ class LightEmitterAnimation(AnimationEntity):
         l_range = self.end_light - self.start_light
         return int(self.start_light + self.get_progress() * l_range)
 
+    def can_emit_light(self):
+        return True
+
 
 class FloatingTextEntity(Entity):
 
@@ -642,7 +659,7 @@ class ActorEntity(Entity):
         else:
             self.moving_sprites = Utils.listify(moving_sprites)
 
-        self._facing_right = random.random() > 0.5
+        self._facing_right = rng.cosmetic().random() > 0.5
         self.base_color = (1, 1, 1)
 
         # used by actions that require a custom animation.
@@ -716,6 +733,9 @@ class ActorEntity(Entity):
     def get_light_level(self):
         return self.get_actor_state().light_level()
 
+    def can_emit_light(self):
+        return True
+
     def set_vel(self, vel):
         """this doesn't move the actor or anything. just sets self._last_vel to whatever"""
         self._last_vel = vel
@@ -1361,7 +1381,7 @@ class ChestEntity(Entity):
         Entity.__init__(self, 0, 0, 12, 12)
         self.set_center((grid_x + 0.5) * constants.CELLSIZE, (grid_y + 0.5) * constants.CELLSIZE)
         self._is_open = is_open
-        self._left_side = random.random() > 0.5
+        self._left_side = rng.cosmetic().random() > 0.5
         
     def is_chest(self):
         return True
@@ -1415,6 +1435,7 @@ class ChestEntity(Entity):
             return
         else:
             self._is_open = True
+            self.solidity_changed()
             level = gs.get_instance().get_zone_level()
             loot = LootFactory.gen_chest_loot(level)
 
@@ -1429,7 +1450,7 @@ class PickupEntity(Entity):
 
     @staticmethod
     def rand_vel(speed=None, direction=None):
-        speed = speed if speed is not None else 1.5 + random.random()
+        speed = speed if speed is not None else 1.5 + rng.combat().random()
         if direction is None:
             direction = (0, 0)  # becomes random
         direction = Utils.set_length(direction, 1.0)
@@ -1443,7 +1464,7 @@ class PickupEntity(Entity):
         self.sprite_rotation = sprite_rotation
         self.vel = [vel[0], vel[1]] if vel is not None else ItemEntity.rand_vel()
         self.fric = 0.94
-        self.bounce_offset = int(random.random() * 100)
+        self.bounce_offset = int(rng.cosmetic().random() * 100)
 
         self.pickup_delay = 45
         self.time_touched = 0
@@ -1498,7 +1519,7 @@ class PickupEntity(Entity):
             nearby_ents = world.entities_in_circle(self.center(), self.push_radius)
             other_pickups = [i for i in nearby_ents if (i.is_pickup() or i.is_chest()) and i is not self]
             if len(other_pickups) > 0:
-                i = other_pickups[int(random.random()*len(other_pickups))]
+                i = other_pickups[int(rng.combat().random()*len(other_pickups))]
                 direction = Utils.sub(self.center(), i.center())
                 return Utils.set_length(direction, 0.375)
             else:
@@ -1631,7 +1652,7 @@ class DoorEntity(Entity):
 
         # invalid door, hopefully shouldn't happen
         print("WARN: door is neither horizontal nor vertical: {}".format(self))
-        return random.random() < 0.5
+        return rng.combat().random() < 0.5
 
     def get_sprites(self, world):
         if self.can_open(world):
@@ -1660,6 +1681,8 @@ class DoorEntity(Entity):
         else:
             self.custom_locked_message = None
 
+        self.solidity_changed()
+
     def is_interactable(self, world):
         return not self.can_open(world) and self.get_locked_message(world) is not None
 
@@ -1808,6 +1831,7 @@ class ExitEntity(Entity):
     def interact(self, world):
         if self.can_open():
             self._is_opening = True
+            self.solidity_changed()
             sound_effects.play_sound(soundref.exit_door_open)
 
             if self.does_level_end_heal():
@@ -1899,7 +1923,7 @@ class DecorationEntity(Entity):
         self._scale = scale
 
         self._anim_rate = anim_rate
-        self._anim_frm_offset = 0 if synced_animation else random.randint(0, 32)
+        self._anim_frm_offset = 0 if synced_animation else rng.cosmetic().randint(0, 32)
 
         sprites = Utils.listify(sprites)
 
@@ -1980,6 +2004,7 @@ class DecorationEntity(Entity):
 
     def set_interact_dialog(self, dialog):
         self._interact_dialog = dialog
+        self.solidity_changed()
 
     @staticmethod
     def wall_decoration(dec_type, sprites, grid_x, grid_y, scale=1, interact_dialog=None):
@@ -2548,6 +2573,7 @@ class SaveStation(Entity):
         import src.game.dialog as dialog
         if res:
             self.already_used = True
+            self.solidity_changed()
 
             hop_in_dialog = dialog.Dialog((">> Welcome to CloneBot!" if cp_count == 0 else ">> Welcome back!") + "\n"
                                           ">> Please enter the chamber.")
@@ -2576,6 +2602,7 @@ class SaveStation(Entity):
 
         else:
             self.already_used = False
+            self.solidity_changed()
             gs.get_instance().set_run_statistic(gs.RunStatisticTypes.CHECKPOINT_COUNT, cp_count)  # undo the inc
 
             gs.get_instance().dialog_manager().set_dialog(dialog.Dialog("Failed to Save."))
@@ -0,0 +1,127 @@
+import numpy
+
+# light levels are quantized to this many steps (above zero) before being handed to the World
+LIGHT_RESOLUTION = 255
+
+
+def _light_falloff(light_range):
+    """returns: square array of the light levels around a source with the given range, indexed [dx][dy]."""
+    offsets = numpy.arange(-light_range, light_range + 1)
+    dists = numpy.sqrt(offsets[:, numpy.newaxis] ** 2 + offsets[numpy.newaxis, :] ** 2)
+
+    mult = min(max((light_range / 6) ** (2 / 3), 0), 1)
+    levels = mult * (1 - (dists / light_range) ** 1.5)
+    levels[dists > light_range] = 0
+    return levels, dists <= light_range
+
+
+class LightMap:
+    """
+        Tracks the light that each light source contributes to the grid, so that only sources that have moved
+        (or whose surroundings changed) need to be recomputed. The final light grid is the max of the contributions.
+
+        Light spreads outward from a source through non-solid cells, and lights (but doesn't pass through) the
+        solid cells it reaches. Only lightable cells keep their light.
+    """
+
+    def __init__(self, geo, solid_ids, lightable_ids):
+        """
+            geo: the World's array of geo ids, indexed [x][y]. It's read directly, so changes to it must be
+                reported through cell_changed.
+        """
+        self._geo = geo
+        self._solid_ids = list(solid_ids)
+        self._lightable_ids = list(lightable_ids)
+        self._size = geo.shape
+
+        self._quantized = numpy.zeros(self._size, dtype=numpy.uint8)
+
+        self._contributions = {}  # (grid_x, grid_y, light_range) -> (x1, y1, ndarray of levels)
+        self._falloffs = {}  # light_range -> (levels, in_range)
+        self._dirty = False
+
+    def cell_changed(self, grid_x, grid_y):
+        """called when the geometry at a cell changes. Sources that could reach the cell will be recomputed."""
+        for src in list(self._contributions.keys()):
+            if abs(src[0] - grid_x) <= src[2] and abs(src[1] - grid_y) <= src[2]:
+                del self._contributions[src]
+        self._dirty = True
+
+    def is_dirty(self):
+        return self._dirty
+
+    def _get_falloff(self, light_range):
+        if light_range not in self._falloffs:
+            self._falloffs[light_range] = _light_falloff(light_range)
+        return self._falloffs[light_range]
+
+    def _calc_contribution(self, src):
+        grid_x, grid_y, light_range = src
+        levels, in_range = self._get_falloff(light_range)
+        size = 2 * light_range + 1
+
+        # the source's square, and the part of it that's actually on the grid
+        sx1 = grid_x - light_range
+        sy1 = grid_y - light_range
+        x1 = max(0, sx1)
+        y1 = max(0, sy1)
+        x2 = min(self._size[0], sx1 + size)
+        y2 = min(self._size[1], sy1 + size)
+        if x1 >= x2 or y1 >= y2:
+            return (x1, y1, numpy.zeros((0, 0), dtype=numpy.float32))
+
+        on_grid = (slice(x1 - sx1, x2 - sx1), slice(y1 - sy1, y2 - sy1))
+
+        passable = numpy.zeros((size, size), dtype=numpy.bool_)
+        passable[on_grid] = ~numpy.isin(self._geo[x1:x2, y1:y2], self._solid_ids)
+
+        # it's sometimes expected to have light sources embedded inside solid blocks
+        # (like when the player is walking through a door that's opening...)
+        passable[light_range, light_range] = True
+
+        reached = numpy.zeros((size, size), dtype=numpy.bool_)
+        reached[light_range, light_range] = True
+
+        # flood outward from the source, one step per iteration
+        while True:
+            spreading = reached & in_range & passable
+            grown = reached.copy()
+            grown[1:, :] |= spreading[:-1, :]
+            grown[:-1, :] |= spreading[1:, :]
+            grown[:, 1:] |= spreading[:, :-1]
+            grown[:, :-1] |= spreading[:, 1:]
+            if numpy.array_equal(grown, reached):
+                break
+            reached = grown
+
+        contribution = numpy.where(reached & in_range, levels, 0).astype(numpy.float32)
+        return (x1, y1, contribution[on_grid])
+
+    def update(self, sources):
+        """
+            sources: set of (grid_x, grid_y, int: light_range)
+            returns: (xs, ys, levels), arrays of the cells whose light level changed and their new levels.
+        """
+        for src in list(self._contributions.keys()):
+            if src not in sources:
+                del self._contributions[src]
+
+        for src in sources:
+            if src not in self._contributions and src[2] > 0:
+                self._contributions[src] = self._calc_contribution(src)
+
+        light = numpy.zeros(self._size, dtype=numpy.float32)
+        for x1, y1, contribution in self._contributions.values():
+            w, h = contribution.shape
+            region = light[x1:x1 + w, y1:y1 + h]
+            numpy.maximum(region, contribution, out=region)
+
+        quantized = numpy.ceil(light * LIGHT_RESOLUTION).astype(numpy.uint8)
+        quantized[~numpy.isin(self._geo, self._lightable_ids)] = 0
+
+        changed_xs, changed_ys = numpy.nonzero(quantized != self._quantized)
+        self._quantized = quantized
+        self._dirty = False
+
+        new_levels = quantized[changed_xs, changed_ys] / LIGHT_RESOLUTION
+        return changed_xs, changed_ys, new_levels
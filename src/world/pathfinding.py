@@ -0,0 +1,238 @@
+import heapq
+from collections import deque
+
+import src.game.rng as rng
+
+
+class PathFinder:
+    """
+        Finds shortest paths between cells of a grid. The search buffers are flat lists sized to the
+        grid, and they're reused between searches (each search just gets a new id, so nothing needs
+        to be cleared).
+    """
+
+    def __init__(self, width, height):
+        self._width = width
+        self._height = height
+
+        n_cells = width * height
+        self._visited_on = [0] * n_cells  # id of the last search that reached each cell
+        self._blocked_on = [0] * n_cells  # id of the last search where each cell failed cond
+        self._dists = [0] * n_cells
+        self._backrefs = [-1] * n_cells
+        self._search_id = 0
+
+    def _next_search_id(self):
+        self._search_id += 1
+        return self._search_id
+
+    def _is_valid(self, xy):
+        return 0 <= xy[0] < self._width and 0 <= xy[1] < self._height
+
+    def _idx(self, xy):
+        return xy[0] + xy[1] * self._width
+
+    def _xy(self, idx):
+        return (idx % self._width, idx // self._width)
+
+    def _neighbors(self, idx, randomize):
+        x = idx % self._width
+        y = idx // self._width
+        res = []
+        if x + 1 < self._width:
+            res.append(idx + 1)
+        if y + 1 < self._height:
+            res.append(idx + self._width)
+        if x > 0:
+            res.append(idx - 1)
+        if y > 0:
+            res.append(idx - self._width)
+        if randomize:
+            rng.combat().shuffle(res)
+        return res
+
+    def _passable(self, idx, search_id, cond):
+        """returns: whether cond allows the cell, calling cond at most once per cell per search."""
+        if cond is None:
+            return True
+        elif self._blocked_on[idx] == search_id:
+            return False
+        elif cond(self._xy(idx)):
+            return True
+        else:
+            self._blocked_on[idx] = search_id
+            return False
+
+    def _trace_back(self, idx):
+        """returns: list of cells from idx back to the search's origin."""
+        res = []
+        while idx != -1:
+            res.append(self._xy(idx))
+            idx = self._backrefs[idx]
+        return res
+
+    def find_path(self, p1, p2, max_length=-1, cond=None, randomize=False):
+        """
+            A* search with a manhattan distance heuristic.
+            p1, p2: start and end cells.
+            max_length: the maximum number of steps allowed, or -1 for no limit.
+            cond: lambda (x, y) -> bool, whether the path may pass through a cell. Not checked for p1.
+            randomize: if true, ties between equally good paths are broken randomly rather than
+                in the order the cells were found.
+            returns: list of cells from p1 to p2 (inclusive), or None if there's no such path.
+        """
+        if p1 == p2:
+            if cond is None or cond(p1):
+                return [p1]
+            else:
+                return None
+
+        if not self._is_valid(p1) or not self._is_valid(p2):
+            return None
+
+        gx, gy = p2
+        if -1 < max_length < abs(p1[0] - gx) + abs(p1[1] - gy):
+            return None
+
+        search_id = self._next_search_id()
+        visited_on = self._visited_on
+        dists = self._dists
+        backrefs = self._backrefs
+        width = self._width
+
+        start = self._idx(p1)
+        goal = self._idx(p2)
+
+        visited_on[start] = search_id
+        dists[start] = 0
+        backrefs[start] = -1
+
+        counter = 0
+        heap = [(0, 0, 0, start)]  # (estimated total length, estimated remaining length, tiebreak, cell)
+
+        while len(heap) > 0:
+            _, _, _, cur = heapq.heappop(heap)
+            if cur == goal:
+                return list(reversed(self._trace_back(goal)))
+
+            n_dist = dists[cur] + 1
+            for n in self._neighbors(cur, randomize):
+                if visited_on[n] == search_id and dists[n] <= n_dist:
+                    continue
+
+                n_h = abs(n % width - gx) + abs(n // width - gy)
+                if -1 < max_length < n_dist + n_h:
+                    continue
+
+                if not self._passable(n, search_id, cond):
+                    continue
+
+                visited_on[n] = search_id
+                dists[n] = n_dist
+                backrefs[n] = cur
+
+                counter += 1
+                tiebreak = rng.combat().random() if randomize else counter
+                heapq.heappush(heap, (n_dist + n_h, n_h, tiebreak, n))
+
+        return None
+
+    def distance_field(self, origin, max_dist, cond=None):
+        """
+            breadth-first search outward from origin.
+            max_dist: how far out to search.
+            cond: lambda (x, y) -> bool, whether a cell can be passed through. Not checked for the origin.
+            returns: a DistanceField containing every reachable cell within max_dist of origin.
+        """
+        dists = {}
+        if not self._is_valid(origin):
+            return DistanceField(origin, max_dist, dists)
+
+        search_id = self._next_search_id()
+        visited_on = self._visited_on
+        cell_dists = self._dists
+
+        start = self._idx(origin)
+        visited_on[start] = search_id
+        cell_dists[start] = 0
+        dists[origin] = 0
+
+        q = deque()
+        q.append(start)
+
+        while len(q) > 0:
+            cur = q.popleft()
+
+            n_dist = cell_dists[cur] + 1
+            if n_dist > max_dist:
+                continue
+
+            for n in self._neighbors(cur, False):
+                if visited_on[n] == search_id:
+                    continue
+                visited_on[n] = search_id
+                cell_dists[n] = n_dist
+
+                if self._passable(n, search_id, cond):
+                    dists[self._xy(n)] = n_dist
+                    q.append(n)
+
+        return DistanceField(origin, max_dist, dists)
+
+
+class DistanceField:
+    """
+        The number of steps from each cell to a shared origin. Lots of searchers heading to the same
+        place can follow the field downhill rather than each doing their own search.
+    """
+
+    def __init__(self, origin, max_dist, dists):
+        self._origin = origin
+        self._max_dist = max_dist
+        self._dists = dists  # (x, y) -> int
+
+    def get_origin(self):
+        return self._origin
+
+    def get_max_dist(self):
+        return self._max_dist
+
+    def covers(self, xy):
+        """whether a change at xy could affect the field."""
+        return abs(xy[0] - self._origin[0]) + abs(xy[1] - self._origin[1]) <= self._max_dist
+
+    def get_dist(self, xy):
+        """returns: the number of steps from xy to the origin, or None if it's not reachable within max_dist."""
+        return self._dists.get(xy, None)
+
+    def next_step(self, xy, max_length=-1, randomize=False, blocked=None):
+        """
+            max_length: the maximum length of the whole path from xy, or -1 for no limit.
+            blocked: lambda (x, y) -> bool, whether a cell can't be stepped into right now (e.g. because there's
+                     an actor in it). Not checked for the origin.
+            returns: the unblocked neighbor of xy that's closest to the origin, or None if there isn't one that's
+                     closer than xy itself.
+        """
+        my_dist = self._dists.get(xy, None)
+        best = []
+        best_dist = None
+        for n in [(xy[0] + 1, xy[1]), (xy[0], xy[1] + 1), (xy[0] - 1, xy[1]), (xy[0], xy[1] - 1)]:
+            n_dist = self._dists.get(n, None)
+            if n_dist is None or -1 < max_length < n_dist + 1:
+                continue
+            elif my_dist is not None and n_dist >= my_dist:
+                continue
+            elif blocked is not None and n != self._origin and blocked(n):
+                continue
+            elif best_dist is None or n_dist < best_dist:
+                best = [n]
+                best_dist = n_dist
+            elif n_dist == best_dist:
+                best.append(n)
+
+        if len(best) == 0:
+            return None
+        elif randomize:
+            return rng.combat().choice(best)
+        else:
+            return best[0]
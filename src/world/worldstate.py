@@ -1,10 +1,15 @@
-import random
+import heapq
+
+import numpy
 
 import src.game.spriteref as spriteref
 from src.utils.util import Utils
 import src.utils.colors as colors
 import src.game.globalstate as gs
 import src.game.constants as constants
+from src.world.pathfinding import PathFinder
+from src.world.lighting import LightMap
+import src.game.rng as rng
 
 CELLSIZE = constants.CELLSIZE  # it's 32
 
@@ -20,11 +25,14 @@ class World:
     
     def __init__(self, width, height):
         self._size = (width, height)
-        self._level_geo = []
-        self._level_lighting = []  # 0.0 = totally dark, 1.0 = fully lit
-        self._hidden = []
+
+        # these are all indexed [x][y]
+        self._level_geo = numpy.full((width, height), World.EMPTY, dtype=numpy.uint8)
+        self._level_lighting = numpy.zeros((width, height), dtype=numpy.float32)  # 0.0 = totally dark, 1.0 = fully lit
+        self._hidden = numpy.zeros((width, height), dtype=numpy.bool_)
 
         self._cached_light_sources = set()  # used to track changes in lighting between updates
+        self._light_map = LightMap(self._level_geo, World.SOLIDS, (World.FLOOR, World.DOOR))
 
         self._bg_color = (92, 92, 92)
 
@@ -32,21 +40,30 @@ class World:
         self._dirty_geo = set()
         self._needs_full_geo_rebuild = False
 
-        for _ in range(0, width):
-            self._level_geo.append([World.EMPTY] * height)
-            self._level_lighting.append([0.0] * height)
-            self._hidden.append([False] * height)
-
-        self.entities = []
+        self._entities = {}  # uid -> entity, in the order they were added
         self._ents_to_remove = set()
+
+        # subsets of self._entities, by type (see _TYPE_INDEXES). Each is uid -> entity, in the order they were added
+        self._entities_of_type = {index_type: {} for index_type, _ in World._TYPE_INDEXES}
+
+        # spatial index of self._entities, by the cell containing each entity's center
+        self._entities_by_cell = {}  # (grid_x, grid_y) -> dict of entity -> None (an ordered set)
+        self._entity_cells = {}      # entity -> (grid_x, grid_y)
         self._ents_to_add = []
-        self._onscreen_entities = set()
+        self._onscreen_entities = set()  # entities near enough to the camera or player to be updated
+
+        self._entity_order = {}  # entity -> int, increasing in the order entities were added
+        self._next_entity_order = 0
 
         # actors within this x, y range from player will act
         self._entity_act_range = (9, 8)
 
         self._camera_modifiers = []
 
+        self._path_finder = None  # built on demand
+        self._player_distance_field = None  # shared by enemies chasing the player, built on demand
+        self._static_blockers = set()  # non-actor entities that were solid when they were last indexed
+
         self._wall_type = spriteref.WALL_NORMAL_ID
         self._floor_type = spriteref.FLOOR_NORMAL_ID
 
@@ -92,7 +109,7 @@ class World:
         import src.world.entities as entities  # just chill, it's fine
         cx = entity.center()[0]
         cy = entity.center()[1]
-        x_render_offs = int(15 * (0.5 - random.random()))
+        x_render_offs = int(15 * (0.5 - rng.cosmetic().random()))
         text = entities.FloatingTextEntity(cx, cy, text, 25, color, anchor=None, scale=scale,
                                            start_offs=(x_render_offs, -16),
                                            end_offs=(x_render_offs, -32))
@@ -127,17 +144,16 @@ class World:
                         self.remove(dep_ent)
 
     def __contains__(self, entity):
-        return entity in self.entities
+        return self._entities.get(entity.get_uid()) is entity
         
     def get_player(self):
-        for e in self.entities:
-            if e.is_player():
-                return e
+        for e in self._entities_of_type["players"].values():
+            return e
         return None
 
     def get_npc(self, npc_id):
-        for e in self.entities:
-            if e.is_npc() and e.get_id() == npc_id:
+        for e in self._entities_of_type["npcs"].values():
+            if e.get_id() == npc_id:
                 return e
         return None
     
@@ -147,7 +163,18 @@ class World:
         """
         r2 = radius*radius
         res = []
-        search_space = self._onscreen_entities if onscreen else self.entities
+
+        min_xy = self.to_grid_coords(int(center[0] - radius), int(center[1] - radius))
+        max_xy = self.to_grid_coords(int(center[0] + radius), int(center[1] + radius))
+        n_cells = (max_xy[0] - min_xy[0] + 1) * (max_xy[1] - min_xy[1] + 1)
+
+        if n_cells < len(self._entities_by_cell):
+            search_space = self._entities_in_cell_rect(min_xy, max_xy)
+            if onscreen:
+                search_space = [e for e in search_space if e in self._onscreen_entities]
+        else:
+            search_space = self._onscreen_entities if onscreen else self._entities.values()
+
         for e in search_space:
             if cond is None or cond(e):
                 e_c = e.center()
@@ -173,29 +200,25 @@ class World:
             return None
 
     def get_entity(self, uid, onscreen=True):
-        if onscreen:
-            for e in self._onscreen_entities:
-                if e.get_uid() == uid:
-                    return e
-        else:
-            for e in self.entities:
-                if e.get_uid() == uid:
-                    return e
-        return None
+        e = self._entities.get(uid)
+        if e is not None and onscreen and e not in self._onscreen_entities:
+            return None
+        return e
 
     def all_entities(self, onscreen=False):
         if onscreen:
             for e in self._onscreen_entities:
                 yield e
         else:
-            for e in self.entities:
+            for e in list(self._entities.values()):
                 yield e
 
     def get_light_sources(self, onscreen=True):
         """returns: set of (grid_x, grid_y, int: light_range)"""
-        search_domain = self._onscreen_entities if onscreen else self.entities
         res = set()
-        for e in search_domain:
+        for e in self._entities_of_type["light_emitters"].values():
+            if onscreen and e not in self._onscreen_entities:
+                continue
             if e.get_light_level() > 0:
                 xy = self.to_grid_coords(e.center()[0], e.center()[1])
                 res.add((xy[0], xy[1], e.get_light_level()))
@@ -258,10 +281,12 @@ class World:
 
     def set_geo(self, grid_x, grid_y, geo_id):
         if self.is_valid(grid_x, grid_y):
-            old_geo_id = self._level_geo[grid_x][grid_y]
-            self._level_geo[grid_x][grid_y] = geo_id
+            old_geo_id = int(self._level_geo[grid_x, grid_y])
+            self._level_geo[grid_x, grid_y] = geo_id
 
             if old_geo_id != geo_id:
+                self._solidity_changed(grid_x, grid_y)
+                self._light_map.cell_changed(grid_x, grid_y)
                 self._dirty_geo.add((grid_x, grid_y))
                 for n in World.ALL_NEIGHBORS:
                     self._dirty_geo.add((grid_x + n[0], grid_y + n[1]))
@@ -275,10 +300,35 @@ class World:
 
     def get_geo(self, grid_x, grid_y):
         if self.is_valid(grid_x, grid_y):
-            return self._level_geo[grid_x][grid_y]
+            return int(self._level_geo[grid_x, grid_y])
         else:
             return World.EMPTY
 
+    def _get_grid_in_rect(self, grid, grid_rect, fill_value):
+        x, y, w, h = grid_rect
+        if 0 <= x and 0 <= y and x + w <= self._size[0] and y + h <= self._size[1]:
+            return grid[x:x + w, y:y + h]
+
+        res = numpy.full((max(0, w), max(0, h)), fill_value, dtype=grid.dtype)
+        x1, y1 = max(0, x), max(0, y)
+        x2, y2 = min(self._size[0], x + w), min(self._size[1], y + h)
+        if x1 < x2 and y1 < y2:
+            res[x1 - x:x2 - x, y1 - y:y2 - y] = grid[x1:x2, y1:y2]
+        return res
+
+    def get_geo_in_rect(self, grid_rect):
+        """
+            returns: array of the geo ids in grid_rect, indexed [x - rect_x][y - rect_y]. Cells outside the world
+                are EMPTY. If the rect is entirely inside the world this is a view into the world's grid, so
+                it shouldn't be modified.
+        """
+        return self._get_grid_in_rect(self._level_geo, grid_rect, World.EMPTY)
+
+    def get_geo_mask(self, geo_ids, grid_rect=None):
+        """returns: bool array of whether each cell (in grid_rect, or the whole world) is one of geo_ids."""
+        geo = self._level_geo if grid_rect is None else self.get_geo_in_rect(grid_rect)
+        return numpy.isin(geo, geo_ids)
+
     def get_geo_at(self, pixel_x, pixel_y):
         return self.get_geo(pixel_x // self.cellsize(), pixel_y // self.cellsize())
 
@@ -291,10 +341,14 @@ class World:
 
     def get_hidden(self, grid_x, grid_y):
         if self.is_valid(grid_x, grid_y):
-            return self._hidden[grid_x][grid_y]
+            return bool(self._hidden[grid_x, grid_y])
         else:
             return False
 
+    def get_hidden_in_rect(self, grid_rect):
+        """returns: bool array of the hidden flags in grid_rect, like get_geo_in_rect."""
+        return self._get_grid_in_rect(self._hidden, grid_rect, False)
+
     def get_decoration_type(self, grid_x, grid_y):
         if self.is_valid(grid_x, grid_y):
             ents = self.get_entities_in_cell(grid_x, grid_y, cond=lambda e: e.is_decoration())
@@ -310,81 +364,19 @@ class World:
         if not self.is_valid(grid_x, grid_y):
             return 0.0
         else:
-            return self._level_lighting[grid_x][grid_y]
-
-    def _set_lighting(self, grid_x, grid_y, val):
-        if val < 0 or val > 1:
-            raise ValueError("light value out of range: {}".format(val))
+            return float(self._level_lighting[grid_x, grid_y])
 
-        if not self.is_valid(grid_x, grid_y):
-            return
-        elif self._level_lighting[grid_x][grid_y] == val:
-            return
-        elif self.get_geo(grid_x, grid_y) in (World.FLOOR, World.DOOR):
-            self._dirty_geo.add((grid_x, grid_y))
-            self._level_lighting[grid_x][grid_y] = val
+    def get_lighting_in_rect(self, grid_rect):
+        """returns: float array of the light levels in grid_rect, like get_geo_in_rect."""
+        return self._get_grid_in_rect(self._level_lighting, grid_rect, 0.0)
 
-    def _recalc_lighting(self, old_lighting, new_lighting):
+    def _recalc_lighting(self, light_sources):
         """
-        :param old_lighting: set of (grid_x, grid_y, int: light range)
-        :param new_lighting: set of (grid_x, grid_y, int: light range)
+        :param light_sources: set of (grid_x, grid_y, int: light range)
         """
-
-        deleted = []
-        for src in old_lighting:
-            if src not in new_lighting:
-                deleted.append(src)
-
-        for d_src in deleted:
-            grid_x = d_src[0]
-            grid_y = d_src[1]
-            dist = d_src[2]
-
-            for x in range(grid_x - dist, grid_x + dist + 1):
-                for y in range(grid_y - dist, grid_y + dist + 1):
-                    self._set_lighting(x, y, 0.0)
-
-        if len(deleted) == 0:
-            to_add = []
-            for src in new_lighting:
-                if src not in old_lighting:
-                    to_add.append(src)
-        else:
-            to_add = new_lighting
-
-        for src in to_add:
-            grid_x = src[0]
-            grid_y = src[1]
-            max_dist = src[2]
-
-            processed = set()
-            q = [(grid_x, grid_y)]
-            processed.add(q[0])
-            rect = [grid_x - max_dist,
-                    grid_y - max_dist,
-                    2 * max_dist + 1,
-                    2 * max_dist + 1]
-
-            while len(q) > 0:
-                x, y = q.pop()
-
-                xy_dist = Utils.dist((x, y), (grid_x, grid_y))
-                if xy_dist <= max_dist:
-                    mult = Utils.bound((max_dist / 6) ** (2 / 3), 0, 1)
-                    level = mult * (1 - (xy_dist / max_dist) ** 1.5)
-                    if level > self.get_lighting(x, y):
-                        self._set_lighting(x, y, level)
-
-                    # it's sometimes expected to have light sources embedded inside solid blocks
-                    # (like when the player is walking through a door that's opening...)
-                    if (x, y) != (grid_x, grid_y) and self.is_solid(x, y):
-                        continue
-
-                    for n in Utils.neighbors(x, y):
-                        if n not in processed:
-                            if rect[0] <= n[0] < rect[0] + rect[2] and rect[1] <= n[1] < rect[1] + rect[3]:
-                                processed.add(n)
-                                q.append(n)
+        xs, ys, levels = self._light_map.update(light_sources)
+        self._level_lighting[xs, ys] = levels
+        self._dirty_geo.update(zip(xs.tolist(), ys.tolist()))
 
     def set_bg_color(self, color):
         self._bg_color = color
@@ -401,8 +393,8 @@ class World:
             self._geo_color = color
 
     def set_hidden(self, grid_x, grid_y, val, and_fill_adj_floors=True):
-        if self.get_geo(grid_x, grid_y) == World.FLOOR and self._hidden[grid_x][grid_y] != val:
-            self._hidden[grid_x][grid_y] = val
+        if self.get_geo(grid_x, grid_y) == World.FLOOR and self._hidden[grid_x, grid_y] != val:
+            self._hidden[grid_x, grid_y] = val
             self._dirty_geo.add((grid_x, grid_y))
 
             if and_fill_adj_floors:
@@ -410,10 +402,10 @@ class World:
                     self.set_hidden(grid_x + n[0], grid_y + n[1], val, and_fill_adj_floors=True)
 
     def hide_all_floors(self):
-        for x in range(0, self.size()[0]):
-            for y in range(0, self.size()[1]):
-                if self.get_geo(x, y) == World.FLOOR:
-                    self.set_hidden(x, y, True, and_fill_adj_floors=False)
+        to_hide = (self._level_geo == World.FLOOR) & ~self._hidden
+        self._hidden |= to_hide
+        xs, ys = numpy.nonzero(to_hide)
+        self._dirty_geo.update(zip(xs.tolist(), ys.tolist()))
 
     def is_solid_at(self, pixel_x, pixel_y, including_entities=False):
         grid_xy = self.to_grid_coords(pixel_x, pixel_y)
@@ -432,11 +424,9 @@ class World:
 
     def get_actor_in_cell(self, grid_x, grid_y):
         """returns: an ActorEntity, if there's an actor entity in the specified cell"""
-        for e in self.entities:
+        for e in self._entities_by_cell.get((grid_x, grid_y), ()):
             if e.is_actor():
-                grid_pos = self.to_grid_coords(e.center()[0], e.center()[1])
-                if grid_x == grid_pos[0] and grid_y == grid_pos[1]:
-                    return e
+                return e
         return None
 
     def get_door_in_cell(self, grid_x, grid_y):
@@ -459,13 +449,100 @@ class World:
 
     def get_entities_in_cell(self, grid_x, grid_y, cond=None):
         res = []
-        for e in self.entities:
+        for e in self._entities_by_cell.get((grid_x, grid_y), ()):
             if cond is None or cond(e):
-                grid_pos = self.to_grid_coords(e.center()[0], e.center()[1])
-                if grid_x == grid_pos[0] and grid_y == grid_pos[1]:
-                    res.append(e)
+                res.append(e)
         return res
 
+    def _entities_in_cell_rect(self, min_xy, max_xy):
+        """returns: list of entities whose cells are between min_xy and max_xy (inclusive)."""
+        res = []
+        n_cells = (max_xy[0] - min_xy[0] + 1) * (max_xy[1] - min_xy[1] + 1)
+        if n_cells <= len(self._entities_by_cell):
+            for x in range(min_xy[0], max_xy[0] + 1):
+                for y in range(min_xy[1], max_xy[1] + 1):
+                    occupants = self._entities_by_cell.get((x, y))
+                    if occupants is not None:
+                        res.extend(occupants)
+        else:
+            # the rect is bigger than the number of occupied cells, so it's faster to check those instead
+            for cell, occupants in self._entities_by_cell.items():
+                if min_xy[0] <= cell[0] <= max_xy[0] and min_xy[1] <= cell[1] <= max_xy[1]:
+                    res.extend(occupants)
+        return res
+
+    def _get_active_entities(self, cam_rect, player_xy):
+        """
+            returns: list of the entities whose centers are in cam_rect or whose cells are within act range of
+                     player_xy, in the order they were added to the world. Everything else is left asleep.
+        """
+        cam_min = self.to_grid_coords(cam_rect[0], cam_rect[1])
+        cam_max = self.to_grid_coords(cam_rect[0] + cam_rect[2], cam_rect[1] + cam_rect[3])
+        act_min = (player_xy[0] - self._entity_act_range[0], player_xy[1] - self._entity_act_range[1])
+        act_max = (player_xy[0] + self._entity_act_range[0], player_xy[1] + self._entity_act_range[1])
+
+        nearby = set(self._entities_in_cell_rect(cam_min, cam_max))
+        nearby.update(self._entities_in_cell_rect(act_min, act_max))
+
+        return sorted(nearby, key=lambda e: self._entity_order[e])
+
+    def _index_entity(self, entity):
+        cell = self.to_grid_coords(*entity.center())
+        old_cell = self._entity_cells.get(entity)
+        if old_cell == cell:
+            return
+
+        if old_cell is not None:
+            self._unindex_entity(entity)
+
+        self._entity_cells[entity] = cell
+        if cell not in self._entities_by_cell:
+            self._entities_by_cell[cell] = {}
+        self._entities_by_cell[cell][entity] = None
+
+        if self._blocks_statically(entity):
+            self._static_blockers.add(entity)
+            self._solidity_changed(*cell)
+
+    def _unindex_entity(self, entity):
+        cell = self._entity_cells.pop(entity, None)
+        if cell is not None:
+            occupants = self._entities_by_cell[cell]
+            del occupants[entity]
+            if len(occupants) == 0:
+                del self._entities_by_cell[cell]
+
+            # using the solidity it was indexed with, in case it's changed since then
+            if entity in self._static_blockers:
+                self._static_blockers.remove(entity)
+                self._solidity_changed(*cell)
+
+    def entity_moved(self, entity):
+        """called by the entities in this world whenever their position changes."""
+        if entity in self._entity_cells:
+            self._index_entity(entity)
+
+    def entity_solidity_changed(self, entity):
+        """called by the entities in this world whenever is_solid may have changed without them moving."""
+        cell = self._entity_cells.get(entity)
+        if cell is None:
+            return
+
+        blocks = self._blocks_statically(entity)
+        if blocks != (entity in self._static_blockers):
+            if blocks:
+                self._static_blockers.add(entity)
+            else:
+                self._static_blockers.remove(entity)
+            self._solidity_changed(*cell)
+
+    def _blocks_statically(self, entity):
+        """
+            whether entity is a wall as far as the player distance field is concerned. Actors aren't, because they
+            move around all the time, so the field would need to be rebuilt after nearly every move.
+        """
+        return not entity.is_actor() and entity.is_solid(self)
+
     def get_map_text_for_cells(self, grid_rect, ignore_visiblity=False):
         from src.ui.ui import TextBuilder, TextImage
         res = TextBuilder()
@@ -484,30 +561,46 @@ class World:
                 if identifier is not None:
                     ent_coords[e_pos] = identifier
 
-        for y in range(grid_rect[1], grid_rect[1] + grid_rect[3]):
-            for x in range(grid_rect[0], grid_rect[0] + grid_rect[2]):
+        rx, ry, rw, rh = grid_rect
+
+        # computed for the rect plus a 1-cell border, so walls on the edge can see their neighbors
+        padded_rect = [rx - 1, ry - 1, rw + 2, rh + 2]
+        padded_geo = self.get_geo_in_rect(padded_rect)
+        visible_floors = (padded_geo == World.FLOOR) & ~self.get_hidden_in_rect(padded_rect)
+
+        geo = padded_geo[1:-1, 1:-1]
+        lit = self.get_lighting_in_rect(grid_rect) > 0
+
+        # walls and doors are shown if they're touching (or diagonal to) a visible floor
+        touching_visible_floor = numpy.zeros((rw, rh), dtype=numpy.bool_)
+        for n in World.ALL_NEIGHBORS:
+            touching_visible_floor |= visible_floors[1 + n[0]:1 + n[0] + rw, 1 + n[1]:1 + n[1] + rh]
+
+        # lists are much faster than arrays for per-cell lookups
+        geo = geo.tolist()
+        visible_floors = visible_floors[1:-1, 1:-1].tolist()
+        lit = lit.tolist()
+        show_walls = (touching_visible_floor | ignore_visiblity).tolist()
+
+        for y in range(ry, ry + rh):
+            for x in range(rx, rx + rw):
+                i, j = x - rx, y - ry
                 did_add = False
                 if (x, y) in ent_coords:
                     char, color = ent_coords[(x, y)]
                     res.add(char, color=color)
                     did_add = True
 
-                if not did_add and self.get_geo(x, y) == World.FLOOR:
-                    if not self.get_hidden(x, y):
-                        if self.get_lighting(x, y) > 0:
-                            res.add(".", color=colors.LIGHT_GRAY)
-                        else:
-                            res.add(".", color=colors.DARK_GRAY)
-                        did_add = True
+                if not did_add and visible_floors[i][j]:
+                    if lit[i][j]:
+                        res.add(".", color=colors.LIGHT_GRAY)
+                    else:
+                        res.add(".", color=colors.DARK_GRAY)
+                    did_add = True
 
-                if not did_add and self.get_geo(x, y) in (World.WALL, World.DOOR):
-                    touching_non_hidden = False
-                    for n in Utils.neighbors(x, y, and_diags=True):
-                        if self.get_geo(*n) == World.FLOOR and not self.get_hidden(*n):
-                            touching_non_hidden = True
-                            break
-                    if touching_non_hidden or ignore_visiblity:
-                        if self.get_geo(x, y) == World.WALL:
+                if not did_add and geo[i][j] in (World.WALL, World.DOOR):
+                    if show_walls[i][j]:
+                        if geo[i][j] == World.WALL:
                             res.add("X", color=colors.DARK_GRAY)
                         else:
                             res.add("0", color=colors.BLUE)
@@ -523,58 +616,62 @@ class World:
 
         return res
 
-    def get_path_between(self, p1, p2, max_length=-1, cond=None):
-        if p1 == p2:
-            if cond is None or cond(p1):
-                return [p1]
-            else:
-                return None
+    def _get_path_finder(self):
+        if self._path_finder is None:
+            self._path_finder = PathFinder(*self.size())
+        return self._path_finder
 
-        if -1 < max_length < Utils.dist_manhattan(p1, p2):
+    def get_path_between(self, p1, p2, max_length=-1, cond=None, randomize=True):
+        """
+            p1, p2: grid cells
+            max_length: maximum number of steps in the path, or -1 for no limit.
+            cond: lambda (x, y) -> bool, whether the path can go through a cell (p1 is exempt).
+            randomize: whether to pick randomly between equally short paths.
+            returns: list of cells from p1 to p2 (inclusive), or None if there's no such path.
+        """
+        return self._get_path_finder().find_path(p1, p2, max_length=max_length, cond=cond, randomize=randomize)
+
+    def get_player_distance_field(self, max_dist):
+        """
+            returns: DistanceField of steps to the player's cell through non-solid cells, or None if there's no
+                     player. Solid entities count, except for actors, which should be passed to DistanceField.next_step
+                     as blockers instead. It's rebuilt when the player changes cells, or when something besides an
+                     actor becomes solid or non-solid within max_dist of the player.
+        """
+        p = self.get_player()
+        if p is None:
             return None
 
-        # it's just djikstra's
-        dists = {p1: 0}        # pos -> dist
-        backrefs = {p1: None}  # pos -> pos
+        p_pos = self.to_grid_coords(*p.center())
+        field = self._player_distance_field
+        if field is None or field.get_origin() != p_pos or field.get_max_dist() != max_dist:
+            field = self._get_path_finder().distance_field(p_pos, max_dist,
+                                                           cond=lambda xy: not self._is_static_solid(*xy))
+            self._player_distance_field = field
 
-        q = [p1]
-        while len(q) > 0:
-            cur = q.pop(0)  # O(n) but i ~don't~ care
+        return field
 
-            n_dist = dists[cur] + 1
-            if n_dist > max_length > -1:
-                continue
+    def _is_static_solid(self, grid_x, grid_y):
+        if self.get_geo(grid_x, grid_y) in World.SOLIDS:
+            return True
+        for e in self._entities_by_cell.get((grid_x, grid_y), ()):
+            if self._blocks_statically(e):
+                return True
+        return False
 
-            neighbors = list(Utils.neighbors(cur[0], cur[1]))
-            random.shuffle(neighbors)
-
-            for n in neighbors:
-                if n in dists:
-                    continue
-                dists[n] = n_dist
-                if self.is_valid(*n) and (cond is None or cond(n)):
-                    backrefs[n] = cur
-                    q.append(n)
-
-            if p2 in backrefs:
-                break
-
-        if p2 in backrefs:
-            res = [p2]  # building the list in reverse
-            temp = backrefs[p2]
-            while temp is not None:
-                res.append(temp)
-                temp = backrefs[temp]
-            res.reverse()
-            return res
-        else:
-            return None
+    def _solidity_changed(self, grid_x, grid_y):
+        field = self._player_distance_field
+        if field is not None and field.covers((grid_x, grid_y)):
+            self._player_distance_field = None
+
+    def get_doors(self):
+        return list(self._entities_of_type["doors"].values())
+
+    def get_decorations(self):
+        return list(self._entities_of_type["decorations"].values())
 
     def get_actors(self):
-        res = []
-        for e in self.entities:
-            if e.is_actor():
-                res.append(e)
+        res = list(self._entities_of_type["actors"].values())
         res.sort(key=lambda a: a.get_uid())
         return res
             
@@ -584,6 +681,14 @@ class World:
     def size(self):
         return self._size
 
+    # the subsets of entities that are indexed by type, and how to tell whether an entity belongs in each.
+    _TYPE_INDEXES = [("players", lambda e: e.is_player()),
+                     ("actors", lambda e: e.is_actor()),
+                     ("doors", lambda e: e.is_door()),
+                     ("npcs", lambda e: e.is_npc()),
+                     ("decorations", lambda e: e.is_decoration()),
+                     ("light_emitters", lambda e: e.can_emit_light())]
+
     NEIGHBORS = [(-1, 0), (0, -1), (1, 0), (0, 1)]
     ALL_NEIGHBORS = [(-1, -1), (0, -1), (1, -1), (1, 0), (1, 1), (0, 1), (-1, 1), (-1, 0)]
     
@@ -592,10 +697,42 @@ class World:
 
     def flush_new_entity_additions(self):
         for e in self._ents_to_add:
-            self.entities.append(e)
+            self._entities[e.get_uid()] = e
+            for index_type, cond in World._TYPE_INDEXES:
+                if cond(e):
+                    self._entities_of_type[index_type][e.get_uid()] = e
+            self._entity_order[e] = self._next_entity_order
+            self._next_entity_order += 1
             e._alive = True
+            e._position_listener = self
+            self._index_entity(e)
         self._ents_to_add.clear()
 
+    def _advance_to_next_activation(self, actors):
+        """
+            skips ahead to the first round in which any of the actors gains enough energy to act, and gives
+            every actor that many rounds' worth of energy.
+            returns: the actors that became ready to act, in turn order (player first, then by uid).
+        """
+        queue = []  # ((activation round, player-first, uid), actor)
+        for actor in actors:
+            n_rounds = actor.get_actor_state().rounds_until_next_activation()
+            queue.append(((n_rounds, 0 if actor.is_player() else 1, actor.get_uid()), actor))
+        heapq.heapify(queue)
+
+        next_round = queue[0][0][0]
+        res = []
+        while len(queue) > 0 and queue[0][0][0] == next_round:
+            actor = heapq.heappop(queue)[1]
+            actor.get_actor_state().set_ready_to_act(True)
+            res.append(actor)
+
+        for actor in actors:
+            a_state = actor.get_actor_state()
+            a_state.set_energy((a_state.energy() + next_round * a_state.speed()) % a_state.max_energy())
+
+        return res
+
     def update_all(self):
         old_lighting = self._cached_light_sources
 
@@ -603,8 +740,13 @@ class World:
 
         for e in self._ents_to_remove:
             e.cleanup()
-            self.entities.remove(e)  # n^2 but whatever
+            del self._entities[e.get_uid()]
+            for entities_of_type in self._entities_of_type.values():
+                entities_of_type.pop(e.get_uid(), None)
+            del self._entity_order[e]
             e._alive = False
+            e._position_listener = None
+            self._unindex_entity(e)
             if e in self._onscreen_entities:
                 self._onscreen_entities.remove(e)
 
@@ -622,7 +764,9 @@ class World:
         else:
             player_xy = self.to_grid_coords(*Utils.rect_center(cam_rect))
 
-        for e in self.entities:
+        still_onscreen = set()
+
+        for e in self._get_active_entities(cam_rect, player_xy):
             on_camera = Utils.rect_contains(cam_rect, e.center())
 
             e_xy = self.to_grid_coords(*e.center())
@@ -634,6 +778,7 @@ class World:
             if on_camera or should_act_if_actor:
                 e.update(self)
                 self._onscreen_entities.add(e)
+                still_onscreen.add(e)
 
                 if not gs.get_instance().world_updates_paused():
                     if e.is_actor() and not e.get_actor_state().is_alive():
@@ -647,23 +792,16 @@ class World:
                             an_actor_is_acting = True
                             gs.get_instance().set_player_turn_to_act(e.is_player())
 
-            elif e in self._onscreen_entities:
-                self._onscreen_entities.remove(e)
+        # entities that wandered out of range (or were left behind by the camera) go to sleep
+        for e in self._onscreen_entities - still_onscreen:
+            self._onscreen_entities.remove(e)
 
         if not gs.get_instance().world_updates_paused() and not an_actor_is_acting:
             actors_to_process.sort(key=lambda a: -1 if a.is_player() else a.get_uid())
             actors_ready_to_act = [a for a in actors_to_process if a.get_actor_state().ready_to_act()]
 
-            while len(actors_ready_to_act) == 0 and len(actors_to_process) > 0:
-                for i in range(0, len(actors_to_process)):
-                    actor = actors_to_process[i]
-                    a_state = actor.get_actor_state()
-
-                    if a_state.energy() + a_state.speed() >= a_state.max_energy():
-                        a_state.set_ready_to_act(True)
-                        actors_ready_to_act.append(actor)
-
-                    a_state.set_energy((a_state.energy() + a_state.speed()) % a_state.max_energy())
+            if len(actors_ready_to_act) == 0 and len(actors_to_process) > 0:
+                actors_ready_to_act = self._advance_to_next_activation(actors_to_process)
 
             for actor in actors_ready_to_act:
                 # if a different actor added a new solid entity this frame as part of its action,
@@ -707,8 +845,8 @@ class World:
 
         new_lighting = self.get_light_sources(onscreen=False)
 
-        if old_lighting != new_lighting:
-            self._recalc_lighting(old_lighting, new_lighting)
+        if old_lighting != new_lighting or self._light_map.is_dirty():
+            self._recalc_lighting(new_lighting)
             self._cached_light_sources = new_lighting
 
 
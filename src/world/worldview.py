@@ -1,5 +1,7 @@
 import math
 
+import numpy
+
 import src.game.spriteref as spriteref
 import src.renderengine.img as img
 import src.game.globalstate as gs
@@ -10,14 +12,18 @@ import src.utils.colors as colors
 import src.game.constants as constants
 
 
+# geometry is loaded, unloaded, and baked into ImageBlocks in square chunks of cells, this many cells wide.
+CHUNK_SIZE = 8
+
+
 class WorldView:
 
     def __init__(self, world):
         self.world = world
 
-        self._geo_bundle_lookup = {}  # x,y -> ImageBundle
-        self._onscreen_geo_bundles = set()
-        self._dirty_geo_bundles = []
+        self._geo_bundle_lookup = {}  # x,y -> ImageBundle, only for cells in onscreen chunks
+        self._onscreen_chunks = set()  # chunk_x, chunk_y
+        self._chunk_blocks = {}  # chunk_x, chunk_y -> list of ImageBlocks (one per layer), only for onscreen chunks
 
         self._onscreen_entities = set()
 
@@ -47,7 +53,6 @@ class WorldView:
                                     new_depth=10,
                                     new_color=color)
             self._geo_bundle_lookup[(grid_x, grid_y)] = new_bun
-            self._dirty_geo_bundles.append((grid_x, grid_y))
 
     def calc_sprite_for_geo(self, grid_x, grid_y):
         geo = self.world.get_geo(grid_x, grid_y)
@@ -120,39 +125,96 @@ class WorldView:
                 1 + 2 * self._max_render_range[0],
                 1 + 2 * self._max_render_range[1]]
 
-    def _update_onscreen_tile_bundles(self):
-        render_eng = RenderEngine.get_instance()
-
+    def _get_chunk_rect_to_render(self):
         grid_rect = self._get_grid_rect_to_render()
+        if grid_rect is None or grid_rect[2] <= 0 or grid_rect[3] <= 0:
+            return [0, 0, 0, 0]
+
+        x1 = grid_rect[0] // CHUNK_SIZE
+        y1 = grid_rect[1] // CHUNK_SIZE
+        x2 = (grid_rect[0] + grid_rect[2] - 1) // CHUNK_SIZE
+        y2 = (grid_rect[1] + grid_rect[3] - 1) // CHUNK_SIZE
+        return [x1, y1, x2 - x1 + 1, y2 - y1 + 1]
+
+    def _cells_in_chunk(self, chunk_xy):
+        w, h = self.world.size()
+        for x in range(max(0, chunk_xy[0] * CHUNK_SIZE), min(w, (chunk_xy[0] + 1) * CHUNK_SIZE)):
+            for y in range(max(0, chunk_xy[1] * CHUNK_SIZE), min(h, (chunk_xy[1] + 1) * CHUNK_SIZE)):
+                yield (x, y)
+
+    def _load_chunk(self, chunk_xy):
+        chunk_x, chunk_y = chunk_xy[0] * CHUNK_SIZE, chunk_xy[1] * CHUNK_SIZE
+        geo = self.world.get_geo_in_rect([chunk_x, chunk_y, CHUNK_SIZE, CHUNK_SIZE])
+        for dx, dy in zip(*numpy.nonzero(geo != World.EMPTY)):
+            self.get_geo_bundle(chunk_x + int(dx), chunk_y + int(dy), create_if_missing=True)
+        self._onscreen_chunks.add(chunk_xy)
+        self._bake_chunk(chunk_xy)
+
+    def _bake_chunk(self, chunk_xy):
+        """replaces the chunk's ImageBlocks with new ones, built from the current bundles of its cells."""
+        render_eng = RenderEngine.get_instance()
+        for block in self._chunk_blocks.get(chunk_xy, []):
+            render_eng.remove(block)
+
+        bundles_by_layer = {}
+        for xy in self._cells_in_chunk(chunk_xy):
+            if xy in self._geo_bundle_lookup:
+                bundle = self._geo_bundle_lookup[xy]
+                if bundle.layer() not in bundles_by_layer:
+                    bundles_by_layer[bundle.layer()] = []
+                bundles_by_layer[bundle.layer()].append(bundle)
+
+        blocks = [img.ImageBlock(bundles, layer) for layer, bundles in bundles_by_layer.items()]
+        for block in blocks:
+            render_eng.update(block)
+        self._chunk_blocks[chunk_xy] = blocks
+
+    def _unload_chunk(self, chunk_xy):
+        render_eng = RenderEngine.get_instance()
+        for block in self._chunk_blocks.pop(chunk_xy, []):
+            render_eng.remove(block)
+        for xy in self._cells_in_chunk(chunk_xy):
+            if xy in self._geo_bundle_lookup:
+                del self._geo_bundle_lookup[xy]
+        self._onscreen_chunks.discard(chunk_xy)
+
+    def _rebake_dirty_cells(self, dirty_cells):
+        dirty_chunks = set()
+        for xy in dirty_cells:
+            chunk_xy = (xy[0] // CHUNK_SIZE, xy[1] // CHUNK_SIZE)
+            if chunk_xy not in self._onscreen_chunks:
+                continue  # it'll be built fresh when its chunk comes onscreen
+
+            if xy in self._geo_bundle_lookup:
+                self.update_geo_bundle(*xy)
+            elif self.world.get_geo(*xy) != World.EMPTY:
+                self.get_geo_bundle(*xy, create_if_missing=True)
+            else:
+                continue
+            dirty_chunks.add(chunk_xy)
 
-        old_onscreen_geo = self._onscreen_geo_bundles
-        new_onscreen_geo = set()
-        for x in range(grid_rect[0], grid_rect[0] + grid_rect[2]):
-            for y in range(grid_rect[1], grid_rect[1] + grid_rect[3]):
-                bun_key = (x, y)
-
-                if bun_key in old_onscreen_geo:
-                    old_onscreen_geo.remove(bun_key)
-
-                bun = self.get_geo_bundle(*bun_key, create_if_missing=False)
+        # each chunk is rebaked once, no matter how many of its cells changed
+        for chunk_xy in dirty_chunks:
+            self._bake_chunk(chunk_xy)
 
-                if bun is None and self.world.get_geo(x, y) != World.EMPTY:
-                    bun = self.get_geo_bundle(*bun_key, create_if_missing=True)
+    def _update_onscreen_tile_bundles(self):
+        """
+            geometry is added and removed from the render engine a chunk at a time as the camera moves,
+            so the per-frame cost depends on the number of visible chunks rather than visible cells.
+            Each chunk is drawn from one ImageBlock per layer, which is rebaked when one of its cells changes.
+        """
+        chunk_rect = self._get_chunk_rect_to_render()
 
-                if bun is not None:
-                    new_onscreen_geo.add(bun_key)
-                    if bun_key not in self._onscreen_geo_bundles or bun_key in self._dirty_geo_bundles:
-                        render_eng.update(bun)
+        new_onscreen_chunks = set()
+        for cx in range(chunk_rect[0], chunk_rect[0] + chunk_rect[2]):
+            for cy in range(chunk_rect[1], chunk_rect[1] + chunk_rect[3]):
+                new_onscreen_chunks.add((cx, cy))
 
-        # clear out the bundles that aren't onscreen anymore
-        for bun_key in old_onscreen_geo:
-            expired_bun = self.get_geo_bundle(*bun_key, create_if_missing=False)
-            if expired_bun is not None:
-                render_eng.remove(expired_bun)
-                if bun_key in self._geo_bundle_lookup:
-                    del self._geo_bundle_lookup[bun_key]
+        for chunk_xy in self._onscreen_chunks - new_onscreen_chunks:
+            self._unload_chunk(chunk_xy)
 
-        self._onscreen_geo_bundles = new_onscreen_geo
+        for chunk_xy in new_onscreen_chunks - self._onscreen_chunks:
+            self._load_chunk(chunk_xy)
 
     def _calc_new_camera_center(self):
         p = self.world.get_player()
@@ -181,10 +243,10 @@ class WorldView:
                 render_eng.remove(bun)
         self._onscreen_entities.clear()
 
-        for bun_key in self._onscreen_geo_bundles:
-            render_eng.remove(self._geo_bundle_lookup[bun_key])
+        for chunk_xy in list(self._onscreen_chunks):
+            self._unload_chunk(chunk_xy)
         self._geo_bundle_lookup.clear()
-        self._onscreen_geo_bundles.clear()
+        self._chunk_blocks.clear()
 
         if self._fade_overlay_bundle is not None:
             render_eng.remove(self._fade_overlay_bundle)
@@ -230,10 +292,10 @@ class WorldView:
         self._onscreen_entities = new_onscreens
 
         if self.world._needs_full_geo_rebuild:
-            self._geo_bundle_lookup.clear()
+            for chunk_xy in list(self._onscreen_chunks):
+                self._unload_chunk(chunk_xy)
         else:
-            for dirty_xy in self.world._dirty_geo:
-                self.update_geo_bundle(dirty_xy[0], dirty_xy[1])
+            self._rebake_dirty_cells(self.world._dirty_geo)
         self.world._needs_full_geo_rebuild = False
         self.world._dirty_geo.clear()
 
@@ -1,4 +1,3 @@
-import random
 
 from src.world.worldstate import World
 from src.game.enemies import EnemyFactory
@@ -6,6 +5,7 @@ from src.game.enemies import EnemyFactory
 import src.world.entities as entities
 import src.utils.colors as colors
 import src.game.music as music
+import src.game.rng as rng
 
 
 NEIGHBORS = [(-1, 0), (0, -1), (1, 0), (0, 1)]
@@ -100,8 +100,8 @@ class RoomFactory:
 
     @staticmethod
     def gen_rand_rectangular_room(w_range, h_range):
-        w = w_range[0] + int((w_range[1] - w_range[0]) * random.random())
-        h = h_range[0] + int((h_range[1] - h_range[0]) * random.random())
+        w = w_range[0] + int((w_range[1] - w_range[0]) * rng.worldgen().random())
+        h = h_range[0] + int((h_range[1] - h_range[0]) * rng.worldgen().random())
         return RoomFactory.gen_rectangular_room(w, h)
 
     @staticmethod
@@ -138,8 +138,8 @@ class BuilderUtils:
             return False
         else:
             for _ in range(0, num_attempts):
-                d1 = doors1[int(len(doors1) * random.random())]
-                d2 = doors2[int(len(doors2) * random.random())]
+                d1 = doors1[int(len(doors1) * rng.worldgen().random())]
+                d2 = doors2[int(len(doors2) * rng.worldgen().random())]
                 offs = (d2[0] - d1[0], d2[1] - d1[1])
                 # print("trying position {}".format(offs))
                 to_place.set_offset(*offs)
@@ -388,7 +388,7 @@ def rand_iterate_through_points(x, y, w, h):
     for x_i in range(x, x + w):
         for y_i in range(y, y + h):
             all_points.append((x_i, y_i))
-    random.shuffle(all_points)
+    rng.worldgen().shuffle(all_points)
     return all_points
 
 
@@ -422,7 +422,7 @@ class WorldFactory:
         WorldFactory.fill_corners(bp)
 
         flrs = [f for f in rooms[0].all_floors()]
-        random.shuffle(flrs)
+        rng.worldgen().shuffle(flrs)
         bp.player_spawn = flrs[0]
 
         bp.enemy_spawns = WorldFactory._get_random_floors(bp, num_rooms)
@@ -470,7 +470,7 @@ class WorldFactory:
                 elif x < 3 and y < 3:
                     bp.geo[x][y] = World.FLOOR
                 else:
-                    if random.random() < 0.33:
+                    if rng.worldgen().random() < 0.33:
                         bp.geo[x][y] = World.WALL
                     else:
                         bp.geo[x][y] = World.FLOOR
@@ -479,13 +479,13 @@ class WorldFactory:
             for y in range(0, height):
                 if bp.geo[x][y] == World.FLOOR:
                     if is_perfect_door_location(bp, x, y):
-                        if random.random() < 0.5:
+                        if rng.worldgen().random() < 0.5:
                             bp.set(x, y, World.DOOR)
 
-                    elif random.random() < 0.05:
+                    elif rng.worldgen().random() < 0.05:
                         bp.enemy_spawns.append((x, y))
 
-                    elif random.random() < 0.05:
+                    elif rng.worldgen().random() < 0.05:
                         bp.chest_spawns.append((x, y))
 
         # bp.exit_spawn = WorldFactory._get_random_exit_pos(bp)
@@ -1,8 +1,8 @@
 import re
-import random
 from sys import platform
 
 from src.utils.util import Utils
+import src.game.rng as rng
 
 
 class TileType:
@@ -310,6 +310,38 @@ class TileGrid(Tileish):
             t.set(rel_x, rel_y, val)
 
 
+class PackedTileGrid(Tileish):
+    """
+        A read-only copy of another Tileish, with all its tiles packed into a single string. It's cheap to
+        pickle, so it's what gets sent back from the zone pre-generation worker.
+    """
+
+    def __init__(self, w, h, tiles):
+        if len(tiles) != w * h:
+            raise ValueError("expected {} tiles, got {}".format(w * h, len(tiles)))
+        self._w = w
+        self._h = h
+        self._tiles = tiles  # column-major, one char per tile
+
+    @staticmethod
+    def pack(tileish):
+        w = tileish.w()
+        h = tileish.h()
+        return PackedTileGrid(w, h, "".join(tileish.get(x, y) for x in range(0, w) for y in range(0, h)))
+
+    def w(self):
+        return self._w
+
+    def h(self):
+        return self._h
+
+    def get(self, x, y):
+        if 0 <= x < self._w and 0 <= y < self._h:
+            return self._tiles[x * self._h + y]
+        else:
+            return TileType.EMPTY
+
+
 class GridBuilder:
 
     @staticmethod
@@ -319,7 +351,7 @@ class GridBuilder:
         while path[-1] != p2:
             cur = path[-1]
             neighbors = list(Utils.neighbors(cur[0], cur[1]))
-            random.shuffle(neighbors)
+            rng.worldgen().shuffle(neighbors)
 
             added_n = False
             while not added_n and len(neighbors) > 0:
@@ -339,8 +371,8 @@ class GridBuilder:
     @staticmethod
     def random_partition_grid(w, h, start=None, end=None, fully_connected=True):
         """returns: (path, partition_grid)"""
-        start = start if start is not None else (random.randint(0, w - 1), random.randint(0, h - 1))
-        end = end if end is not None else (random.randint(0, w - 1), random.randint(0, h - 1))
+        start = start if start is not None else (rng.worldgen().randint(0, w - 1), rng.worldgen().randint(0, h - 1))
+        end = end if end is not None else (rng.worldgen().randint(0, w - 1), rng.worldgen().randint(0, h - 1))
 
         p_grid = PartitionGrid(w, h)
         path = GridBuilder.random_path_between(start, end, w, h)
@@ -363,7 +395,7 @@ class GridBuilder:
             if path_idx < len(path) - 1:
                 next_path = path[path_idx + 1]
                 direction = (next_path[0] - cur_path[0], next_path[1] - cur_path[1])
-                exit_door = random.choice(Tile.doors_on_side(direction))
+                exit_door = rng.worldgen().choice(Tile.doors_on_side(direction))
                 force_enabled.append(exit_door)
                 if entry_door is not None:
                     force_connected = [entry_door, exit_door]
@@ -378,7 +410,7 @@ class GridBuilder:
             p_grid.set(cur_path[0], cur_path[1], p)
 
         empty_coords = [xy for xy in RectUtils.coords_in_rect([0, 0, w, h]) if p_grid.get(xy[0], xy[1]) is None]
-        random.shuffle(empty_coords)
+        rng.worldgen().shuffle(empty_coords)
 
         for (x, y) in empty_coords:
             door_req = p_grid.needed_doors(x, y)
@@ -580,7 +612,7 @@ class TileFiller:
         enabled = []
         for i in range(0, 2**len(toggle_zones)):  # very nice efficiency!
             enabled.append([min(2**j & i, 1) for j in range(0, len(toggle_zones))])
-        random.shuffle(enabled)
+        rng.worldgen().shuffle(enabled)
         enabled.sort(key=lambda v: sum(v))
 
         for zone_toggle in enabled:
@@ -602,17 +634,17 @@ class TileFiller:
         returns: list of room rectangles"""
         TileFiller.basic_floor_fill(tile, partition)
 
-        n = random.randint(min_rooms, max_rooms)
+        n = rng.worldgen().randint(min_rooms, max_rooms)
         iteration = 0
 
         rooms_placed = []
 
         while n > 0 and iteration < iter_limit:
             iteration += 1
-            w = random.randint(min_size, max_size)
-            h = random.randint(min_size, max_size)
-            x = random.randint(1, tile.w() - w - 2)
-            y = random.randint(1, tile.h() - h - 2)
+            w = rng.worldgen().randint(min_size, max_size)
+            h = rng.worldgen().randint(min_size, max_size)
+            x = rng.worldgen().randint(1, tile.w() - w - 2)
+            y = rng.worldgen().randint(1, tile.h() - h - 2)
 
             room_rect = [x, y, w, h]
 
@@ -884,12 +916,12 @@ class FeatureUtils:
         if feature.can_rotate:
             rots.extend([1, 2, 3])
 
-        random.shuffle(rots)
+        rng.worldgen().shuffle(rots)
         for rot in rots:
             rotated_feature = feature.rotated(rot)
             possible_placements = FeatureUtils.all_possible_placements_overlapping_rect(rotated_feature, tilish, rect)
             if len(possible_placements) > 0:
-                placement = random.choice(possible_placements)
+                placement = rng.worldgen().choice(possible_placements)
                 FeatureUtils.write_into(rotated_feature, tilish, placement[0], placement[1])
                 return True
 
@@ -1000,7 +1032,7 @@ class Features:
                 weighted_feats.append(feat_id)
 
         if len(weighted_feats) > 0:
-            return _ALL_FEATURES[random.choice(weighted_feats)]
+            return _ALL_FEATURES[rng.worldgen().choice(weighted_feats)]
         else:
             print("WARN: no valid features for level: {}" + at_level)
             return None
@@ -1101,13 +1133,13 @@ class Partition:
             doors = [i for i in range(0, 8) if i in force_doors or i in force_connected]
             optional_doors = [i for i in range(0, 8) if (i not in doors and i not in force_not_doors)]
 
-            to_choose = random.randint(min_doors - len(doors), max_doors - len(doors))
+            to_choose = rng.worldgen().randint(min_doors - len(doors), max_doors - len(doors))
             if to_choose < 0:
                 to_choose = 0
             elif to_choose > len(optional_doors):
                 to_choose = len(optional_doors)
 
-            doors.extend(random.sample(optional_doors, to_choose))
+            doors.extend(rng.worldgen().sample(optional_doors, to_choose))
 
             if len(doors) == 0:
                 return Partition([])
@@ -1124,17 +1156,17 @@ class Partition:
                 else:
                     return Partition([])
 
-            n_groups = 1 + int((len(doors) - 1) * random.random())
-            random.shuffle(doors)
+            n_groups = 1 + int((len(doors) - 1) * rng.worldgen().random())
+            rng.worldgen().shuffle(doors)
             for i in range(0, n_groups):
                 res.append([doors[i]])
 
             if n_groups < len(doors):
                 for i in range(n_groups, len(doors)):
-                    res[int(n_groups * random.random())].append(doors[i])
+                    res[int(n_groups * rng.worldgen().random())].append(doors[i])
 
             if len(force_connected) > 0:
-                i = random.randint(0, n_groups)
+                i = rng.worldgen().randint(0, n_groups)
                 if i == n_groups:
                     res.append(list(force_connected))
                 else:
@@ -1180,7 +1212,7 @@ if __name__ == "__main__":
     start_placed = False
     for p in path:
         rooms_in_p = list(room_map.get(p))
-        random.shuffle(rooms_in_p)
+        rng.worldgen().shuffle(rooms_in_p)
         for r in rooms_in_p:
             if r not in empty_rooms:
                 continue
@@ -1197,7 +1229,7 @@ if __name__ == "__main__":
     end_placed = False
     for p in reversed(path):
         rooms_in_p = list(room_map.get(p))
-        random.shuffle(rooms_in_p)
+        rng.worldgen().shuffle(rooms_in_p)
         for r in rooms_in_p:
             if r not in empty_rooms:
                 continue
@@ -1214,7 +1246,7 @@ if __name__ == "__main__":
     while len(empty_rooms) > 0:
         r = empty_rooms.pop()
         feat = Features.get_random_feature()
-        if feat is not None and random.random() > 0.333:
+        if feat is not None and rng.worldgen().random() > 0.333:
             FeatureUtils.try_to_place_feature_into_rect(feat, t_grid, r)
 
     TileGridBuilder.add_walls(t_grid)
@@ -1,80 +1,254 @@
+import sys
+import json
+import time
+import random
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
 import src.worldgen.zones as zones
 import src.worldgen.worldgen2 as worldgen2
+import src.game.rng as rng
+
+"""
+Generates lots of tile grids across levels and dims and checks that they're all possible, in parallel.
+Reports how long generation takes, how often it has to be retried, and how often it produces a bad grid.
+
+usage: python -m src.worldgen.zone_tests [--workers N] [--seed S] [--levels 0-15] [--out FILE]
+       python -m src.worldgen.zone_tests --repro GRID_SEED --levels L --dims WxH
+
+Every grid gets its own seed (which is printed when it fails), so a bad grid can be regenerated with --repro.
+"""
+
+# same as ZoneBuilder.generate_tile_grid
+NUM_TRIES = 100
 
 
-def test_grids_are_possible(n, level, dims=(3, 3)):
+def check_grid(t_grid):
     """
         possible just means 1 start tile, at least one exit tile, and all exits are reachable from the start.
 
-        returns: an invalid tile grid if one is found, else None
+        returns: a description of the problem if the grid isn't possible, else None
     """
-    for _ in range(0, n):
+    player_coords = worldgen2.TileGridBuilder.search(t_grid, worldgen2.TileType.PLAYER)
 
-        t_grid = zones.ZoneBuilder.generate_tile_grid_dangerously(None, level, dims=dims)
-        player_coords = worldgen2.TileGridBuilder.search(t_grid, worldgen2.TileType.PLAYER)
+    if len(player_coords) != 1:
+        return "{} player spawns".format(len(player_coords))
 
-        if len(player_coords) != 1:
-            print("FAIL: more than one player spawn (level={})".format(level))
-            return t_grid
+    start = list(player_coords)[0]
 
-        start = list(player_coords)[0]
+    exit_coords = worldgen2.TileGridBuilder.search(t_grid, worldgen2.TileType.EXIT)
+    if len(exit_coords) == 0:
+        return "no exit"
 
-        exit_coords = worldgen2.TileGridBuilder.search(t_grid, worldgen2.TileType.EXIT)
-        if len(exit_coords) == 0:
-            print("FAIL: no exit (level={})".format(level))
-            return t_grid
+    # whitelisting tiles instead of blacklisting so that we err on the side of false test failures
+    # instead of false passes when new tiletypes are added and we forget to update the test.
+    can_traverse = (worldgen2.TileType.PLAYER,
+                    worldgen2.TileType.EXIT,
+                    worldgen2.TileType.SIGN,
+                    worldgen2.TileType.DECORATION,
+                    worldgen2.TileType.CHEST,
+                    worldgen2.TileType.FLOOR,
+                    worldgen2.TileType.DOOR,
+                    worldgen2.TileType.MONSTER,
+                    worldgen2.TileType.STRAY_ITEM)
 
-        # whitelisting tiles instead of blacklisting so that we err on the side of false test failures
-        # instead of false passes when new tiletypes are added and we forget to update the test.
-        can_traverse = (worldgen2.TileType.PLAYER,
-                        worldgen2.TileType.EXIT,
-                        worldgen2.TileType.SIGN,
-                        worldgen2.TileType.DECORATION,
-                        worldgen2.TileType.CHEST,
-                        worldgen2.TileType.FLOOR,
-                        worldgen2.TileType.DOOR,
-                        worldgen2.TileType.MONSTER,
-                        worldgen2.TileType.STRAY_ITEM)
+    reachable_by_player = worldgen2.TileGridBuilder.flood_search(t_grid, start[0], start[1], can_traverse)
+    for ex in exit_coords:
+        if ex not in reachable_by_player:
+            return "unreachable exit: {}".format(ex)
 
-        reachable_by_player = worldgen2.TileGridBuilder.flood_search(t_grid, start[0], start[1], can_traverse)
-        for ex in exit_coords:
-            if ex not in reachable_by_player:
-                print("FAIL: unreachable exit: {} (level={})".format(ex, level))
-                return t_grid
+    return None
 
 
-if __name__ == "__main__":
+def grid_seed(seed, level, dims, i):
+    """returns: the seed used for the i-th grid of a test case."""
+    return random.Random("{}:{}:{}x{}:{}".format(seed, level, dims[0], dims[1], i)).getrandbits(32)
+
+
+def generate_grid(g_seed, level, dims):
+    """
+        generates a grid the same way ZoneBuilder.generate_tile_grid does (retrying when generation throws),
+        but from a fixed seed.
+        returns: (tile_grid, or None if every try failed, number of retries, last exception message)
+    """
+    rng.seed_all(g_seed)
+    last_err = None
+    for i in range(0, NUM_TRIES):
+        try:
+            t_grid = zones.ZoneBuilder.generate_tile_grid_dangerously(None, level, dims=dims)
+            if t_grid is not None:
+                return t_grid, i, last_err
+            last_err = "got a null level"
+        except Exception as e:
+            last_err = "{}: {}".format(type(e).__name__, e)
+
+    return None, NUM_TRIES, last_err
+
+
+class _ZoneGenTestCase:
+
+    def __init__(self, level, n, dims):
+        self.level = level
+        self.n = n
+        self.dims = dims
 
-    class _ZoneGenTestCase:
-        def __init__(self, level, n, dims):
-            self.level = level
-            self.n = n
-            self.dims = dims
 
+def _run_case(test, seed):
+    """
+        runs in a worker process.
+        returns: json-able dict of results for the test case.
+    """
+    durations = []
+    retries = []
+    failures = []
+
+    for i in range(0, test.n):
+        g_seed = grid_seed(seed, test.level, test.dims, i)
+
+        start_time = time.perf_counter()
+        t_grid, n_retries, last_err = generate_grid(g_seed, test.level, test.dims)
+        durations.append(time.perf_counter() - start_time)
+        retries.append(n_retries)
+
+        if t_grid is None:
+            failures.append({"grid_seed": g_seed, "error": "failed after {} tries ({})".format(NUM_TRIES, last_err)})
+        else:
+            err = check_grid(t_grid)
+            if err is not None:
+                failures.append({"grid_seed": g_seed, "error": err})
+
+    ordered = sorted(durations)
+    return {"level": test.level,
+            "dims": list(test.dims),
+            "n": test.n,
+            "total_ms": round(1000 * sum(ordered), 3),
+            "mean_ms": round(1000 * sum(ordered) / len(ordered), 3),
+            "max_ms": round(1000 * ordered[-1], 3),
+            "retries": sum(retries),
+            "max_retries": max(retries),
+            "failures": failures}
+
+
+def build_test_cases(levels, dims_list=None, n=None):
     test_cases = []
 
-    for lvl in range(0, 16):
-        for x in range(1, 4):
-            for y in range(1, 4):
-                if x + y <= 3:
-                    continue
+    for lvl in levels:
+        if dims_list is None:
+            all_dims = [(x, y) for x in range(1, 4) for y in range(1, 4) if x + y > 3]
+        else:
+            all_dims = dims_list
+
+        for dims in all_dims:
+            if n is not None:
+                case_n = n
+            elif dims[0] + dims[1] < 5:
+                case_n = 100  # smaller levels are more failure prone
+            else:
+                case_n = 20
+
+            test_cases.append(_ZoneGenTestCase(lvl, case_n, dims))
 
-                if x + y < 5:
-                    n = 100  # smaller levels are more failure prone
-                else:
-                    n = 20
+    return test_cases
 
-                test_cases.append(_ZoneGenTestCase(lvl, n, (x, y)))
 
-    for i in range(0, len(test_cases)):
-        test = test_cases[i]
+def run(test_cases, seed, n_workers):
+    """returns: json-able dict of results for all the test cases."""
+    start_time = time.perf_counter()
+    results = []
 
-        print("INFO: testing level={},\tn={},\tdims={}\t({:.1f}% complete)".format(
-            test.level, test.n, test.dims, (100 * i / len(test_cases))))
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=n_workers, mp_context=ctx) as executor:
+        futures = [executor.submit(_run_case, test, seed) for test in test_cases]
+        for i in range(0, len(futures)):
+            res = futures[i].result()
+            results.append(res)
+            print("INFO: level={},\tdims={},\tn={},\tmean={:.1f}ms,\tretries={},\tfailures={}\t({:.1f}% complete)".format(
+                res["level"], tuple(res["dims"]), res["n"], res["mean_ms"], res["retries"], len(res["failures"]),
+                100 * (i + 1) / len(futures)), file=sys.stderr)
 
-        err = test_grids_are_possible(test.level, test.n, dims=test.dims)
-        if err is not None:
-            print(err)
+    n_grids = sum(res["n"] for res in results)
+    n_failures = sum(len(res["failures"]) for res in results)
+
+    return {"seed": seed,
+            "workers": n_workers,
+            "wall_time_s": round(time.perf_counter() - start_time, 3),
+            "grids": n_grids,
+            "generation_ms": round(sum(res["total_ms"] for res in results), 3),
+            "retries": sum(res["retries"] for res in results),
+            "failures": n_failures,
+            "failure_rate": n_failures / max(1, n_grids),
+            "cases": results}
+
+
+def summary_table(summary):
+    lines = ["{:>5}  {:>5}  {:>5}  {:>9}  {:>9}  {:>7}  {:>8}".format(
+        "level", "dims", "n", "mean_ms", "max_ms", "retries", "failures")]
+
+    for res in summary["cases"]:
+        lines.append("{:>5}  {:>5}  {:>5}  {:>9.1f}  {:>9.1f}  {:>7}  {:>8}".format(
+            res["level"], "{}x{}".format(*res["dims"]), res["n"], res["mean_ms"], res["max_ms"],
+            res["retries"], len(res["failures"])))
+
+    lines.append("")
+    lines.append("{} grids in {:.1f}s ({:.1f}s of generation), {} retries, {} failures ({:.2f}%), seed={}".format(
+        summary["grids"], summary["wall_time_s"], summary["generation_ms"] / 1000, summary["retries"],
+        summary["failures"], 100 * summary["failure_rate"], summary["seed"]))
+
+    for res in summary["cases"]:
+        for failure in res["failures"]:
+            lines.append("FAIL: level={}, dims={}x{}, grid_seed={}: {}".format(
+                res["level"], res["dims"][0], res["dims"][1], failure["grid_seed"], failure["error"]))
+
+    return "\n".join(lines)
+
+
+def _parse_levels(text):
+    if "-" in text:
+        lo, hi = text.split("-")
+        return list(range(int(lo), int(hi) + 1))
+    else:
+        return [int(lvl) for lvl in text.split(",")]
+
+
+def _parse_dims(text):
+    return [tuple(int(v) for v in d.split("x")) for d in text.split(",")]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="generates lots of tile grids and checks that they're possible.")
+    parser.add_argument("--levels", default="0-15", help="levels to test, like '0-15' or '1,4,7'")
+    parser.add_argument("--dims", default=None, help="dims to test, like '2x2,3x3' (default: all up to 3x3)")
+    parser.add_argument("--n", type=int, default=None, help="grids per test case (default: 100 for small dims, else 20)")
+    parser.add_argument("--seed", type=int, default=None, help="seed for the whole run (default: random)")
+    parser.add_argument("--workers", type=int, default=None, help="number of worker processes (default: cpu count)")
+    parser.add_argument("--out", default=None, help="file to write the json results to")
+    parser.add_argument("--repro", type=int, default=None, help="a failing grid_seed to regenerate and print")
+    args = parser.parse_args()
+
+    if args.repro is not None:
+        levels = _parse_levels(args.levels)
+        dims_list = _parse_dims(args.dims) if args.dims is not None else [(3, 3)]
+        t_grid, n_retries, last_err = generate_grid(args.repro, levels[0], dims_list[0])
+        if t_grid is None:
+            print("FAIL: failed after {} tries ({})".format(n_retries, last_err))
             quit(1)
 
+        print(t_grid)
+        err = check_grid(t_grid)
+        print("retries={}, {}".format(n_retries, "FAIL: {}".format(err) if err is not None else "grid is possible"))
+        quit(0 if err is None else 1)
+
+    seed = args.seed if args.seed is not None else random.randint(0, 2**31)
+    dims_list = _parse_dims(args.dims) if args.dims is not None else None
+    test_cases = build_test_cases(_parse_levels(args.levels), dims_list=dims_list, n=args.n)
+
+    summary = run(test_cases, seed, args.workers or multiprocessing.cpu_count())
+    print(summary_table(summary))
+
+    if args.out is not None:
+        with open(args.out, "w") as f:
+            json.dump(summary, f, indent=2)
 
+    if summary["failures"] > 0:
+        quit(1)
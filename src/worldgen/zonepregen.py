@@ -0,0 +1,108 @@
+import multiprocessing
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+
+"""
+Generates the tile grids of upcoming zones in a worker process while the player is busy with the current
+one, so that walking through an exit doesn't hitch while the next level is generated.
+"""
+
+_instance = None
+
+
+def get_instance():
+    global _instance
+    if _instance is None:
+        _instance = ZonePregenerator()
+
+    return _instance
+
+
+def _init_worker():
+    import src.worldgen.zones as zones
+    zones.init_zones()
+
+
+def _generate_in_worker(zone_id, level, seed, dims, min_dims, max_dims):
+    """runs in the worker process. returns: (grid_dims, PackedTileGrid)"""
+    from src.worldgen.zones import ZoneBuilder
+    from src.worldgen.worldgen2 import PackedTileGrid
+
+    grid_dims, t_grid = ZoneBuilder.generate_tile_grid_from_seed(zone_id, level, seed, dims=dims,
+                                                                 min_dims=min_dims, max_dims=max_dims)
+    return grid_dims, PackedTileGrid.pack(t_grid)
+
+
+class ZonePregenerator:
+
+    def __init__(self):
+        self._executor = None  # started on demand
+        self._pending = {}  # zone_id -> (seed, Future)
+
+    def _get_executor(self):
+        if self._executor is None:
+            # spawned rather than forked, because the main process has a window and gl context
+            ctx = multiprocessing.get_context("spawn")
+            self._executor = ProcessPoolExecutor(max_workers=1, mp_context=ctx, initializer=_init_worker)
+        return self._executor
+
+    def zone_entered(self, zone_id):
+        """starts generating the zone that comes after zone_id, if it's procedurally generated."""
+        import src.worldgen.zones as zones
+        import src.game.rng as rng
+        if zone_id not in zones.all_storyline_zone_ids():
+            return
+
+        next_zone = zones.get_zone(zones.next_storyline_zone(zone_id), or_else=None)
+        next_id = next_zone.get_id() if next_zone is not None else None
+
+        for pending_id in list(self._pending.keys()):
+            if pending_id != next_id:
+                self._pending.pop(pending_id)[1].cancel()
+
+        if next_zone is None:
+            return
+
+        seed = rng.zone_seed(next_id)
+        if next_id in self._pending and self._pending[next_id][0] == seed:
+            return
+
+        grid_dims = next_zone.get_tile_grid_dims()
+        if grid_dims is not None:
+            try:
+                future = self._get_executor().submit(_generate_in_worker, next_id, next_zone.get_level(),
+                                                     seed, *grid_dims)
+                self._pending[next_id] = (seed, future)
+            except Exception:
+                print("WARN: failed to start generating zone {} in the background".format(next_id))
+                traceback.print_exc()
+
+    def take(self, zone_id, seed):
+        """
+            returns: (grid_dims, tile_grid) for the zone if it was pre-generated from the given seed, otherwise None.
+                     If it's still being generated, waits for it to finish.
+        """
+        seed_and_future = self._pending.pop(zone_id, None)
+        if seed_and_future is None:
+            return None
+
+        pending_seed, future = seed_and_future
+        if pending_seed != seed:
+            future.cancel()
+            return None
+
+        try:
+            return future.result()
+        except Exception:
+            print("WARN: background generation of zone {} failed, generating it normally".format(zone_id))
+            traceback.print_exc()
+            return None
+
+    def shutdown(self):
+        for (_, future) in self._pending.values():
+            future.cancel()
+        self._pending.clear()
+
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
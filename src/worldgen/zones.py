@@ -1,6 +1,8 @@
-import random
+import io
+import hashlib
 import pygame
 import traceback
+import numpy
 
 from src.world.worldstate import World
 from src.worldgen.worldgen import WorldFactory, WorldBlueprint, RoomFactory, BuilderUtils
@@ -18,6 +20,7 @@ import src.game.decoration as decoration
 import src.utils.colors as colors
 import src.game.debug as debug
 import src.game.constants as constants
+import src.game.rng as rng
 
 _FIRST_ZONE_ID = None
 _ZONE_TRANSITIONS = {}
@@ -222,6 +225,61 @@ class ZoneLoader:
     EXIT = (255, 0, 0)
     RETURN_EXIT = (255, 50, 50)
 
+    # file hash -> (list of colors, array of each pixel's index into the colors, indexed [x, y])
+    _DECODED_IMAGES = {}
+
+    @staticmethod
+    def _decode_image(filepath):
+        """
+            returns: (list of (r, g, b), ndarray of uint16 indexed [x, y]), the image's distinct colors and which
+                     one is at each pixel. Images are only decoded once, and are remembered by the hash of their file.
+        """
+        with open(Utils.resource_path(filepath), "rb") as f:
+            data = f.read()
+
+        key = hashlib.sha1(data).hexdigest()
+        if key not in ZoneLoader._DECODED_IMAGES:
+            raw_img = pygame.image.load(io.BytesIO(data), filepath)
+            pixels = pygame.surfarray.array3d(raw_img).astype(numpy.uint32)
+            packed = (pixels[:, :, 0] << 16) | (pixels[:, :, 1] << 8) | pixels[:, :, 2]
+
+            packed_colors, labels = numpy.unique(packed, return_inverse=True)
+            colors_list = [((c >> 16) & 0xFF, (c >> 8) & 0xFF, c & 0xFF) for c in packed_colors.tolist()]
+            labels = labels.reshape(packed.shape).astype(numpy.uint16)
+
+            ZoneLoader._DECODED_IMAGES[key] = (colors_list, labels)
+
+        return ZoneLoader._DECODED_IMAGES[key]
+
+    @staticmethod
+    def _geo_for_color(color):
+        """returns: (geo, alt_art) that a pixel of the given color becomes."""
+        if color == ZoneLoader.EMPTY:
+            return World.EMPTY, None
+        elif color == ZoneLoader.WALL:
+            return World.WALL, None
+        elif color == ZoneLoader.WALL_CRACKED:
+            return World.WALL, spriteref.WALL_CRACKED_ID
+        elif color == ZoneLoader.FLOOR:
+            return World.FLOOR, None
+        elif color in ZoneLoader.FLOOR_ID_LOOKUP:
+            return World.FLOOR, ZoneLoader.FLOOR_ID_LOOKUP[color]
+        elif color == ZoneLoader.HOLE:
+            return World.HOLE, None
+        elif color in (ZoneLoader.DOOR, ZoneLoader.SENSOR_DOOR, ZoneLoader.MUSIC_DOOR):
+            return World.DOOR, None
+        elif color in (ZoneLoader.RETURN_EXIT, ZoneLoader.EXIT, ZoneLoader.CHEST_SPAWN,
+                       ZoneLoader.MONSTER_SPAWN, ZoneLoader.PLAYER_SPAWN, ZoneLoader.SAVE_STATION):
+            return World.FLOOR, None
+        else:
+            mock_color = (color[0], color[0], color[0])
+            if mock_color in ZoneLoader.FLOOR_ID_LOOKUP:
+                return World.FLOOR, ZoneLoader.FLOOR_ID_LOOKUP[mock_color]
+            elif color[0] == ZoneLoader.WALL[0]:
+                return World.WALL, None
+            else:
+                return World.EMPTY, None
+
     @staticmethod
     def load_blueprint_from_file(zone_id, filename, level):
         """
@@ -229,77 +287,58 @@ class ZoneLoader:
         """
         try:
             filepath = "assets/zones/" + filename
-            raw_img = pygame.image.load(Utils.resource_path(filepath))
-            img_size = (raw_img.get_width(), raw_img.get_height())
+            colors_list, labels = ZoneLoader._decode_image(filepath)
+            img_size = labels.shape
             bp = WorldBlueprint(img_size, level)
 
             exit_id = next_storyline_zone(zone_id)  # will be None if this isn't a storyline zone
 
             bp.geo_color = get_zone(zone_id).get_color()
 
+            geo_and_alt_art = [ZoneLoader._geo_for_color(color) for color in colors_list]
+            geo_lookup = numpy.array([g for (g, _) in geo_and_alt_art])
+            alt_art_lookup = numpy.array([a for (_, a) in geo_and_alt_art], dtype=object)
+
+            bp.geo = geo_lookup[labels].tolist()
+            bp.geo_alt_art = alt_art_lookup[labels].tolist()
+
             unknowns = {}
 
-            for x in range(0, img_size[0]):
-                for y in range(0, img_size[1]):
-                    color = raw_img.get_at((x, y))
-                    color = (color[0], color[1], color[2])
+            for idx, color in enumerate(colors_list):
+                if color in (ZoneLoader.EMPTY, ZoneLoader.WALL, ZoneLoader.WALL_CRACKED,
+                             ZoneLoader.HOLE, ZoneLoader.DOOR) or color in ZoneLoader.FLOOR_ID_LOOKUP:
+                    continue  # nothing but geometry
 
-                    if color == ZoneLoader.EMPTY:
-                        continue
-                    elif color == ZoneLoader.WALL:
-                        bp.set(x, y, World.WALL)
-                    elif color == ZoneLoader.WALL_CRACKED:
-                        bp.set(x, y, World.WALL)
-                        bp.set_alt_art(x, y, spriteref.WALL_CRACKED_ID)
-                    elif color == ZoneLoader.FLOOR:
-                        bp.set(x, y, World.FLOOR)
-                    elif color in ZoneLoader.FLOOR_ID_LOOKUP:
-                        bp.set(x, y, World.FLOOR)
-                        bp.set_alt_art(x, y, ZoneLoader.FLOOR_ID_LOOKUP[color])
-                    elif color == ZoneLoader.HOLE:
-                        bp.set(x, y, World.HOLE)
-                    elif color == ZoneLoader.DOOR:
-                        bp.set(x, y, World.DOOR)
-                    elif color == ZoneLoader.SENSOR_DOOR:
+                # in the same order as the pixels, column by column
+                xs, ys = numpy.nonzero(labels == idx)
+                positions = list(zip(xs.tolist(), ys.tolist()))
+
+                if color == ZoneLoader.SENSOR_DOOR:
+                    for (x, y) in positions:
                         bp.set_sensor_door(x, y)
-                    elif color == ZoneLoader.MUSIC_DOOR:
-                        music_id = get_zone(zone_id).get_special_door_music_id()
+                elif color == ZoneLoader.MUSIC_DOOR:
+                    music_id = get_zone(zone_id).get_special_door_music_id()
+                    for (x, y) in positions:
                         if music_id is None:
                             print("WARN: no song exists for music door at ({}, {})".format(x, y))
-                            bp.set(x, y, World.DOOR)
                         else:
                             bp.set_music_door(x, y, music_id)
-                    elif color == ZoneLoader.RETURN_EXIT:
-                        bp.set(x, y, World.FLOOR)
-                        bp.return_exit_spawns.append((x, y))
-                    elif color == ZoneLoader.EXIT:
-                        bp.set(x, y, World.FLOOR)
+                elif color == ZoneLoader.RETURN_EXIT:
+                    bp.return_exit_spawns.extend(positions)
+                elif color == ZoneLoader.EXIT:
+                    for (x, y) in positions:
                         bp.add_exit_door(x, y, exit_id)
-                    elif color == ZoneLoader.CHEST_SPAWN:
-                        bp.set(x, y, World.FLOOR)
-                        bp.chest_spawns.append((x, y))
-                    elif color == ZoneLoader.MONSTER_SPAWN:
-                        bp.set(x, y, World.FLOOR)
-                        bp.enemy_spawns.append((x, y))
-                    elif color == ZoneLoader.PLAYER_SPAWN:
-                        bp.set(x, y, World.FLOOR)
-                        bp.player_spawn = (x, y)
-                    elif color == ZoneLoader.SAVE_STATION:
-                        bp.set(x, y, World.FLOOR)
-                        bp.save_station = (x, y, get_zone(zone_id).get_save_id())
-                    else:
-                        mock_color = (color[0], color[0], color[0])
-                        if mock_color in ZoneLoader.FLOOR_ID_LOOKUP:
-                            bp.set(x, y, World.FLOOR)
-                            bp.set_alt_art(x, y, ZoneLoader.FLOOR_ID_LOOKUP[mock_color])
-                        elif color[0] == ZoneLoader.WALL[0]:
-                            bp.set(x, y, World.WALL)
-
-                        pos = (x, y)
-                        if color in unknowns:
-                            unknowns[color].append(pos)
-                        else:
-                            unknowns[color] = [pos]
+                elif color == ZoneLoader.CHEST_SPAWN:
+                    bp.chest_spawns.extend(positions)
+                elif color == ZoneLoader.MONSTER_SPAWN:
+                    bp.enemy_spawns.extend(positions)
+                elif color == ZoneLoader.PLAYER_SPAWN:
+                    bp.player_spawn = positions[-1]
+                elif color == ZoneLoader.SAVE_STATION:
+                    x, y = positions[-1]
+                    bp.save_station = (x, y, get_zone(zone_id).get_save_id())
+                else:
+                    unknowns[color] = positions
 
             return bp, unknowns
 
@@ -402,6 +441,9 @@ class Zone:
         self.max_n_conversations = 1
         self.max_n_trades = 1
 
+        # (dims, min_dims, max_dims) for zones that are procedurally generated, see ZoneBuilder.generate_new_world
+        self.tile_grid_dims = None
+
     def get_name(self):
         return self.name
 
@@ -448,6 +490,10 @@ class Zone:
         """Max number of trade npcs that can randomly spawn here"""
         return self.max_n_trades
 
+    def get_tile_grid_dims(self):
+        """returns: (dims, min_dims, max_dims) if the zone is procedurally generated, otherwise None"""
+        return self.tile_grid_dims
+
     def get_save_id(self):
         return self.get_id()
 
@@ -513,7 +559,7 @@ class ZoneBuilder:
                     world.set_geo(x, y, World.DOOR)
                 else:
                     world.set_geo(x, y, World.FLOOR)
-                    if random.random() < 0.25:
+                    if rng.worldgen().random() < 0.25:
                         world.set_floor_type(spriteref.FLOOR_CRACKED_ID, xy=(x, y))
 
                 if tile_type == worldgen2.TileType.NPC:
@@ -529,9 +575,9 @@ class ZoneBuilder:
             for x in range(0, w):
                 for y in range(0, h):
                     if t_grid.get(x, y) == worldgen2.TileType.FLOOR and t_grid.get(x, y-1) == worldgen2.TileType.WALL:
-                        random.shuffle(bonus_dec_list)
+                        rng.worldgen().shuffle(bonus_dec_list)
                         for type_and_rate in bonus_dec_list:
-                            if random.random() < type_and_rate[1]:
+                            if rng.worldgen().random() < type_and_rate[1]:
                                 dec_ent = decoration.DecorationFactory.get_decoration(level, dec_type=type_and_rate[0])
                                 world.add(dec_ent, gridcell=(x, y - 1))
                                 break
@@ -544,7 +590,7 @@ class ZoneBuilder:
             valid_convos = actual_zone.get_conversation_ids()
             convo_npc_ents = npc.NpcFactory.gen_convo_npcs(valid_convos, len(convo_npc_coords),
                                                            not_npc_ids=used_npc_ids)
-            random.shuffle(convo_npc_coords)
+            rng.worldgen().shuffle(convo_npc_coords)
             for i in range(0, len(convo_npc_ents)):
                 world.add(convo_npc_ents[i], gridcell=convo_npc_coords[i])
                 used_npc_ids.append(convo_npc_ents[i].get_npc_id())
@@ -552,7 +598,7 @@ class ZoneBuilder:
         if len(trade_npc_coords) > 0:
             trade_npc_ents = npc.NpcFactory.gen_trade_npcs(level, len(trade_npc_coords),
                                                            not_npc_ids=used_npc_ids)
-            random.shuffle(trade_npc_coords)
+            rng.worldgen().shuffle(trade_npc_coords)
             for i in range(0, len(trade_npc_ents)):
                 world.add(trade_npc_ents[i], gridcell=trade_npc_coords[i])
                 used_npc_ids.append(trade_npc_ents[i].get_npc_id())
@@ -652,14 +698,14 @@ class ZoneBuilder:
 
             for p in path:
                 rooms_in_p = list(room_map.get(p))
-                random.shuffle(rooms_in_p)
+                rng.worldgen().shuffle(rooms_in_p)
                 for r in rooms_in_p:
                     if r not in empty_rooms:
                         continue
                     candidate_rooms.append(r)
 
             if near_start is None:
-                random.shuffle(candidate_rooms)
+                rng.worldgen().shuffle(candidate_rooms)
             elif near_start is False:
                 candidate_rooms.reverse()
 
@@ -677,7 +723,7 @@ class ZoneBuilder:
 
         while len(empty_rooms) > 0:
             r = empty_rooms.pop()
-            if random.random() < 0.95:
+            if rng.worldgen().random() < 0.95:
                 feat = worldgen2.Features.get_random_feature(at_level=level, current_counts=feature_counts)
                 if feat is not None:
                     did_place = worldgen2.FeatureUtils.try_to_place_feature_into_rect(feat, t_grid, r)
@@ -699,14 +745,37 @@ class ZoneBuilder:
         return (None, None)
 
     @staticmethod
-    def generate_new_world(zone, dims=None, min_dims=(3, 3), max_dims=(3, 3), bonus_decorations=()):
+    def choose_grid_dims(dims=None, min_dims=(3, 3), max_dims=(3, 3)):
         if dims is not None:
-            grid_dims = dims
+            return dims
         else:
-            grid_dims = (random.choice([x for x in range(min(max_dims[0], min_dims[0]), max_dims[0] + 1)]),
-                         random.choice([y for y in range(min(min_dims[1], max_dims[1]), max_dims[1] + 1)]))
+            return (rng.worldgen().choice([x for x in range(min(max_dims[0], min_dims[0]), max_dims[0] + 1)]),
+                    rng.worldgen().choice([y for y in range(min(min_dims[1], max_dims[1]), max_dims[1] + 1)]))
+
+    @staticmethod
+    def generate_tile_grid_from_seed(zone_id, level, seed, dims=None, min_dims=(3, 3), max_dims=(3, 3)):
+        """returns: (grid_dims, TileGrid)"""
+        with rng.Seeded(rng.WORLDGEN, seed):
+            grid_dims = ZoneBuilder.choose_grid_dims(dims=dims, min_dims=min_dims, max_dims=max_dims)
+            t_grid = ZoneBuilder.generate_tile_grid(zone_id, level, dims=grid_dims)
+        return grid_dims, t_grid
+
+    @staticmethod
+    def generate_new_world(zone, dims=None, min_dims=(3, 3), max_dims=(3, 3), bonus_decorations=()):
+        import src.worldgen.zonepregen as zonepregen
 
-        t_grid = ZoneBuilder.generate_tile_grid(zone.get_id(), zone.get_level(), dims=grid_dims)
+        # the layout comes from its own seed, so it's the same whether or not it was pre-generated
+        seed = rng.zone_seed(zone.get_id())
+        rng.zone_generated(zone.get_id())
+
+        pregenerated = zonepregen.get_instance().take(zone.get_id(), seed)
+
+        if pregenerated is not None:
+            grid_dims, t_grid = pregenerated
+        else:
+            grid_dims, t_grid = ZoneBuilder.generate_tile_grid_from_seed(zone.get_id(), zone.get_level(), seed,
+                                                                         dims=dims, min_dims=min_dims,
+                                                                         max_dims=max_dims)
 
         print("INFO: generated world: zone={}, dims={}, level={}".format(zone.get_id(), grid_dims, zone.get_level()))
 
@@ -735,6 +804,8 @@ class ZoneBuilder:
         if geo_color is not None:
             zone.geo_color = geo_color
 
+        zone.tile_grid_dims = (dims, min_dims, max_dims)
+
         # making sure i didn't screw up this param
         if len(bonus_decorations) > 0:
             for type_and_rate in bonus_decorations:
@@ -871,16 +942,16 @@ class DesolateCaveZone(Zone):
             w.set_geo(special_spot[0], special_spot[1], World.FLOOR)
 
         for pos in unknowns[DesolateCaveZone.MUSHROOM_COLOR]:
-            m_sprite = random.choice(spriteref.wall_decoration_mushrooms)
+            m_sprite = rng.worldgen().choice(spriteref.wall_decoration_mushrooms)
             text = "it's a large cluster of mushrooms. they're overgrown and rotten."
             mushroom_entity = entities.DecorationEntity.wall_decoration(decoration.DecorationTypes.MUSHROOM, m_sprite, pos[0], pos[1],
                                                                         interact_dialog=dialog.PlayerDialog(text))
             w.add(mushroom_entity)
 
         sp_mushrooms = unknowns[DesolateCaveZone.MUSHROOM_COLOR_SP]
-        hidden_switch_idx = random.randint(0, len(sp_mushrooms) - 1)
+        hidden_switch_idx = rng.worldgen().randint(0, len(sp_mushrooms) - 1)
         for i in range(0, len(sp_mushrooms)):
-            m_sprite = random.choice(spriteref.wall_decoration_mushrooms)
+            m_sprite = rng.worldgen().choice(spriteref.wall_decoration_mushrooms)
             pos = sp_mushrooms[i]
             if i == hidden_switch_idx:
                 text = "you flip the switch."
@@ -1009,9 +1080,9 @@ class HauntedForestZone1(Zone):
         for x in range(0, bp.width()):
             for y in range(0, bp.height()):
                 if bp.get(x, y) == World.FLOOR and bp.get_alt_art(x, y) is None:
-                    if random.random() < 0.125:
+                    if rng.worldgen().random() < 0.125:
                         bp.set_alt_art(x, y, spriteref.FLOOR_SWAMP_ID)
-                    elif random.random() < 0.5:
+                    elif rng.worldgen().random() < 0.5:
                         bp.set_alt_art(x, y, spriteref.FLOOR_CRACKED_ID)
         w = bp.build_world()
 
@@ -1075,7 +1146,7 @@ class FrogLairZone(Zone):
                         return None
 
                     scrambled_positions = [x for x in self._arena_positions]
-                    random.shuffle(scrambled_positions)
+                    rng.combat().shuffle(scrambled_positions)
 
                     for p in scrambled_positions:
                         act = gameengine.FrogLeapAction(actor, p)
@@ -1088,7 +1159,7 @@ class FrogLairZone(Zone):
                     hp_pct = actor.get_actor_state().hp() / actor.get_actor_state().max_hp()
                     leap_chance = Utils.linear_interp(self._min_leap_chance, self._max_leap_chance, 1 - hp_pct)
 
-                    if random.random() < leap_chance:
+                    if rng.combat().random() < leap_chance:
                         special_leap = self.get_special_leap_action_if_possible(actor, world)
                         if special_leap is not None:
                             return special_leap
@@ -1390,13 +1461,13 @@ def _mushroomify_blueprint(bp, focus_pos, close_chance=0.5, far_chance=0.25):
             chance_to_crack = chance_to_fungify / 2  # take it easy with the floor/wall cracking...
 
             if geo == World.FLOOR:
-                if random.random() < chance_to_crack or (x, y) == bp.player_spawn:
+                if rng.worldgen().random() < chance_to_crack or (x, y) == bp.player_spawn:
                     bp.set_alt_art(x, y, spriteref.FLOOR_CRACKED_ID)
                 if y != 0 and bp.get(x, y - 1) == World.WALL and not bp.has_exit_at(x, y):
-                    if random.random() < chance_to_fungify:
+                    if rng.worldgen().random() < chance_to_fungify:
                         mushroom_positions.append((x, y))
             elif geo == World.WALL:
-                if random.random() < chance_to_crack:
+                if rng.worldgen().random() < chance_to_crack:
                     bp.set_alt_art(x, y, spriteref.WALL_CRACKED_ID)
 
     return mushroom_positions
@@ -1417,7 +1488,7 @@ class UndergrowthZone(Zone):
         templates = enemies_clz.get_all_rand_spawn_templates(
             cond=lambda t: enemies_clz.EnemyTypes.FUNGUS in t.get_types())
         if len(templates) > 0:
-            return enemies_clz.EnemyFactory.gen_enemy(random.choice(templates), self.level)
+            return enemies_clz.EnemyFactory.gen_enemy(rng.worldgen().choice(templates), self.level)
         else:
             return None
 
@@ -1425,7 +1496,7 @@ class UndergrowthZone(Zone):
         bp, unknowns = ZoneLoader.load_blueprint_from_file(self.get_id(), self.get_file(), self.get_level())
 
         # pick one of n door positions randomly
-        exit_door_pos = random.choice(unknowns[self._exit_doors])
+        exit_door_pos = rng.worldgen().choice(unknowns[self._exit_doors])
 
         next_zone_id = next_storyline_zone(self.get_id())
 
@@ -1452,7 +1523,7 @@ class UndergrowthZone(Zone):
 
         for xy in mushroom_positions:
             if xy not in already_decorated:
-                mushroom_sprite = random.choice(spriteref.wall_decoration_mushrooms)
+                mushroom_sprite = rng.worldgen().choice(spriteref.wall_decoration_mushrooms)
                 mushroom_entity = entities.DecorationEntity.wall_decoration(decoration.DecorationTypes.MUSHROOM,
                                                                             mushroom_sprite, xy[0], xy[1])
                 w.add(mushroom_entity)
@@ -1495,7 +1566,7 @@ class MedusaLairZone(Zone):
         w.add(doctor_npc, gridcell=doctor_position)
 
         for xy in mushroom_positions:
-            mushroom_sprite = random.choice(spriteref.wall_decoration_mushrooms)
+            mushroom_sprite = rng.worldgen().choice(spriteref.wall_decoration_mushrooms)
             mushroom_entity = entities.DecorationEntity.wall_decoration(decoration.DecorationTypes.MUSHROOM,
                                                                         mushroom_sprite, xy[0], xy[1])
             w.add(mushroom_entity)
@@ -1752,7 +1823,7 @@ class CaveHorrorZone(Zone):
 
                     if len(self._initial_spawns) > 0:
                         inital_spawns_copy = [x for x in self._initial_spawns]
-                        random.shuffle(inital_spawns_copy)
+                        rng.combat().shuffle(inital_spawns_copy)
                         new_husk = self.gen_spawned_minion()
                         for pos in inital_spawns_copy:
                             # these summons are meant to be quick, so they don't give it summoning sickness
@@ -1769,8 +1840,8 @@ class CaveHorrorZone(Zone):
                                                               cond=lambda ent: ent.is_enemy() and actor is not ent)
 
                     if len(enemies_nearby) < self._husk_limit:
-                        rand_pos_x = random.randint(self._arena_rect[0], self._arena_rect[0] + self._arena_rect[2])
-                        rand_pos_y = random.randint(self._arena_rect[1], self._arena_rect[1] + self._arena_rect[3])
+                        rand_pos_x = rng.combat().randint(self._arena_rect[0], self._arena_rect[0] + self._arena_rect[2])
+                        rand_pos_y = rng.combat().randint(self._arena_rect[1], self._arena_rect[1] + self._arena_rect[3])
                         spawn_action = gameengine.SpawnActorAction(actor, (rand_pos_x, rand_pos_y),
                                                                    self.gen_spawned_minion(),
                                                                    art_color=summon_color)